@@ -1,21 +1,45 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO
 from dotenv import load_dotenv
 import os
 import requests
 from functools import wraps
+from contextlib import closing
 import time
-import google.generativeai as genai
+import logging
 
 # Import routes
-from routes.stocks import stocks_bp
+from routes.stocks import stocks_bp, request_session
 from routes.auth import auth_bp
 from routes.payment import payment_bp
+from routes.calc import calc_bp
+from routes.metrics import metrics_bp
+from routes.stream import register_stream_events
+from services.llm_cache import llm_cache
+from services.chat_stream import MarkdownStripper, iter_text, sse
+from services.llm_dispatch import LLMOverloaded, LLMTimeout, llm_dispatcher
+from services.gemini_service import get_chat_model
+from services.registry import service_registry
+from services.intent_router import intent_router
+from services.chat_sessions import chat_sessions
+from services.portfolio_context import portfolio_context, static_holdings
+from services.metrics import instrument_app
+from services.log_pipeline import log_pipeline
+from services.instruments import instrument_master
 
 # Load environment variables
 load_dotenv()
 
+# Screener worker processes import this module as __mp_main__ for its definitions only,
+# so everything that starts threads or background work is skipped there
+SERVING = __name__ != '__mp_main__'
+
+# Structured JSON logs, written off the request threads
+if SERVING:
+    log_pipeline.configure()
+logger = logging.getLogger(__name__)
+
 # Initialize Flask app
 app = Flask(__name__)
 
@@ -34,10 +58,24 @@ CORS(app, resources={
 # Initialize SocketIO
 socketio = SocketIO(app, cors_allowed_origins=["http://localhost:3000"])
 
+if SERVING:
+    register_stream_events(socketio)
+
+    # Clients are built lazily; warm them up without holding back start-up
+    socketio.start_background_task(service_registry.warm_up)
+
+    # Load the instrument index (downloading the scrip master if needed) and rebuild it each morning
+    instrument_master.start()
+
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(stocks_bp, url_prefix='/api/stocks')
 app.register_blueprint(payment_bp, url_prefix='/api')  # This will handle /api/create-payment and /api/execute-payment
+app.register_blueprint(calc_bp, url_prefix='/api/calc')
+app.register_blueprint(metrics_bp, url_prefix='/api')
+
+# Time every request for /api/metrics
+instrument_app(app)
 
 # Static portfolio data
 STATIC_PORTFOLIO = {
@@ -49,55 +87,18 @@ STATIC_PORTFOLIO = {
     "risk_tolerance": "Medium"
 }
 
-# Initialize Gemini
-try:
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-    if not GEMINI_API_KEY:
-        raise ValueError("GEMINI_API_KEY is missing in .env file")
-    
-    # Configure Gemini
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    # List available models
-    models = [m.name for m in genai.list_models()]
-    print("📋 Available models:", models)
-    
-    # Find the most suitable Gemini model
-    preferred_models = [
-        "models/gemini-1.5-pro",
-        "models/gemini-1.5-pro-latest",
-        "models/gemini-1.5-pro-001",
-        "models/gemini-1.5-pro-002"
-    ]
-    
-    model_name = None
-    for preferred_model in preferred_models:
-        if preferred_model in models:
-            model_name = preferred_model
-            break
-    
-    if not model_name:
-        raise ValueError("No suitable Gemini model found in available models")
-    
-    # Initialize the model
-    model = genai.GenerativeModel(model_name)
-    print(f"✅ Gemini API configured successfully using model: {model_name}")
-    
-except Exception as e:
-    print(f"❌ Error configuring Gemini API: {str(e)}")
-    model = None
-
 @app.route("/api/chat/test", methods=["GET"])
 def test_gemini():
     """Test route to verify Gemini API connectivity"""
     try:
+        model = get_chat_model()
         if not model:
             return jsonify({"error": "Gemini API not configured"}), 500
 
         # Simple test prompt
         test_prompt = """Respond with a simple 'Hello! Gemini API is working!' if you receive this message."""
         
-        print("🤖 Testing Gemini API connection...")
+        logger.info("Testing Gemini API connection")
         response = model.generate_content(test_prompt)
         
         if not response or not response.text:
@@ -109,7 +110,7 @@ def test_gemini():
             "model": model._model_name
         })
     except Exception as e:
-        print(f"❌ Gemini API test failed: {str(e)}")
+        logger.error(f"Gemini API test failed: {str(e)}")
         return jsonify({"error": f"Gemini API test failed: {str(e)}"}), 500
 
 @app.route("/api/chat", methods=["POST"])
@@ -117,6 +118,7 @@ def chat():
     """Chat endpoint that uses Gemini API to analyze portfolio and answer questions"""
     try:
         # Check if Gemini is configured
+        model = get_chat_model()
         if not model:
             return jsonify({"error": "Gemini API not configured"}), 500
 
@@ -126,57 +128,209 @@ def chat():
             return jsonify({"error": "Missing message in request"}), 400
 
         message = data["message"]
-        print(f"📝 Received message: {message}")
+        logger.debug("Chat message received", extra={"message_chars": len(message)})
+
+        angel_one = request_session()
+        session_id = chat_session_id(data, angel_one)
+
+        # Lookups like P&L, value or allocation are answered from live data without the model
+        routed = intent_router.route(message, angel_one)
+        if routed:
+            chat_sessions.append(session_id, message, routed["response"])
+            return jsonify({"response": routed["response"], "intent": routed["intent"]})
+
+        # Clients can skip the cache with {"cache": false} or Cache-Control: no-cache
+        bypass_cache = data.get("cache") is False or 'no-cache' in request.headers.get('Cache-Control', '')
+        history = chat_sessions.context(session_id)
+        summary = chat_portfolio_context(angel_one)
+        portfolio = summary.text
+        # Keyed on the holdings version, not the summary text, whose prices and timestamp change every refresh
+        response_text = llm_cache.get_or_generate(
+            message, {"holdings": summary.version, "history": history}, model._model_name,
+            lambda: llm_dispatcher.call(
+                lambda timeout: generate_chat_response(model, message, portfolio, history, timeout)),
+            bypass=bypass_cache
+        )
+        if not response_text:
+            return jsonify({"error": "No response from Gemini"}), 500
 
-        # Create prompt for natural paragraph response
-        prompt = f"""As a financial advisor, analyze this portfolio and answer {message} in a clear, concise way.
+        chat_sessions.append(session_id, message, response_text)
+        return jsonify({"response": response_text})
 
-Portfolio:
-- HYUNDAI: 7 shares at ₹1960
-- TATAMOTORS: 55 shares at ₹861.01
-- Investment Goal: Long-term wealth generation
-- Risk Tolerance: Medium
+    except LLMOverloaded as e:
+        return llm_busy_response(e, 429)
+    except LLMTimeout as e:
+        return llm_busy_response(e, 503)
+    except Exception as e:
+        logger.exception(f"Error in chat endpoint: {str(e)}")
+        return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
+
+def llm_busy_response(error, status):
+    """Tell the client to retry later when the model dispatcher is saturated"""
+    logger.warning(f"Chat request shed: {str(error)}")
+    return jsonify({"error": "The advisor is busy, please try again shortly"}), status, {"Retry-After": "2"}
+
+def chat_session_id(data, angel_one):
+    """Conversation key: the logged-in Angel One client, else a session_id chosen by the client"""
+    if angel_one:
+        return f"client:{angel_one.client_id}"
+    if data.get("session_id"):
+        return f"anonymous:{data['session_id']}"
+    return None
+
+def chat_portfolio_context(angel_one):
+    """Portfolio summary for the prompt: live holdings when logged in, else the static portfolio"""
+    profile = [
+        f"Investment goal: {STATIC_PORTFOLIO['investment_goal']}",
+        f"Risk tolerance: {STATIC_PORTFOLIO['risk_tolerance']}"
+    ]
+    if angel_one:
+        holdings = angel_one.get_holdings()
+        if holdings and holdings.get('status'):
+            return portfolio_context.get(f"client:{angel_one.client_id}", holdings.get('data') or [], profile)
+    return portfolio_context.get("static", static_holdings(STATIC_PORTFOLIO), profile)
 
-Provide a brief analysis in 3-4 short paragraphs covering:
+def build_chat_prompt(message, portfolio, history=""):
+    """Create prompt for natural paragraph response"""
+    history_section = f"{history}\n\n" if history else ""
+    return f"""As a financial advisor, analyze this portfolio and answer {message} in a clear, concise way.
+
+{portfolio}
+
+{history_section}Provide a brief analysis in 3-4 short paragraphs covering:
 1. Current portfolio status and composition
 2. Key risks and concerns
 3. Specific recommendations and action items
 
 Keep the total response under 150 words and focus on actionable insights. Use simple, direct language."""
 
-        # Get response from Gemini
-        print("🤖 Requesting Gemini response...")
-        response = model.generate_content(prompt)
+def generate_chat_response(model, message, portfolio, history, timeout):
+    """Ask Gemini about the portfolio and strip markdown from the answer"""
+    # Get response from Gemini
+    response = model.generate_content(build_chat_prompt(message, portfolio, history),
+                                      request_options={"timeout": timeout})
 
-        if not response or not response.text:
-            return jsonify({"error": "No response from Gemini"}), 500
+    if not response or not response.text:
+        return None
 
-        # Format the response
-        formatted_response = response.text
-        # Remove markdown symbols
-        formatted_response = formatted_response.replace('*', '')
-        formatted_response = formatted_response.replace('#', '')
-        formatted_response = formatted_response.replace('**', '')
-        
-        # Ensure proper paragraph breaks
-        # Split into paragraphs and clean up
-        paragraphs = [p.strip() for p in formatted_response.split('\n\n') if p.strip()]
-        formatted_response = '\n\n'.join(paragraphs)
-        
-        # Remove any trailing/leading whitespace while preserving paragraph breaks
-        formatted_response = formatted_response.strip()
+    # Format the response
+    formatted_response = response.text
+    # Remove markdown symbols
+    formatted_response = formatted_response.replace('*', '')
+    formatted_response = formatted_response.replace('#', '')
+    formatted_response = formatted_response.replace('**', '')
+    
+    # Ensure proper paragraph breaks
+    # Split into paragraphs and clean up
+    paragraphs = [p.strip() for p in formatted_response.split('\n\n') if p.strip()]
+    formatted_response = '\n\n'.join(paragraphs)
+    
+    # Remove any trailing/leading whitespace while preserving paragraph breaks
+    formatted_response = formatted_response.strip()
 
-        print("✅ Got response from Gemini")
-        return jsonify({"response": formatted_response})
+    logger.debug("Gemini response received", extra={"response_chars": len(formatted_response)})
+    return formatted_response
 
-    except Exception as e:
-        print(f"❌ Error in chat endpoint: {str(e)}")
-        return jsonify({"error": f"Failed to process request: {str(e)}"}), 500
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream():
+    """Stream the chat answer as server-sent events while Gemini generates it
+
+    Emits `chunk` events with cleaned text, then `done`, or `error` on failure.
+    Closing the connection stops the upstream generation.
+    """
+    model = get_chat_model()
+    if not model:
+        return jsonify({"error": "Gemini API not configured"}), 500
+
+    data = request.get_json()
+    if not data or "message" not in data:
+        return jsonify({"error": "Missing message in request"}), 400
+
+    message = data["message"]
+    angel_one = request_session()
+    session_id = chat_session_id(data, angel_one)
+    routed = intent_router.route(message, angel_one)
+    if routed:
+        chat_sessions.append(session_id, message, routed["response"])
+        return Response(sse("chunk", {"text": routed["response"]}) + sse("done", {"cached": False, "intent": routed["intent"]}),
+                        mimetype='text/event-stream')
+
+    bypass_cache = data.get("cache") is False or 'no-cache' in request.headers.get('Cache-Control', '')
+    model_name = model._model_name
+    history = chat_sessions.context(session_id)
+    summary = chat_portfolio_context(angel_one)
+    portfolio = summary.text
+    context = {"holdings": summary.version, "history": history}
+
+    cached = None if bypass_cache else llm_cache.lookup(message, context, model_name)
+    if cached:
+        chat_sessions.append(session_id, message, cached)
+        return Response(sse("chunk", {"text": cached}) + sse("done", {"cached": True}),
+                        mimetype='text/event-stream')
+
+    # Take the model slot before streaming starts so saturation still gets a proper status code
+    try:
+        ticket = llm_dispatcher.acquire('interactive')
+    except LLMOverloaded as e:
+        return llm_busy_response(e, 429)
+    except LLMTimeout as e:
+        return llm_busy_response(e, 503)
+
+    def generate():
+        stripper = MarkdownStripper()
+        parts = []
+        try:
+            response = model.generate_content(build_chat_prompt(message, portfolio, history), stream=True,
+                                              request_options={"timeout": ticket.remaining()})
+            with closing(iter_text(response)) as chunks:
+                for text in chunks:
+                    cleaned = stripper.feed(text)
+                    if cleaned:
+                        parts.append(cleaned)
+                        yield sse("chunk", {"text": cleaned})
+        except Exception as e:
+            ticket.failed = True
+            logger.error(f"Error in chat stream: {str(e)}")
+            yield sse("error", {"error": f"Failed to process request: {str(e)}"})
+            return
+
+        llm_dispatcher.release(ticket)
+        answer = ''.join(parts)
+        llm_cache.store(message, context, model_name, answer)
+        chat_sessions.append(session_id, message, answer)
+        yield sse("done", {"cached": False})
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs even if the client disconnects before or during the stream
+    response.call_on_close(lambda: llm_dispatcher.release(ticket))
+    return response
+
+@app.route("/api/chat/dispatcher", methods=["GET"])
+def chat_dispatcher_stats():
+    """Queue depth, wait and service times of the model dispatcher"""
+    return jsonify(llm_dispatcher.stats())
+
+@app.route("/api/chat/routing", methods=["GET"])
+def chat_routing_stats():
+    """How many chat messages were answered locally instead of by the model"""
+    return jsonify(intent_router.stats())
+
+@app.route("/api/chat/cache", methods=["GET"])
+def chat_cache_stats():
+    """Hit/miss counters for the chat response cache"""
+    return jsonify(llm_cache.stats())
 
 # Basic route for testing
 @app.route('/api/health')
 def health_check():
     return {"status": "healthy", "message": "Backend is running"}
 
+@app.route('/api/ready')
+def readiness_check():
+    """Ready once required clients are constructed and passed their warmup checks"""
+    readiness = service_registry.readiness()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
 if __name__ == '__main__':
     socketio.run(app, debug=True, port=5000)
@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify, current_app
-from services.angel_one import angel_one_service
+from services.angel_one import session_registry
 from flask_cors import cross_origin
 import jwt
 import os
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -12,63 +15,39 @@ auth_bp = Blueprint('auth', __name__)
 def login():
     """Login with Angel One credentials"""
     try:
-        print("Starting login process...")
         data = request.get_json()
-        print("Received login request data:", data)
         
         if not data:
-            print("No JSON data received")
+            logger.warning("Login request without JSON data")
             return jsonify({"error": "No data received"}), 400
 
         client_id = data.get('client_id')
         password = data.get('password')
         totp = data.get('totp')
 
-        print(f"Processing login for client_id: {client_id}")
-        print(f"Password length: {len(password) if password else 0}")
-        print(f"TOTP length: {len(totp) if totp else 0}")
-
         if not all([client_id, password, totp]):
-            print("Missing credentials")
+            logger.warning(f"Login for client_id {client_id} is missing credentials")
             return jsonify({"error": "Missing credentials"}), 400
 
-        # Set credentials in service
-        try:
-            print("Setting credentials in Angel One service...")
-            angel_one_service.set_credentials(client_id, password, totp)
-            print("Credentials set successfully")
-        except Exception as e:
-            print(f"Error setting credentials: {str(e)}")
-            import traceback
-            print("Traceback:", traceback.format_exc())
-            return jsonify({
-                "status": "error",
-                "message": f"Error setting credentials: {str(e)}"
-            }), 500
-
-        # Try to connect
+        # Try to connect with a session of this user's own
         try:
-            print("Attempting to connect to Angel One...")
-            if angel_one_service.connect():
-                print("Successfully connected to Angel One")
+            angel_one = session_registry.login(client_id, password, totp)
+            if angel_one:
                 # Get user profile
-                print("Fetching user profile...")
-                profile = angel_one_service.get_profile()
-                print("Connection successful, profile:", profile)
+                profile = angel_one.get_profile()
+                logger.info(f"Login successful for client_id {client_id}")
                 
                 # Create session token
                 token_payload = {
                     'client_id': client_id,
                     'exp': datetime.utcnow() + timedelta(days=1)
                 }
-                print("Creating token with payload:", token_payload)
                 
                 session_token = jwt.encode(
                     token_payload,
                     current_app.config['SECRET_KEY'],
                     algorithm='HS256'
                 )
-                print("Generated token:", session_token)
 
                 return jsonify({
                     "status": "success",
@@ -77,24 +56,20 @@ def login():
                     "profile": profile
                 })
             else:
-                print("Failed to connect to Angel One")
+                logger.warning(f"Login failed for client_id {client_id}: could not connect to Angel One")
                 return jsonify({
                     "status": "error",
                     "message": "Failed to connect to Angel One"
                 }), 401
         except Exception as e:
-            print(f"Error during connection: {str(e)}")
-            import traceback
-            print("Connection error traceback:", traceback.format_exc())
+            logger.exception(f"Error during connection: {str(e)}")
             return jsonify({
                 "status": "error",
                 "message": f"Connection error: {str(e)}"
             }), 500
         
     except Exception as e:
-        print("Login error:", str(e))
-        import traceback
-        print("Full traceback:", traceback.format_exc())
+        logger.exception(f"Login error: {str(e)}")
         return jsonify({
             "status": "error",
             "message": str(e)
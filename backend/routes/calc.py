@@ -0,0 +1,51 @@
+from flask import Blueprint, request, jsonify
+from services.charges import CHARGE_FIELDS, calculate_charges
+from flask_cors import cross_origin
+import logging
+
+logger = logging.getLogger(__name__)
+
+calc_bp = Blueprint('calc', __name__)
+
+# Largest batch accepted in a single request
+MAX_TRADES = 200000
+
+@calc_bp.route('/charges', methods=['POST'])
+@cross_origin()
+def calculate_batch_charges():
+    """Calculate brokerage and statutory charges for a batch of trades
+
+    Trade fields are columns: segment, side, quantity, price and the optional
+    trade_date, each a list or a single value applied to every trade.
+    """
+    try:
+        data = request.get_json()
+        if not data or 'quantity' not in data or 'price' not in data:
+            return jsonify({"error": "Missing quantity or price in request"}), 400
+
+        quantity = data['quantity'] if isinstance(data['quantity'], list) else [data['quantity']]
+        if len(quantity) > MAX_TRADES:
+            return jsonify({"error": f"At most {MAX_TRADES} trades per request"}), 400
+
+        charges = calculate_charges(
+            data.get('segment', 'equity-delivery'),
+            data.get('side', 'BUY'),
+            quantity,
+            data['price'],
+            trade_date=data.get('trade_date'),
+            version=data.get('schedule_version')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Charges calculation error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "status": True,
+        "count": len(quantity),
+        "data": {field: charges[field].round(2).tolist() for field in CHARGE_FIELDS},
+        "schedule_version": charges['schedule_version'].tolist(),
+        "backdated": charges['backdated'].tolist(),
+        "totals": {field: round(float(charges[field].sum()), 2) for field in CHARGE_FIELDS}
+    })
@@ -0,0 +1,70 @@
+from flask import Blueprint, Response
+from services.metrics import metrics
+from services.angel_one import api_cache
+from services.llm_cache import llm_cache
+from services.llm_dispatch import llm_dispatcher
+from services.intent_router import intent_router
+from services.chat_sessions import chat_sessions
+from services.market_stream import market_stream
+from services.tick_buffer import tick_store
+from services.log_pipeline import log_pipeline
+from services.rate_governor import rate_governor
+from services.resilience import broker_resilience
+from services.instruments import instrument_master
+
+metrics_bp = Blueprint('metrics', __name__)
+
+def collect_service_stats():
+    """Expose counters the services already keep as Prometheus families"""
+    broker_cache, chat_cache = api_cache.stats(), llm_cache.stats()
+    dispatcher, routing = llm_dispatcher.stats(), intent_router.stats()
+    lanes = dispatcher['lanes']
+    logs = log_pipeline.stats()
+    governor = rate_governor.stats()
+    broker_calls = broker_resilience.stats()['calls']
+    instruments = instrument_master.stats()
+    governed = [(endpoint, lane, stats) for endpoint, endpoint_stats in governor.items()
+                for lane, stats in endpoint_stats['lanes'].items()]
+    return [
+        ("cache_hits_total", "counter", "Cache lookups served from the cache",
+         [({"cache": "broker"}, broker_cache['hits']), ({"cache": "chat"}, chat_cache['hits'])]),
+        ("cache_misses_total", "counter", "Cache lookups that went upstream",
+         [({"cache": "broker"}, broker_cache['misses']), ({"cache": "chat"}, chat_cache['misses'])]),
+        ("cache_entries", "gauge", "Entries currently cached",
+         [({"cache": "broker"}, broker_cache['size']), ({"cache": "chat"}, chat_cache['size'])]),
+        ("llm_in_flight", "gauge", "Model calls holding a dispatcher slot", [({}, dispatcher['in_flight'])]),
+        ("llm_queue_depth", "gauge", "Model calls waiting for a dispatcher slot", [({}, dispatcher['queue_depth'])]),
+        ("llm_rejected_total", "counter", "Model calls shed because the queue was full",
+         [({"lane": lane}, stats['rejected']) for lane, stats in lanes.items()]),
+        ("llm_timed_out_total", "counter", "Model calls whose deadline passed while queued",
+         [({"lane": lane}, stats['timed_out']) for lane, stats in lanes.items()]),
+        ("chat_routed_total", "counter", "Chat messages by where they were answered",
+         [({"route": "local"}, routing['local']), ({"route": "llm"}, routing['llm'])]),
+        ("chat_sessions", "gauge", "Live chat sessions", [({}, chat_sessions.stats()['sessions'])]),
+        ("stream_symbols", "gauge", "Symbols subscribed on the upstream tick feed",
+         [({}, market_stream.stats()['symbols'])]),
+        ("tick_buffer_bytes", "gauge", "Memory held by tick buffers", [({}, tick_store.memory_usage()['total'])]),
+        ("broker_rate_queue_depth", "gauge", "Broker calls waiting for the rate limit",
+         [({"endpoint": endpoint, "lane": lane}, stats['queued']) for endpoint, lane, stats in governed]),
+        ("broker_rate_expected_wait_seconds", "gauge", "Expected wait for a broker call made now",
+         [({"endpoint": endpoint, "lane": lane}, stats['expected_wait']) for endpoint, lane, stats in governed]),
+        ("broker_rate_shed_total", "counter", "Broker calls shed or rejected instead of queued",
+         [({"endpoint": endpoint, "lane": lane}, stats.get('shed', 0) + stats.get('rejected', 0) + stats.get('timed_out', 0))
+          for endpoint, lane, stats in governed]),
+        ("broker_circuit_open", "gauge", "1 while a broker endpoint's circuit is open or half-open",
+         [({"endpoint": endpoint}, int(stats['circuit'] != "closed")) for endpoint, stats in broker_calls.items()]),
+        ("broker_resilience_events_total", "counter", "Broker call retries, hedges and stale responses served",
+         [({"endpoint": endpoint, "event": event}, stats.get(event, 0)) for endpoint, stats in broker_calls.items()
+          for event in ("retried", "hedged", "hedge_won", "stale_served", "failed")]),
+        ("instrument_index_size", "gauge", "Instruments in the loaded search index", [({}, instruments['instruments'])]),
+        ("log_queue_depth", "gauge", "Log records waiting for the writer thread", [({}, logs['queued'])]),
+        ("log_records_dropped_total", "counter", "Log records discarded",
+         [({"reason": "queue_full"}, logs['dropped']), ({"reason": "sampled_out"}, logs['sampled_out'])]),
+    ]
+
+metrics.register_collector(collect_service_stats)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Latency histograms, error counts, cache hit rates and gauges in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,11 @@
 from flask import Blueprint, request, jsonify
 from services.paypal_client import paypalrestsdk
+from services.registry import service_registry, ServiceUnavailable
+from services.metrics import track_upstream, upstream_errors
 from flask_cors import cross_origin
+import logging
+
+logger = logging.getLogger(__name__)
 
 payment_bp = Blueprint('payment', __name__)
 
@@ -16,6 +21,9 @@ def create_payment():
         amount = data['amount']
         currency = data.get('currency', 'USD')
 
+        # Configures the SDK on first use
+        service_registry.get('paypal')
+
         # Create PayPal payment
         payment = paypalrestsdk.Payment({
             "intent": "sale",
@@ -35,7 +43,10 @@ def create_payment():
             }]
         })
 
-        if payment.create():
+        with track_upstream('paypal', 'create'):
+            created = payment.create()
+
+        if created:
             # Get approval URL
             approval_url = next(link.href for link in payment.links if link.rel == 'approval_url')
             return jsonify({
@@ -45,18 +56,22 @@ def create_payment():
             })
         else:
             # Get detailed error message
+            upstream_errors.inc('paypal', 'create')
             error_details = payment.error.get('details', [{}])[0].get('issue', 'Unknown error')
-            print(f"PayPal payment creation failed: {error_details}")
+            logger.error(f"PayPal payment creation failed: {error_details}")
             return jsonify({"error": f"Payment creation failed: {error_details}"}), 400
 
+    except ServiceUnavailable as e:
+        logger.error(f"PayPal not configured: {str(e)}")
+        return jsonify({"error": "Payments are currently unavailable."}), 503
     except paypalrestsdk.exceptions.UnauthorizedAccess:
-        print("PayPal authorization error: Invalid credentials")
+        logger.error("PayPal authorization error: Invalid credentials")
         return jsonify({"error": "PayPal authorization failed. Please check API credentials."}), 401
     except paypalrestsdk.exceptions.ConnectionError as e:
-        print(f"PayPal connection error: {str(e)}")
+        logger.error(f"PayPal connection error: {str(e)}")
         return jsonify({"error": "Could not connect to PayPal. Please try again later."}), 503
     except Exception as e:
-        print(f"Error creating payment: {str(e)}")
+        logger.error(f"Error creating payment: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @payment_bp.route('/execute-payment', methods=['POST'])
@@ -68,23 +83,32 @@ def execute_payment():
         if not data or 'payment_id' not in data or 'payer_id' not in data:
             return jsonify({"error": "Missing payment_id or payer_id"}), 400
 
-        payment = paypalrestsdk.Payment.find(data['payment_id'])
-        
-        if payment.execute({"payer_id": data['payer_id']}):
+        service_registry.get('paypal')
+        with track_upstream('paypal', 'find'):
+            payment = paypalrestsdk.Payment.find(data['payment_id'])
+
+        with track_upstream('paypal', 'execute'):
+            executed = payment.execute({"payer_id": data['payer_id']})
+
+        if executed:
             return jsonify({
                 "status": "success",
                 "payment_id": payment.id
             })
         else:
+            upstream_errors.inc('paypal', 'execute')
             error_details = payment.error.get('details', [{}])[0].get('issue', 'Unknown error')
-            print(f"PayPal payment execution failed: {error_details}")
+            logger.error(f"PayPal payment execution failed: {error_details}")
             return jsonify({"error": f"Payment execution failed: {error_details}"}), 400
 
+    except ServiceUnavailable as e:
+        logger.error(f"PayPal not configured: {str(e)}")
+        return jsonify({"error": "Payments are currently unavailable."}), 503
     except paypalrestsdk.exceptions.UnauthorizedAccess:
-        print("PayPal authorization error: Invalid credentials")
+        logger.error("PayPal authorization error: Invalid credentials")
         return jsonify({"error": "PayPal authorization failed. Please check API credentials."}), 401
     except paypalrestsdk.exceptions.ResourceNotFound:
         return jsonify({"error": "Payment not found. Invalid payment_id."}), 404
     except Exception as e:
-        print(f"Error executing payment: {str(e)}")
+        logger.error(f"Error executing payment: {str(e)}")
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
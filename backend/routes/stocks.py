@@ -1,9 +1,25 @@
-from flask import Blueprint, jsonify, request
-from services.angel_one import angel_one_service
+from flask import Blueprint, Response, jsonify, request, g, current_app, stream_with_context
+from services.angel_one import session_registry
+from services.cache import MARKET_OPEN
+from services.candle_store import (
+    IST, INTERVAL_SECONDS, array_to_candles, format_broker_date, settled_candle_start, settled_until
+)
+from services.analytics import portfolio_analytics
+from services.charges import calculate_charges
+from services.rate_governor import lane, rate_governor
+from services.instruments import SEARCH_LIMIT, instrument_master
+from services.indicators import indicator_engine, parse_set
+from services.screener import (
+    MAX_UNIVERSE, FilterError, compile_filter, load_universe, resolve_universe, screener, universe_names
+)
 from flask_cors import cross_origin
 from functools import wraps
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import jwt
-import os
+import json
+import threading
+import numpy as np
+import time
 from datetime import datetime, timedelta
 import logging
 
@@ -13,6 +29,164 @@ logger = logging.getLogger(__name__)
 
 stocks_bp = Blueprint('stocks', __name__)
 
+# Bounded pool for fanning out independent broker calls
+upstream_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='upstream')
+
+# Per-holding candle fetches get their own pool since they are started from upstream_executor tasks
+candles_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='candles')
+
+# Per-section timeouts in seconds for the portfolio aggregation
+PORTFOLIO_TIMEOUTS = {
+    "holdings": 5,
+    "positions": 5,
+    "historical_data": 8
+}
+
+# Most tokens accepted in one indicators request
+MAX_INDICATOR_TOKENS = 50
+
+# Most tokens accepted in one quotes request
+MAX_QUOTE_TOKENS = 500
+
+# Days of daily candles behind the dashboard's portfolio value chart
+PORTFOLIO_CHART_DAYS = 30
+
+# Candle store keys with a chart fill in flight, so repeated polls don't queue duplicates
+_chart_fills = set()
+_chart_fills_lock = threading.Lock()
+
+def fan_out(calls, timeouts):
+    """Run independent upstream calls concurrently, each with its own timeout
+
+    `calls` maps section names to callables or already submitted futures.
+    Returns (results, errors) keyed by section name. A section whose call
+    times out, raises or returns None gets an error flag and no result.
+    """
+    started = time.monotonic()
+    futures = {
+        name: call if isinstance(call, Future) else upstream_executor.submit(call)
+        for name, call in calls.items()
+    }
+    results, errors = {}, {}
+    for name, future in futures.items():
+        remaining = max(0, started + timeouts[name] - time.monotonic())
+        try:
+            results[name] = future.result(timeout=remaining)
+            errors[name] = None if results[name] is not None else "upstream_error"
+        except FutureTimeoutError:
+            logger.warning(f"Upstream call '{name}' timed out after {timeouts[name]}s")
+            results[name] = None
+            errors[name] = "timeout"
+        except Exception as e:
+            logger.error(f"Upstream call '{name}' failed: {str(e)}")
+            results[name] = None
+            errors[name] = "upstream_error"
+    return results, errors
+
+def compute_holdings_analytics(angel_one, holdings_data, days, interval="ONE_DAY"):
+    """Fetch candles for every holding concurrently and run the portfolio analytics"""
+    now = time.time()
+    from_date, to_date = format_broker_date(now - days * 86400), format_broker_date(now)
+    futures = [
+        candles_executor.submit(angel_one.get_candles, holding['symboltoken'], from_date, to_date,
+                                interval, holding.get('exchange', 'NSE'))
+        for holding in holdings_data
+    ]
+
+    symbols, quantities, average_prices, series = [], [], [], []
+    for holding, future in zip(holdings_data, futures):
+        candles = future.result()
+        if candles is None or not candles.shape[1]:
+            logger.warning(f"No candles for {holding.get('tradingsymbol')}, leaving it out of analytics")
+            continue
+        symbols.append(holding['tradingsymbol'])
+        quantities.append(float(holding['quantity']))
+        average_prices.append(float(holding['averageprice']))
+        series.append((candles[0], candles[4]))
+    return portfolio_analytics(symbols, quantities, average_prices, series, interval)
+
+def fill_chart_candles(angel_one, holdings_data, start, interval="ONE_DAY"):
+    """Fetch missing settled candles for holdings into the candle store, in the background lane
+
+    Fills stop at the latest settled candle so they never need a live candle
+    request, and each key is fetched at most once at a time.
+    """
+    from_date = format_broker_date(start)
+    to_date = format_broker_date(settled_candle_start(interval))
+    for holding in holdings_data:
+        key = (holding.get('exchange', 'NSE'), str(holding['symboltoken']), interval)
+        with _chart_fills_lock:
+            if key in _chart_fills:
+                continue
+            _chart_fills.add(key)
+
+        def fill(key=key):
+            try:
+                with lane('background'):
+                    angel_one.get_candles(key[1], from_date, to_date, interval, key[0])
+            finally:
+                with _chart_fills_lock:
+                    _chart_fills.discard(key)
+
+        candles_executor.submit(fill)
+
+def portfolio_chart(angel_one, holdings_data, days=PORTFOLIO_CHART_DAYS):
+    """Daily portfolio value from stored settled candles, ending with today's value at ltp
+
+    Makes no broker calls itself. Returns (points, pending) where pending
+    counts holdings whose candles are still being fetched in the background;
+    until they are stored the chart is left empty rather than understated.
+    """
+    now = datetime.now(IST)
+    start = now.timestamp() - days * 86400
+    symbols, quantities, average_prices, series, ltps, missing = [], [], [], [], [], []
+    for holding in holdings_data:
+        candles = angel_one.get_stored_candles(holding['symboltoken'], start, "ONE_DAY", holding.get('exchange', 'NSE'))
+        if candles is None:
+            missing.append(holding)
+        elif candles.shape[1]:
+            symbols.append(holding['tradingsymbol'])
+            quantities.append(float(holding['quantity']))
+            average_prices.append(float(holding['averageprice']))
+            ltps.append(float(holding['ltp']))
+            series.append((candles[0], candles[4]))
+    if missing:
+        fill_chart_candles(angel_one, missing, start)
+        return [], len(missing)
+
+    analytics = portfolio_analytics(symbols, quantities, average_prices, series)
+    if not analytics:
+        return [], 0
+    points = [
+        {"timestamp": timestamp, "close": value}
+        for timestamp, value in zip(format_timestamps(analytics['index']),
+                                    analytics['portfolio_value'].tolist())
+    ]
+    # Today's daily candle only settles after the close, so value today's session at ltp
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if now.weekday() < 5 and now.time() >= MARKET_OPEN and analytics['index'][-1] < today.timestamp():
+        points.append({"timestamp": today.isoformat(), "close": float(np.dot(ltps, quantities))})
+    return points, 0
+
+def format_timestamps(timestamps):
+    """Format epoch seconds as ISO timestamps in IST"""
+    return [datetime.fromtimestamp(ts, IST).isoformat() for ts in timestamps.tolist()]
+
+def series_to_json(values):
+    """Round a float series for JSON, with NaN (not enough candles yet) as null"""
+    return [None if value != value else value for value in np.round(values, 4).tolist()]
+
+def request_session():
+    """Angel One session for the request's bearer token, or None if there is none"""
+    token = request.headers.get('Authorization')
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token.split(' ')[1], current_app.config['SECRET_KEY'], algorithms=['HS256'])
+    except Exception:
+        return None
+    return session_registry.get(payload['client_id'])
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -22,11 +196,16 @@ def token_required(f):
 
         try:
             token = token.split(' ')[1]
-            jwt.decode(token, os.getenv('SECRET_KEY'), algorithms=['HS256'])
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
         except Exception as e:
             logger.error(f"Token validation error: {str(e)}")
             return jsonify({"error": "Invalid token"}), 401
 
+        # Resolve the caller's own Angel One session
+        g.angel_one = session_registry.get(payload['client_id'])
+        if not g.angel_one:
+            return jsonify({"error": "Angel One session expired, please log in again"}), 401
+
         return f(*args, **kwargs)
     return decorated
 
@@ -36,7 +215,7 @@ def token_required(f):
 def get_profile():
     """Get user's Angel One profile"""
     try:
-        profile = angel_one_service.get_profile()
+        profile = g.angel_one.get_profile()
         if profile:
             return jsonify(profile)
         return jsonify({"error": "Failed to fetch profile"}), 400
@@ -50,8 +229,8 @@ def get_profile():
 def get_holdings():
     """Get detailed holdings data"""
     try:
-        holdings = angel_one_service.get_holdings()
-        logger.info(f"Holdings response: {holdings}")
+        holdings = g.angel_one.get_holdings()
+        logger.debug(f"Holdings fetched: {len((holdings or {}).get('data') or [])} rows")
         if holdings and 'data' in holdings:
             return jsonify(holdings)
         return jsonify({"error": "Failed to fetch holdings"}), 400
@@ -65,8 +244,8 @@ def get_holdings():
 def get_positions():
     """Get current positions"""
     try:
-        positions = angel_one_service.get_portfolio_positions()
-        logger.info(f"Positions response: {positions}")
+        positions = g.angel_one.get_portfolio_positions()
+        logger.debug(f"Positions fetched: {len((positions or {}).get('data') or [])} rows")
         if positions and 'data' in positions:
             return jsonify(positions)
         return jsonify({"error": "Failed to fetch positions"}), 400
@@ -74,82 +253,351 @@ def get_positions():
         logger.error(f"Positions fetch error: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@stocks_bp.route('/refresh', methods=['POST'])
+@cross_origin()
+@token_required
+def refresh_cache():
+    """Drop cached account data so the next read hits the broker"""
+    g.angel_one.invalidate_cache()
+    return jsonify({"status": "success", "message": "Cache invalidated"})
+
+@stocks_bp.route('/rate-limits', methods=['GET'])
+@cross_origin()
+@token_required
+def get_rate_limits():
+    """Broker rate limit tokens, queue depth and expected wait per endpoint and lane"""
+    return jsonify(rate_governor.stats())
+
+@stocks_bp.route('/search', methods=['GET'])
+@cross_origin()
+def search_instruments():
+    """Autocomplete instruments by trading symbol or name prefix"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing q parameter"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', SEARCH_LIMIT)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    matches = instrument_master.search(query, limit, request.args.get('exchange'))
+    if matches is None:
+        return jsonify({"error": "Instrument list is still loading, try again shortly"}), 503
+    return jsonify({"status": True, "data": matches})
+
+@stocks_bp.route('/resolve', methods=['GET'])
+@cross_origin()
+def resolve_instrument():
+    """Look up an instrument by symbol token or trading symbol"""
+    exchange = request.args.get('exchange', 'NSE')
+    token, symbol = request.args.get('token'), request.args.get('symbol')
+    if not token and not symbol:
+        return jsonify({"error": "Pass a token or a symbol"}), 400
+    if instrument_master.index is None:
+        return jsonify({"error": "Instrument list is still loading, try again shortly"}), 503
+
+    instrument = instrument_master.resolve_token(token, exchange) if token else instrument_master.resolve_symbol(symbol, exchange)
+    if instrument:
+        return jsonify({"status": True, "data": instrument})
+    return jsonify({"error": f"No {exchange} instrument matches {token or symbol}"}), 404
+
 @stocks_bp.route('/portfolio', methods=['GET'])
 @cross_origin()
+@token_required
 def get_portfolio():
     """Get complete portfolio data for dashboard"""
     try:
-        # Get holdings and positions
-        holdings = angel_one_service.get_holdings()
-        positions = angel_one_service.get_portfolio_positions()
+        # Worker threads have no request context, so hand them the session directly
+        angel_one = g.angel_one
+        holdings_future = upstream_executor.submit(angel_one.get_holdings)
+
+        def fetch_portfolio_history():
+            # Value of the whole portfolio over the last 30 days, served from stored candles
+            holdings = holdings_future.result(timeout=PORTFOLIO_TIMEOUTS['holdings'])
+            holdings_data = (holdings or {}).get('data') or []
+            if not holdings_data:
+                return [], 0
+            return portfolio_chart(angel_one, holdings_data)
 
-        if not holdings or not positions:
-            return jsonify({"error": "Failed to fetch portfolio data"}), 400
+        # Positions and the history chart run alongside holdings instead of after them
+        results, errors = fan_out({
+            "holdings": holdings_future,
+            "positions": angel_one.get_portfolio_positions,
+            "historical_data": fetch_portfolio_history
+        }, PORTFOLIO_TIMEOUTS)
+
+        holdings, positions = results['holdings'], results['positions']
+        if not holdings and not positions:
+            return jsonify({"error": "Failed to fetch portfolio data", "errors": errors}), 400
 
         # Calculate total portfolio value and other metrics
-        holdings_data = holdings.get('data', [])
-        positions_data = positions.get('data', [])
-
-        # Process holdings data
-        total_investment = sum(float(holding['averageprice']) * float(holding['quantity']) 
-                             for holding in holdings_data)
-        total_current_value = sum(float(holding['ltp']) * float(holding['quantity']) 
-                                for holding in holdings_data)
+        holdings_data = (holdings or {}).get('data') or []
+        positions_data = (positions or {}).get('data') or []
+
+        # Process holdings data as columns: average price, ltp, quantity
+        columns = np.array([[h['averageprice'], h['ltp'], h['quantity']] for h in holdings_data],
+                           dtype=np.float64).reshape(-1, 3)
+        total_investment = float(columns[:, 0] @ columns[:, 2])
+        total_current_value = float(columns[:, 1] @ columns[:, 2])
+
+        # What selling every holding at ltp would cost, so P&L can be shown net of charges
+        exit_charges = np.zeros(len(holdings_data))
+        if holdings_data:
+            try:
+                exit_charges = calculate_charges('equity-delivery', 'SELL', columns[:, 2], columns[:, 1])['total']
+            except Exception as e:
+                logger.error(f"Exit charges calculation failed: {str(e)}")
+        gross_pnl = (columns[:, 1] - columns[:, 0]) * columns[:, 2]
+        # Copies, since holdings_data is shared with the response cache
+        holdings_data = [
+            {**holding, "exit_charges": charges, "net_pnl": pnl}
+            for holding, charges, pnl in zip(holdings_data, exit_charges.round(2).tolist(),
+                                             (gross_pnl - exit_charges).round(2).tolist())
+        ]
         # total_pl = sum(float(holding['pnl']) for holding in holdings_data)
 
         # Calculate daily change from positions
-        daily_pl = sum(float(position['dayPl']) for position in positions_data) if positions_data else 0
+        daily_pl = float(np.array([p['dayPl'] for p in positions_data], dtype=np.float64).sum()) if positions_data else 0
         daily_change = (daily_pl / total_investment * 100) if total_investment > 0 else 0
 
-        # Get historical data for portfolio value chart
-        historical_data = []
-        if holdings_data:
-            # Get last 30 days data for the first holding as a sample
-            from_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M")
-            to_date = datetime.now().strftime("%Y-%m-%d %H:%M")
-            sample_token = holdings_data[0]['symboltoken']
-            hist_data = angel_one_service.get_historical_data(sample_token, from_date, to_date)
-            if hist_data and 'data' in hist_data:
-                historical_data = hist_data['data']
+        historical_data, pending = results['historical_data'] or ([], 0)
+        if pending:
+            errors['historical_data'] = "warming"
 
         return jsonify({
             "total_value": total_current_value,
             "holdings": holdings_data,
             "positions": positions_data,
             "historical_data": historical_data,
+            "partial": any(errors.values()),
+            "errors": errors,
             "metrics": {
                 "daily_change": daily_change,
                 "total_investments": total_investment,
                 # "total_pl": total_pl,
-                "daily_pl": daily_pl
+                "daily_pl": daily_pl,
+                "estimated_exit_charges": round(float(exit_charges.sum()), 2)
             }
         })
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@stocks_bp.route('/portfolio/analytics', methods=['GET'])
+@cross_origin()
+@token_required
+def get_portfolio_analytics():
+    """Get value series, risk metrics and per-holding contribution across all holdings"""
+    try:
+        days = int(request.args.get('days', 365))
+    except ValueError:
+        return jsonify({"error": "days must be an integer"}), 400
+    if days < 1:
+        return jsonify({"error": "days must be positive"}), 400
+    interval = request.args.get('interval', 'ONE_DAY')
+    if interval not in INTERVAL_SECONDS:
+        return jsonify({"error": f"Unknown interval: {interval}"}), 400
+
+    try:
+
+        holdings = g.angel_one.get_holdings()
+        if not holdings or not holdings.get('status'):
+            return jsonify({"error": "Failed to fetch holdings"}), 400
+
+        analytics = compute_holdings_analytics(g.angel_one, holdings.get('data') or [], days, interval)
+        if not analytics:
+            return jsonify({"error": "No historical data available for holdings"}), 400
+
+        metrics = dict(analytics['metrics'])
+        metrics['max_drawdown_peak'], metrics['max_drawdown_trough'] = format_timestamps(
+            np.array([metrics['max_drawdown_peak'], metrics['max_drawdown_trough']]))
+
+        return jsonify({
+            "metrics": metrics,
+            "holdings": analytics['holdings'],
+            "series": {
+                "timestamps": format_timestamps(analytics['index']),
+                "portfolio_value": analytics['portfolio_value'].tolist(),
+                "daily_returns": analytics['daily_returns'].tolist()
+            }
+        })
+    except Exception as e:
+        logger.error(f"Portfolio analytics error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
 @stocks_bp.route('/price/<token>', methods=['GET'])
 @cross_origin()
 @token_required
 def get_live_price(token):
     """Get live price for a specific stock"""
-    price_data = angel_one_service.get_live_price(token)
+    price_data = g.angel_one.get_live_price(token)
     if price_data:
         return jsonify(price_data)
     return jsonify({"error": f"Failed to fetch price for {token}"}), 400
 
+@stocks_bp.route('/quotes', methods=['POST'])
+@cross_origin()
+@token_required
+def get_quotes():
+    """Get live quotes for many stocks in one request"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('tokens'):
+        return jsonify({"error": "Missing tokens in request"}), 400
+    tokens = data['tokens']
+    # Each entry is a token string, or {"exchange": ..., "token": ...} for a token on another exchange
+    if not isinstance(tokens, list) or not all(
+            isinstance(entry, str) or isinstance(entry, dict) and isinstance(entry.get('token'), str)
+            for entry in tokens):
+        return jsonify({"error": "tokens must be a list of token strings"}), 400
+    if len(tokens) > MAX_QUOTE_TOKENS:
+        return jsonify({"error": f"Pass at most {MAX_QUOTE_TOKENS} tokens"}), 400
+
+    quotes = g.angel_one.get_live_prices(tokens, data.get('exchange', 'NSE'))
+    if quotes is not None:
+        return jsonify({"status": True, "data": quotes})
+    return jsonify({"error": "Failed to fetch quotes"}), 400
+
 @stocks_bp.route('/historical/<token>', methods=['GET'])
 @cross_origin()
+@token_required
 def get_historical(token):
     """Get historical data for a token"""
     try:
         from_date = request.args.get('from_date', (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M"))
         to_date = request.args.get('to_date', datetime.now().strftime("%Y-%m-%d %H:%M"))
         interval = request.args.get('interval', 'ONE_DAY')
+        exchange = request.args.get('exchange', 'NSE')
 
-        data = angel_one_service.get_historical_data(token, from_date, to_date, interval)
+        if request.args.get('stream') in ('1', 'true'):
+            return stream_historical(g.angel_one, token, from_date, to_date, interval, exchange)
+
+        data = g.angel_one.get_historical_data(token, from_date, to_date, interval, exchange)
         if data:
             return jsonify(data)
         return jsonify({"error": f"Failed to fetch historical data for {token}"}), 400
     except Exception as e:
-        return jsonify({"error": str(e)}), 500 
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500 
+
+@stocks_bp.route('/indicators/<tokens>', methods=['GET'])
+@cross_origin()
+@token_required
+def get_indicators(tokens):
+    """Indicator series for one or more comma-separated tokens
+
+    `set` picks the indicators, e.g. "sma:50,ema:200,rsi,macd,bb,vwap,atr";
+    values are computed incrementally over the cached candles.
+    """
+    try:
+        spec = parse_set(request.args.get('set'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    tokens = list(dict.fromkeys(token.strip() for token in tokens.split(',') if token.strip()))
+    if not tokens or len(tokens) > MAX_INDICATOR_TOKENS:
+        return jsonify({"error": f"Pass between 1 and {MAX_INDICATOR_TOKENS} tokens"}), 400
+    interval = request.args.get('interval', 'ONE_DAY')
+    if interval not in INTERVAL_SECONDS:
+        return jsonify({"error": f"Unknown interval: {interval}"}), 400
+
+    try:
+        from_date = request.args.get('from_date', (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%d %H:%M"))
+        to_date = request.args.get('to_date', datetime.now().strftime("%Y-%m-%d %H:%M"))
+        exchange = request.args.get('exchange', 'NSE')
+        latest = request.args.get('latest') in ('1', 'true')
+
+        futures = {
+            token: candles_executor.submit(g.angel_one.get_candles, token, from_date, to_date, interval, exchange)
+            for token in tokens
+        }
+        settled = settled_until(interval)
+        data, errors, columns = {}, {}, None
+        for token, future in futures.items():
+            candles = future.result()
+            if candles is None:
+                errors[token] = "upstream_error"
+                continue
+            columns, values = indicator_engine.compute((exchange, token, interval), spec, candles, settled,
+                                                       intraday=interval != 'ONE_DAY')
+            if latest:
+                values = values[:, -1:]
+            data[token] = {
+                "timestamps": format_timestamps(values[0]),
+                **{column: series_to_json(values[row]) for row, column in enumerate(columns, start=1)}
+            }
+
+        if not data:
+            return jsonify({"error": "Failed to fetch historical data for indicators", "errors": errors}), 400
+        return jsonify({"status": True, "columns": columns, "data": data, "errors": errors})
+    except Exception as e:
+        logger.error(f"Indicators error: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@stocks_bp.route('/screener/universes', methods=['GET'])
+@cross_origin()
+def get_screener_universes():
+    """Named universes available to the screener"""
+    return jsonify({"status": True, "data": universe_names()})
+
+@stocks_bp.route('/screener', methods=['POST'])
+@cross_origin()
+@token_required
+def run_screener():
+    """Scan a universe for a filter, streaming matches as newline-delimited JSON
+
+    Body: {"filter": "rsi(14) < 30 and close > sma(200)", "universe": "nifty500"
+    or a list of symbols/tokens, "exchange": "NSE", "interval": "ONE_DAY"}.
+    Lines are {"matches": [...]} as chunks finish, then {"done": {...}}.
+    """
+    data = request.get_json() or {}
+    try:
+        screen_filter = compile_filter(data.get('filter') or '')
+    except FilterError as e:
+        return jsonify({"error": str(e)}), 400
+
+    exchange = data.get('exchange', 'NSE')
+    interval = data.get('interval', 'ONE_DAY')
+    if interval not in INTERVAL_SECONDS:
+        return jsonify({"error": f"Unknown interval: {interval}"}), 400
+    universe = data.get('universe')
+    entries = load_universe(universe) if isinstance(universe, str) else universe
+    if not isinstance(entries, list) or not entries:
+        return jsonify({"error": "universe must be a non-empty list or one of: " + ", ".join(universe_names())}), 400
+    if len(entries) > MAX_UNIVERSE:
+        return jsonify({"error": f"Universe is limited to {MAX_UNIVERSE} symbols"}), 400
+    if instrument_master.index is None and not all(str(entry).isdigit() for entry in entries):
+        return jsonify({"error": "Instrument list is still loading, try again shortly"}), 503
+
+    instruments, unresolved = resolve_universe(entries, exchange)
+    if not instruments:
+        return jsonify({"error": "No symbols in the universe could be resolved", "unresolved": unresolved}), 400
+    angel_one = g.angel_one
+    if not angel_one.ensure_session():
+        return jsonify({"error": "Failed to start the screener"}), 400
+
+    def generate():
+        try:
+            for kind, payload in screener.scan(angel_one, screen_filter, instruments, interval, exchange):
+                if kind == "done":
+                    payload["unresolved"] = unresolved
+                yield json.dumps({kind: payload}) + "\n"
+        except Exception as e:
+            logger.error(f"Screener error: {str(e)}")
+            yield json.dumps({"error": "Screener failed"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def stream_historical(angel_one, token, from_date, to_date, interval, exchange):
+    """Stream candles as newline-delimited JSON, one line per fetched chunk"""
+    if not angel_one.ensure_session():
+        return jsonify({"error": f"Failed to fetch historical data for {token}"}), 400
+
+    def generate():
+        try:
+            # Bulk exports queue behind dashboard reads for the broker's candle limit
+            for candles in angel_one.iter_historical_data(token, from_date, to_date, interval, exchange,
+                                                          lane_name='background'):
+                yield json.dumps({"data": array_to_candles(candles)}) + "\n"
+        except Exception as e:
+            logger.error(f"Historical stream error for {token}: {str(e)}")
+            yield json.dumps({"error": f"Failed to fetch historical data for {token}"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
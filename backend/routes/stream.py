@@ -0,0 +1,108 @@
+from flask import request, current_app
+from flask_socketio import join_room, leave_room
+from services.angel_one import session_registry
+from services.market_stream import market_stream
+from services.market_feed import EXCHANGE_TYPES, AngelOneFeed, FakeFeed
+from services.tick_buffer import tick_store
+import jwt
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# "fake" streams generated ticks instead of connecting to the broker
+MARKET_FEED = os.getenv('MARKET_FEED', 'angelone')
+
+# SocketIO session id -> Angel One client_id
+connected_clients = {}
+# Guards connected_clients, which the feed thread reads while handlers add and remove clients
+connected_clients_lock = threading.Lock()
+
+# Seconds between sweeps for tick buffers of symbols nobody watches
+EVICT_INTERVAL = 60
+
+def live_feed_credentials():
+    """Feed credentials from the session of a connected client that is still logged in, or None"""
+    with connected_clients_lock:
+        client_ids = set(connected_clients.values())
+    for client_id in client_ids:
+        angel_one = session_registry.get(client_id)
+        if angel_one and angel_one.ensure_session():
+            return angel_one.feed_credentials()
+    return None
+
+def make_feed(on_tick, on_connect):
+    """Build the upstream feed; it re-reads credentials from a live session on every reconnect"""
+    if MARKET_FEED == 'fake':
+        return FakeFeed(on_tick, on_connect)
+    return AngelOneFeed(live_feed_credentials, on_tick=on_tick, on_connect=on_connect)
+
+def parse_subscription(data):
+    """(exchange, tokens) from a subscribe/unsubscribe payload, or an error message"""
+    exchange = (data or {}).get('exchange', 'NSE')
+    if exchange not in EXCHANGE_TYPES:
+        return None, None, f"Unknown exchange: {exchange}"
+    return exchange, [str(token) for token in data.get('tokens', [])], None
+
+def register_stream_events(socketio):
+    """Register live tick streaming handlers on the app's SocketIO instance"""
+    market_stream.attach(
+        lambda event, data, room: socketio.emit(event, data, to=room),
+        socketio.start_background_task
+    )
+    market_stream.tick_listeners.append(tick_store.add)
+
+    def evict_loop():
+        while True:
+            time.sleep(EVICT_INTERVAL)
+            tick_store.evict(market_stream.is_watched)
+    socketio.start_background_task(evict_loop)
+
+    @socketio.on('connect')
+    def handle_connect(auth=None):
+        """Accept only clients with a valid session token"""
+        try:
+            token = (auth or {}).get('token')
+            payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        except Exception as e:
+            logger.warning(f"Rejected stream connection: {str(e)}")
+            return False
+        if not session_registry.get(payload['client_id']):
+            return False
+        with connected_clients_lock:
+            connected_clients[request.sid] = payload['client_id']
+
+    @socketio.on('subscribe')
+    def handle_subscribe(data):
+        """Join one room per symbol and start streaming its ticks"""
+        angel_one = session_registry.get(connected_clients.get(request.sid))
+        if not angel_one or not angel_one.ensure_session():
+            return {"error": "Angel One session expired, please log in again"}
+
+        exchange, tokens, error = parse_subscription(data)
+        if error:
+            return {"error": error, "code": 400}
+        market_stream.ensure_feed(make_feed)
+        for token in tokens:
+            join_room(market_stream.room(exchange, token))
+        market_stream.subscribe(request.sid, exchange, tokens)
+        return {"status": "subscribed", "tokens": tokens}
+
+    @socketio.on('unsubscribe')
+    def handle_unsubscribe(data):
+        """Leave symbol rooms and release their upstream subscriptions"""
+        exchange, tokens, error = parse_subscription(data)
+        if error:
+            return {"error": error, "code": 400}
+        for token in tokens:
+            leave_room(market_stream.room(exchange, token))
+        market_stream.unsubscribe(request.sid, exchange, tokens)
+        return {"status": "unsubscribed", "tokens": tokens}
+
+    @socketio.on('disconnect')
+    def handle_disconnect(*args):
+        with connected_clients_lock:
+            connected_clients.pop(request.sid, None)
+        market_stream.remove_client(request.sid)
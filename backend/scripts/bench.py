@@ -0,0 +1,272 @@
+"""Offline load test of the API against fake broker, Gemini and PayPal backends
+
+Runs each scenario with a pool of concurrent clients through Flask's test
+client, reports latency percentiles and throughput, and can save the run as
+JSON and compare it with an earlier one:
+
+    python scripts/bench.py --output baseline.json
+    python scripts/bench.py --compare baseline.json --threshold 0.25
+
+With --compare the exit status is 1 when any scenario's p95 latency grows,
+or its throughput drops, by more than the threshold, so CI can fail on it.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add backend directory to path
+
+from scripts import fakes
+
+SCENARIOS = ["portfolio", "historical", "price", "search", "indicators", "screener", "chat", "payment"]
+
+# Symbol tokens the price and history scenarios cycle through
+TOKENS = [str(1001 + i) for i in range(50)]
+
+# Prefixes typed into the instrument search box
+SEARCH_QUERIES = ["SYM1", "SYM10", "SYM105", "SYM1200-EQ", "sym19", "SYM3", "SYM100128NOV"]
+
+CHAT_MESSAGES = [
+    "Should I diversify my portfolio?",
+    "How risky are my current holdings?",
+    "Would you recommend adding more banking stocks?",
+    "What should I do with my worst performer?",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per scenario")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients per scenario")
+    parser.add_argument('--broker-latency', type=float, default=20, help="Fake broker latency in ms")
+    parser.add_argument('--llm-latency', type=float, default=200, help="Fake Gemini latency in ms")
+    parser.add_argument('--paypal-latency', type=float, default=100, help="Fake PayPal latency in ms")
+    parser.add_argument('--jitter', type=float, default=0.5, help="Extra random latency, as a fraction of the base")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability that a fake upstream call fails")
+    parser.add_argument('--chat-cache', action='store_true', help="Let chat requests use the response cache")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Write the report to this JSON file")
+    parser.add_argument('--compare', help="Compare with a report saved by an earlier run")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed relative regression")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point every on-disk cache at a scratch directory and install the fakes before the app loads"""
+    scratch = tempfile.mkdtemp(prefix='bench-')
+    os.environ.setdefault('CANDLE_STORE_DIR', os.path.join(scratch, 'candles'))
+    os.environ.setdefault('MODEL_CACHE_PATH', os.path.join(scratch, 'gemini_models.json'))
+    os.environ.setdefault('LOG_DIR', os.path.join(scratch, 'logs'))
+    os.environ.setdefault('INSTRUMENT_INDEX_DIR', os.path.join(scratch, 'instruments'))
+    os.environ.setdefault('LOG_CONSOLE', '0')
+    os.environ.setdefault('GEMINI_API_KEY', 'bench-key')
+    os.environ.setdefault('PAYPAL_CLIENT_ID', 'bench-client')
+    os.environ.setdefault('PAYPAL_CLIENT_SECRET', 'bench-secret')
+    os.environ.pop('LLM_CACHE_DIR', None)
+
+    for faults, latency in ((fakes.broker_faults, args.broker_latency),
+                            (fakes.llm_faults, args.llm_latency),
+                            (fakes.paypal_faults, args.paypal_latency)):
+        faults.configure(latency=latency / 1000, jitter=latency / 1000 * args.jitter, seed=args.seed)
+
+    if 'INSTRUMENT_MASTER_URL' not in os.environ:
+        scrip_master = os.path.join(scratch, 'scrip_master.json')
+        with open(scrip_master, 'w') as f:
+            json.dump(fakes.fake_scrip_master(), f)
+        os.environ['INSTRUMENT_MASTER_URL'] = scrip_master
+
+    fakes.install_fake_sdks()
+    import services.angel_one as angel_one
+    angel_one.SmartConnect = fakes.FakeSmartConnect
+
+
+def login(client):
+    response = client.post('/api/auth/login',
+                           json={"client_id": "BENCH01", "password": "1234", "totp": "JBSWY3DPEHPK3PXP"})
+    if response.status_code != 200:
+        raise SystemExit(f"Login against the fake broker failed: {response.status_code} {response.get_json()}")
+    return {"Authorization": f"Bearer {response.get_json()['token']}"}
+
+
+def build_requests(args):
+    """Map each scenario to a function making its i-th request with a test client"""
+    today = datetime.now()
+    from_date = (today - timedelta(days=90)).strftime("%Y-%m-%d 09:15")
+    to_date = today.strftime("%Y-%m-%d 15:30")
+
+    def portfolio(client, headers, i):
+        return client.get('/api/stocks/portfolio', headers=headers)
+
+    def historical(client, headers, i):
+        return client.get(f'/api/stocks/historical/{TOKENS[i % len(TOKENS)]}', headers=headers,
+                          query_string={"from_date": from_date, "to_date": to_date, "interval": "ONE_DAY"})
+
+    def price(client, headers, i):
+        return client.get(f'/api/stocks/price/{TOKENS[i % len(TOKENS)]}', headers=headers)
+
+    def search(client, headers, i):
+        return client.get('/api/stocks/search', query_string={"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]})
+
+    def indicators(client, headers, i):
+        batch = ",".join(TOKENS[(i * 5 + j) % len(TOKENS)] for j in range(5))
+        return client.get(f'/api/stocks/indicators/{batch}', headers=headers,
+                          query_string={"from_date": from_date, "to_date": to_date, "set": "sma:50,rsi,macd,bb,atr"})
+
+    def screener(client, headers, i):
+        response = client.post('/api/stocks/screener', headers=headers,
+                               json={"filter": "rsi(14) < 50 and close > sma(20) * 0.95", "universe": TOKENS})
+        response.get_data()  # Drain the stream so the whole scan is timed
+        return response
+
+    def chat(client, headers, i):
+        payload = {"message": CHAT_MESSAGES[i % len(CHAT_MESSAGES)]}
+        if not args.chat_cache:
+            payload["cache"] = False
+        return client.post('/api/chat', json=payload, headers=headers)
+
+    def payment(client, headers, i):
+        return client.post('/api/create-payment', json={"amount": "9.99", "currency": "USD"})
+
+    return {"portfolio": portfolio, "historical": historical, "price": price, "search": search, "indicators": indicators, "screener": screener, "chat": chat, "payment": payment}
+
+
+def run_scenario(app, make_request, headers, total, concurrency):
+    """Fire `total` requests from `concurrency` clients and collect latencies and statuses"""
+    latencies = np.zeros(total)
+    statuses = Counter()
+    next_index = iter(range(total))
+    index_lock, status_lock = threading.Lock(), threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with index_lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            try:
+                status = make_request(client, headers, i).status_code
+            except Exception:
+                status = 'exception'
+            latencies[i] = time.perf_counter() - started
+            with status_lock:
+                statuses[status] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = latencies * 1000
+    errors = sum(count for status, count in statuses.items() if status == 'exception' or status >= 400)
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_ms": {
+            "p50": round(float(p50), 2),
+            "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2),
+            "mean": round(float(latencies_ms.mean()), 2),
+            "max": round(float(latencies_ms.max()), 2)
+        }
+    }
+
+
+def print_report(results):
+    print(f"{'scenario':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  statuses")
+    for name, result in results.items():
+        latency = result['latency_ms']
+        print(f"{name:<12}{result['throughput_rps']:>10.1f}{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+              f"{latency['p99']:>10.1f}{result['errors']:>8}  {result['statuses']}")
+
+
+def compare(results, baseline, threshold):
+    """Print changes against a baseline report and return the scenarios that regressed"""
+    regressions = []
+    print(f"\nCompared with baseline (threshold {threshold:.0%}):")
+    for name, result in results.items():
+        before = baseline['scenarios'].get(name)
+        if not before:
+            print(f"  {name}: not in baseline")
+            continue
+        p95_change = result['latency_ms']['p95'] / before['latency_ms']['p95'] - 1 if before['latency_ms']['p95'] else 0
+        rps_change = result['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0
+        regressed = p95_change > threshold or rps_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name}: p95 {p95_change:+.1%}, throughput {rps_change:+.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+
+    from app import app
+
+    requests = build_requests(args)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = [name for name in scenarios if name not in requests]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    # Log in and make one untimed request per scenario before any failures are injected,
+    # so model discovery and the broker session are not part of the measurement
+    # The app builds the instrument index in the background on start-up; wait for it
+    from services.instruments import instrument_master
+    deadline = time.monotonic() + 120
+    while instrument_master.index is None and time.monotonic() < deadline:
+        time.sleep(0.2)
+
+    warm_client = app.test_client()
+    headers = login(warm_client)
+    for name in scenarios:
+        requests[name](warm_client, headers, 0)
+    for faults in (fakes.broker_faults, fakes.llm_faults, fakes.paypal_faults):
+        faults.configure(error_rate=args.error_rate)
+
+    results = {}
+    for name in scenarios:
+        print(f"Running {name}: {args.requests} requests, {args.concurrency} clients...")
+        results[name] = run_scenario(app, requests[name], headers, args.requests, args.concurrency)
+
+    print()
+    print_report(results)
+    report = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        "scenarios": results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
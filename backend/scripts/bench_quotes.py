@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add backend directory to path
+
+from scripts.fakes import FakeSmartConnect, fake_scrip_master
+
+# Build the instrument index from a fake scrip master in a scratch directory instead of downloading it
+scratch = tempfile.mkdtemp(prefix='bench-quotes-')
+os.environ.setdefault('INSTRUMENT_INDEX_DIR', os.path.join(scratch, 'instruments'))
+if 'INSTRUMENT_MASTER_URL' not in os.environ:
+    with open(os.path.join(scratch, 'scrip_master.json'), 'w') as f:
+        json.dump(fake_scrip_master(), f)
+    os.environ['INSTRUMENT_MASTER_URL'] = os.path.join(scratch, 'scrip_master.json')
+
+import services.angel_one as angel_one
+
+# Compare broker round trips for a dashboard refresh of many symbols
+SYMBOL_COUNT = 200
+tokens = [str(1000 + i) for i in range(SYMBOL_COUNT)]
+
+angel_one.SmartConnect = FakeSmartConnect
+service = angel_one.session_registry.login("FAKE01", "1234", "JBSWY3DPEHPK3PXP")
+
+for token in tokens:
+    service.get_live_price(token)
+per_token_calls = service.market_api.calls['ltpData']
+
+service.market_api.calls.clear()
+quotes = service.get_live_prices(tokens)
+batched_calls = service.market_api.calls['getMarketData']
+
+assert len(quotes) == SYMBOL_COUNT, f"Expected {SYMBOL_COUNT} quotes, got {len(quotes)}"
+print(f"📊 {SYMBOL_COUNT} symbols")
+print(f"   per-token ltpData calls: {per_token_calls}")
+print(f"   batched getMarketData calls: {batched_calls}")
@@ -46,7 +46,8 @@ def chat():
 
         # Get response from Gemini service
         print("🤖 Requesting response from Gemini...")
-        response = gemini_service.generate_response(message)
+        response = gemini_service.generate_response(message, bypass_cache=data.get("cache") is False,
+                                                   session_id=data.get("session_id"))
         
         if response:
             print("✅ Gemini response received")
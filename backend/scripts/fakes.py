@@ -0,0 +1,308 @@
+"""In-process stand-ins for the broker, Gemini and PayPal SDKs so backend code can run offline"""
+import random
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+# Candle interval lengths in minutes, as used by getCandleData
+INTERVAL_MINUTES = {
+    "ONE_MINUTE": 1, "THREE_MINUTE": 3, "FIVE_MINUTE": 5, "TEN_MINUTE": 10,
+    "FIFTEEN_MINUTE": 15, "THIRTY_MINUTE": 30, "ONE_HOUR": 60, "ONE_DAY": 1440
+}
+
+
+class FakeUpstreamError(ConnectionError):
+    """Raised by a fake SDK call picked for error injection, like a dropped connection"""
+
+
+class FaultInjector:
+    """Latency and error injection shared by the fakes of one upstream service
+
+    Every call sleeps `latency` plus up to `jitter` seconds, then fails with
+    FakeUpstreamError with probability `error_rate`.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, latency=None, jitter=None, error_rate=None, seed=None):
+        """Change any of the settings; None keeps the current value"""
+        with self._lock:
+            if latency is not None:
+                self.latency = latency
+            if jitter is not None:
+                self.jitter = jitter
+            if error_rate is not None:
+                self.error_rate = error_rate
+            if seed is not None:
+                self._random.seed(seed)
+
+    def apply(self, call):
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise FakeUpstreamError(f"Injected failure in {call}")
+
+
+# One injector per upstream, configured by whoever sets up the fakes
+broker_faults = FaultInjector()
+llm_faults = FaultInjector()
+paypal_faults = FaultInjector()
+
+
+def fake_candles(token, fromdate, todate, interval):
+    """Deterministic weekday candles between two broker date strings"""
+    start = datetime.strptime(fromdate, "%Y-%m-%d %H:%M").replace(tzinfo=IST)
+    end = datetime.strptime(todate, "%Y-%m-%d %H:%M").replace(tzinfo=IST)
+    step = timedelta(minutes=INTERVAL_MINUTES[interval])
+    candles = []
+    day = start.replace(hour=0, minute=0)
+    while day <= end:
+        if day.weekday() < 5:
+            if interval == "ONE_DAY":
+                slots = [day]
+            else:
+                slot, close = day.replace(hour=9, minute=15), day.replace(hour=15, minute=30)
+                slots = []
+                while slot < close:
+                    slots.append(slot)
+                    slot += step
+            for slot in slots:
+                if start <= slot <= end:
+                    base = 100 + int(token) % 900 + (slot.timestamp() // 60) % 37
+                    candles.append([slot.isoformat(), base, base + 2, base - 2, base + 1, 1000 + int(token) % 500])
+        day += timedelta(days=1)
+    return candles
+
+
+def fake_scrip_master(equities=2000, derivatives_per_equity=40):
+    """Scrip master records shaped like the broker's: NSE/BSE equities plus NFO options on them"""
+    records = []
+    for i in range(equities):
+        token = 1001 + i
+        symbol = f"SYM{token}"
+        records.append({"token": str(token), "symbol": f"{symbol}-EQ", "name": symbol, "expiry": "",
+                        "strike": "-1.000000", "lotsize": "1", "instrumenttype": "", "exch_seg": "NSE",
+                        "tick_size": "5.000000"})
+        records.append({"token": str(500000 + token), "symbol": symbol, "name": symbol, "expiry": "",
+                        "strike": "-1.000000", "lotsize": "1", "instrumenttype": "", "exch_seg": "BSE",
+                        "tick_size": "1.000000"})
+        for j in range(derivatives_per_equity):
+            strike = 100 + 10 * j
+            records.append({"token": str(3000000 + token * 100 + j), "symbol": f"{symbol}28NOV24{strike}CE",
+                            "name": symbol, "expiry": "28NOV2024", "strike": f"{strike * 100}.000000",
+                            "lotsize": "500", "instrumenttype": "OPTSTK", "exch_seg": "NFO",
+                            "tick_size": "5.000000"})
+    return records
+
+
+class FakeSmartConnect:
+    """Minimal SmartConnect replacement that records how often each API is called"""
+
+    def __init__(self, api_key=None, **kwargs):
+        self.api_key = api_key
+        self.access_token = None
+        self.feed_token = None
+        self.calls = Counter()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        broker_faults.apply(name)
+
+    def _quote(self, exchange, token, mode="OHLC"):
+        price = 100 + int(token) % 900 + random.random()
+        quote = {
+            "exchange": exchange,
+            "tradingSymbol": f"SYM{token}-EQ",
+            "symbolToken": str(token),
+            "ltp": round(price, 2),
+            "open": round(price * 0.99, 2),
+            "high": round(price * 1.01, 2),
+            "low": round(price * 0.98, 2),
+            "close": round(price * 0.995, 2)
+        }
+        if mode == "FULL":
+            quote["tradeVolume"] = 1000 * (int(token) % 97 + 1)
+        return quote
+
+    def generateSession(self, clientCode, password, totp):
+        self._call('generateSession')
+        self.access_token, self.feed_token = "fake-jwt-token", "fake-feed-token"
+        return {
+            "status": True,
+            "message": "SUCCESS",
+            "data": {
+                "clientcode": clientCode,
+                "jwtToken": "fake-jwt-token",
+                "refreshToken": "fake-refresh-token",
+                "feedToken": "fake-feed-token"
+            }
+        }
+
+    def generateToken(self, refresh_token):
+        self._call('generateToken')
+        return {
+            "status": True,
+            "message": "SUCCESS",
+            "data": {
+                "jwtToken": "fake-jwt-token",
+                "refreshToken": "fake-refresh-token",
+                "feedToken": "fake-feed-token"
+            }
+        }
+
+    def getProfile(self, refreshToken):
+        self._call('getProfile')
+        return {"status": True, "message": "SUCCESS", "data": {"clientcode": "FAKE", "name": "Fake User"}}
+
+    def ltpData(self, exchange, tradingsymbol, symboltoken):
+        self._call('ltpData')
+        quote = self._quote(exchange, symboltoken)
+        return {"status": True, "message": "SUCCESS", "data": quote}
+
+    def holding(self):
+        self._call('holding')
+        data = [
+            {"tradingsymbol": f"SYM{token}-EQ", "exchange": "NSE", "symboltoken": str(token),
+             "quantity": 10 + token % 7, "averageprice": 100 + token % 900, "ltp": 105 + token % 900}
+            for token in range(1001, 1011)
+        ]
+        return {"status": True, "message": "SUCCESS", "data": data}
+
+    def position(self):
+        self._call('position')
+        return {"status": True, "message": "SUCCESS", "data": [{"tradingsymbol": "SYM1001-EQ", "dayPl": "12.5"}]}
+
+    def getCandleData(self, historicDataParams):
+        self._call('getCandleData')
+        params = historicDataParams
+        candles = fake_candles(params['symboltoken'], params['fromdate'], params['todate'], params['interval'])
+        return {"status": True, "message": "SUCCESS", "data": candles}
+
+    def getMarketData(self, mode, exchangeTokens):
+        self._call('getMarketData')
+        fetched = [
+            self._quote(exchange, token, mode)
+            for exchange, tokens in exchangeTokens.items()
+            for token in tokens
+        ]
+        return {"status": True, "message": "SUCCESS", "data": {"fetched": fetched, "unfetched": []}}
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerateResponse:
+    """Gemini response: `.text` when complete, or an iterator of chunks when streamed"""
+
+    def __init__(self, text, stream=False):
+        self.text = text
+        self._stream = stream
+
+    def __iter__(self):
+        words = self.text.split(' ')
+        for start in range(0, len(words), 8):
+            if self._stream:
+                llm_faults.apply('generate_content_chunk')
+            yield FakeChunk(' '.join(words[start:start + 8]) + ' ')
+
+
+class FakeGenerativeModel:
+    """genai.GenerativeModel replacement that answers with canned advice"""
+
+    def __init__(self, model_name):
+        self._model_name = model_name if model_name.startswith('models/') else f"models/{model_name}"
+        self.calls = Counter()
+
+    def generate_content(self, prompt, stream=False, request_options=None, **kwargs):
+        self.calls['generate_content'] += 1
+        llm_faults.apply('generate_content')
+        text = (f"Your portfolio looks reasonably balanced. Consider trimming any position above twenty percent "
+                f"and adding a broad index fund for diversification. (prompt of {len(prompt)} characters)")
+        return FakeGenerateResponse(text, stream)
+
+
+def fake_genai_module():
+    """Module object standing in for google.generativeai"""
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda api_key=None, **kwargs: None
+
+    def list_models():
+        llm_faults.apply('list_models')
+        return [types.SimpleNamespace(name=name)
+                for name in ("models/gemini-1.5-pro", "models/gemini-1.5-flash", "models/gemini-pro")]
+
+    genai.list_models = list_models
+    genai.GenerativeModel = FakeGenerativeModel
+    return genai
+
+
+def fake_paypal_module():
+    """Module object standing in for paypalrestsdk"""
+    paypal = types.ModuleType('paypalrestsdk')
+
+    class ResourceNotFound(Exception):
+        pass
+
+    class UnauthorizedAccess(Exception):
+        pass
+
+    class Payment:
+        _payments = {}
+
+        def __init__(self, attributes=None):
+            self.attributes = attributes or {}
+            self.id = None
+            self.links = []
+            self.error = None
+
+        def create(self):
+            paypal_faults.apply('create')
+            self.id = f"PAYID-{uuid.uuid4().hex[:12].upper()}"
+            self.links = [types.SimpleNamespace(rel='approval_url', href=f"https://paypal.test/approve/{self.id}")]
+            Payment._payments[self.id] = self
+            return True
+
+        @classmethod
+        def find(cls, payment_id):
+            paypal_faults.apply('find')
+            if payment_id not in cls._payments:
+                raise ResourceNotFound(payment_id)
+            return cls._payments[payment_id]
+
+        def execute(self, attributes):
+            paypal_faults.apply('execute')
+            return True
+
+    paypal.configure = lambda options: None
+    paypal.Payment = Payment
+    paypal.ResourceNotFound = ResourceNotFound
+    paypal.UnauthorizedAccess = UnauthorizedAccess
+    paypal.exceptions = types.SimpleNamespace(
+        ResourceNotFound=ResourceNotFound, UnauthorizedAccess=UnauthorizedAccess, ConnectionError=ConnectionError)
+    return paypal
+
+
+def install_fake_sdks():
+    """Put the Gemini and PayPal fakes in sys.modules; call before importing app or services"""
+    if 'google' not in sys.modules:
+        sys.modules['google'] = types.ModuleType('google')
+    genai = fake_genai_module()
+    sys.modules['google'].generativeai = genai
+    sys.modules['google.generativeai'] = genai
+    sys.modules['paypalrestsdk'] = fake_paypal_module()
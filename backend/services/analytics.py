@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+
+from services.candle_store import INTERVAL_SECONDS
+
+TRADING_DAYS_PER_YEAR = 252
+SECONDS_PER_YEAR = 365.0 * 86400
+
+# Length of the cash market session (09:15-15:30 IST) in seconds
+SESSION_SECONDS = 375 * 60
+
+
+def _fill_gaps(matrix):
+    """Forward-fill NaNs along each row, then back-fill any leading NaNs"""
+    rows, cols = matrix.shape
+    positions = np.arange(cols)
+    valid = ~np.isnan(matrix)
+    last_valid = np.maximum.accumulate(np.where(valid, positions, 0), axis=1)
+    filled = matrix[np.arange(rows)[:, None], last_valid]
+    first_valid = np.where(valid.any(axis=1), valid.argmax(axis=1), 0)
+    leading = positions[None, :] < first_valid[:, None]
+    first_values = matrix[np.arange(rows), first_valid]
+    return np.where(leading, first_values[:, None], filled)
+
+
+def align_closes(series):
+    """Align (timestamps, closes) pairs onto their common sorted time index
+
+    Returns (index, closes) where closes has one row per series. Missing
+    values are carried forward from the last known close.
+    """
+    if not series:
+        return np.empty(0), np.empty((0, 0))
+    index = np.unique(np.concatenate([timestamps for timestamps, _ in series]))
+    closes = np.full((len(series), len(index)), np.nan)
+    for row, (timestamps, values) in enumerate(series):
+        closes[row, np.searchsorted(index, timestamps)] = values
+    return index, _fill_gaps(closes)
+
+
+def periods_per_year(interval):
+    """Number of candles of `interval` in a trading year"""
+    if interval == "ONE_DAY":
+        return TRADING_DAYS_PER_YEAR
+    return TRADING_DAYS_PER_YEAR * math.ceil(SESSION_SECONDS / INTERVAL_SECONDS[interval])
+
+
+def annualised_return(start_value, end_value, elapsed_seconds):
+    """Compound annual growth rate between two portfolio values
+
+    Holdings carry no purchase dates, so there are no dated cash flows for an
+    XIRR; this is the return of holding today's quantities over the range.
+    """
+    if start_value <= 0 or end_value < 0 or elapsed_seconds <= 0:
+        return None
+    return float((end_value / start_value) ** (SECONDS_PER_YEAR / elapsed_seconds) - 1)
+
+
+def portfolio_analytics(symbols, quantities, average_prices, series, interval="ONE_DAY"):
+    """Compute portfolio value, returns, risk and per-holding contribution
+
+    `series` holds one (timestamps, closes) pair per holding, in the same
+    order as `symbols`, `quantities` and `average_prices`, with candles of
+    `interval` so volatility can be annualised.
+    """
+    index, closes = align_closes(series)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    average_prices = np.asarray(average_prices, dtype=np.float64)
+    if not len(index):
+        return None
+
+    # Holdings without any candles contribute nothing rather than poisoning the sums
+    values = np.nan_to_num(closes) * quantities[:, None]
+    portfolio_value = values.sum(axis=0)
+
+    previous = portfolio_value[:-1]
+    daily_returns = np.divide(np.diff(portfolio_value), previous,
+                              out=np.zeros_like(previous), where=previous != 0)
+    volatility = float(daily_returns.std(ddof=1) * np.sqrt(periods_per_year(interval))) if len(daily_returns) > 1 else 0.0
+
+    running_peak = np.maximum.accumulate(portfolio_value)
+    drawdowns = np.divide(portfolio_value, running_peak, out=np.ones_like(portfolio_value),
+                          where=running_peak != 0) - 1
+    trough = int(drawdowns.argmin())
+    peak = int(portfolio_value[:trough + 1].argmax())
+
+    start_value, end_value = portfolio_value[0], portfolio_value[-1]
+    pnl = values[:, -1] - values[:, 0]
+    contribution = pnl / start_value if start_value else np.zeros_like(pnl)
+    weights = values[:, -1] / end_value if end_value else np.zeros_like(pnl)
+    unrealised = values[:, -1] - average_prices * quantities
+
+    return {
+        "index": index,
+        "portfolio_value": portfolio_value,
+        "daily_returns": daily_returns,
+        "metrics": {
+            "start_value": float(start_value),
+            "end_value": float(end_value),
+            "total_return": float(end_value / start_value - 1) if start_value else 0.0,
+            "volatility": volatility,
+            "max_drawdown": float(drawdowns[trough]),
+            "max_drawdown_peak": float(index[peak]),
+            "max_drawdown_trough": float(index[trough]),
+            "annualised_return": annualised_return(start_value, end_value, index[-1] - index[0])
+        },
+        "holdings": [
+            {
+                "symbol": symbol,
+                "weight": float(weight),
+                "pnl": float(holding_pnl),
+                "contribution": float(holding_contribution),
+                "unrealised_pnl": float(holding_unrealised)
+            }
+            for symbol, weight, holding_pnl, holding_contribution, holding_unrealised
+            in zip(symbols, weights, pnl, contribution, unrealised)
+        ]
+    }
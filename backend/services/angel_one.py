@@ -1,29 +1,86 @@
 from SmartApi import SmartConnect
 import pyotp
 import logging
-from datetime import datetime
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from services.cache import TTLCache, market_ttl
+from services.candle_store import (
+    candle_store, candles_to_array, array_to_candles, merge_candles,
+    parse_broker_date, format_broker_date, settled_candle_start, settled_until
+)
+from services.history_planner import submit_chunks
+from services.tick_buffer import tick_store
+from services.metrics import InstrumentedClient
+from services.log_pipeline import log_pipeline
+from services.instruments import instrument_master
+from services.resilience import BROKER_HTTP_TIMEOUT, ResilientClient, broker_resilience
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Maximum number of instruments the market data quote API accepts per request
+MARKET_DATA_BATCH_SIZE = 50
+
+# Cache TTLs in seconds as (market open, market closed) per account call
+CACHE_TTLS = {
+    "profile": (300, 3600),
+    "holdings": (30, 900),
+    "positions": (10, 900)
+}
+
+def create_client(api_key, client_id):
+    """SmartConnect client with paced, timed and retried reads and its logging sent through the log pipeline"""
+    client = SmartConnect(api_key=api_key, timeout=BROKER_HTTP_TIMEOUT)
+    log_pipeline.capture_sdk_logger()
+    # Timing sits inside the resilience layer so rate limit queueing and retries are not counted as upstream latency
+    return ResilientClient(InstrumentedClient(client, 'angelone'), client_id, broker_resilience)
+
+# Shared cache for account data, keyed by (client_id, call name)
+api_cache = TTLCache(max_entries=512)
+
+# Sessions older than this are renewed with the refresh token before use
+SESSION_RENEW_AFTER = timedelta(hours=6)
+
+# Maximum number of per-user sessions kept in memory
+MAX_SESSIONS = 100
+
 class AngelOneService:
-    def __init__(self):
+    def __init__(self, client_id=None, pin=None, totp_key=None):
         self.trading_api_key = "ihOGtndl"
         self.publisher_api_key = "xjz7Ko9s"
-        self.client_id = None
-        self.pin = None
-        self.totp_key = None
+        self.client_id = client_id
+        self.pin = pin
+        self.totp_key = totp_key
         self.trading_api = None
         self.market_api = None
         self.refresh_token = None
         self.access_token = None
+        self.market_refresh_token = None
+        self.session_started = None
+        self._session_lock = threading.Lock()
 
     def set_credentials(self, client_id, pin, totp_key):
         """Set credentials for the service"""
         self.client_id = client_id
         self.pin = pin
         self.totp_key = totp_key
+        self.invalidate_cache()
+
+    def _cached(self, name, loader):
+        """Serve an account call from the cache, sharing one upstream call between concurrent requests"""
+        open_ttl, closed_ttl = CACHE_TTLS[name]
+        return api_cache.get_or_load(
+            (self.client_id, name),
+            loader,
+            ttl=lambda: market_ttl(open_ttl, closed_ttl),
+            should_cache=lambda response: bool(response) and bool(response.get('status')) and not response.get('stale')
+        )
+
+    def invalidate_cache(self):
+        """Drop cached account data so the next call goes to the broker"""
+        api_cache.invalidate((self.client_id,))
 
     def connect(self):
         """Connect to Angel One API"""
@@ -33,7 +90,7 @@ class AngelOneService:
                 return False
 
             # Connect with trading API
-            self.trading_api = SmartConnect(api_key=self.trading_api_key)
+            self.trading_api = create_client(self.trading_api_key, self.client_id)
             totp = pyotp.TOTP(self.totp_key).now()
             
             logger.info(f"Attempting to connect with client_id: {self.client_id}")
@@ -49,7 +106,7 @@ class AngelOneService:
                 logger.info("Successfully connected to Trading API")
                 
                 # Connect with market data API
-                self.market_api = SmartConnect(api_key=self.publisher_api_key)
+                self.market_api = create_client(self.publisher_api_key, self.client_id)
                 market_data = self.market_api.generateSession(
                     self.client_id,
                     self.pin,
@@ -57,6 +114,8 @@ class AngelOneService:
                 )
                 
                 if market_data['status']:
+                    self.market_refresh_token = market_data['data']['refreshToken']
+                    self.session_started = datetime.now()
                     logger.info("Successfully connected to both Trading and Market Data APIs")
                     return True
                 else:
@@ -70,13 +129,54 @@ class AngelOneService:
             logger.error(f"Error connecting to Angel One API: {str(e)}")
             return False
 
+    def renew_session(self):
+        """Renew both API sessions with the stored refresh tokens instead of a full login"""
+        try:
+            if not self.refresh_token or not self.market_refresh_token:
+                return self.connect()
+
+            for api, refresh_attr in ((self.trading_api, 'refresh_token'),
+                                      (self.market_api, 'market_refresh_token')):
+                data = api.generateToken(getattr(self, refresh_attr))
+                if not data or not data.get('status'):
+                    logger.warning(f"Token renewal failed for {self.client_id}, falling back to login")
+                    return self.connect()
+                if data['data'].get('refreshToken'):
+                    setattr(self, refresh_attr, data['data']['refreshToken'])
+                if api is self.trading_api:
+                    self.access_token = data['data']['jwtToken']
+
+            self.session_started = datetime.now()
+            logger.info(f"Renewed Angel One session for {self.client_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error renewing Angel One session: {str(e)}")
+            return self.connect()
+
+    def ensure_session(self):
+        """Make sure both API sessions exist and are fresh, logging in only when needed"""
+        with self._session_lock:
+            if not self.trading_api or not self.market_api or not self.session_started:
+                return self.connect()
+            if datetime.now() - self.session_started > SESSION_RENEW_AFTER:
+                return self.renew_session()
+            return True
+
+    def feed_credentials(self):
+        """Credentials for the market data WebSocket feed"""
+        return {
+            "auth_token": self.market_api.access_token,
+            "api_key": self.publisher_api_key,
+            "client_code": self.client_id,
+            "feed_token": self.market_api.feed_token
+        }
+
     def get_profile(self):
         """Get user profile information"""
         try:
-            if not self.trading_api:
-                if not self.connect():
-                    return None
-            return self.trading_api.getProfile(self.refresh_token)
+            if not self.ensure_session():
+                return None
+            return self._cached('profile', lambda: self.trading_api.getProfile(self.refresh_token))
         except Exception as e:
             logger.error(f"Error fetching profile: {str(e)}")
             return None
@@ -84,10 +184,9 @@ class AngelOneService:
     def get_holdings(self):
         """Get user holdings"""
         try:
-            if not self.trading_api:
-                if not self.connect():
-                    return None
-            return self.trading_api.holding()
+            if not self.ensure_session():
+                return None
+            return self._cached('holdings', self.trading_api.holding)
         except Exception as e:
             logger.error(f"Error fetching holdings: {str(e)}")
             return None
@@ -95,10 +194,9 @@ class AngelOneService:
     def get_portfolio_positions(self):
         """Get portfolio positions"""
         try:
-            if not self.trading_api:
-                if not self.connect():
-                    return None
-            return self.trading_api.position()
+            if not self.ensure_session():
+                return None
+            return self._cached('positions', self.trading_api.position)
         except Exception as e:
             logger.error(f"Error fetching positions: {str(e)}")
             return None
@@ -106,13 +204,14 @@ class AngelOneService:
     def get_live_price(self, token, exchange="NSE"):
         """Get live price for a token"""
         try:
-            if not self.market_api:
-                if not self.connect():
-                    return None
+            if not self.ensure_session():
+                return None
             
+            # ltpData wants the trading symbol as well; fall back to the token until the instrument index is loaded
+            instrument = instrument_master.resolve_token(token, exchange)
             ltpData = self.market_api.ltpData(
                 exchange=exchange,
-                tradingsymbol=token,
+                tradingsymbol=instrument['symbol'] if instrument else token,
                 symboltoken=token
             )
             return ltpData
@@ -120,24 +219,219 @@ class AngelOneService:
             logger.error(f"Error fetching live price for {token}: {str(e)}")
             return None
 
-    def get_historical_data(self, token, from_date, to_date, interval="ONE_DAY"):
+    def get_live_prices(self, tokens, exchange="NSE", mode="OHLC"):
+        """Get LTP/OHLC quotes for many tokens using batched market data calls
+
+        `tokens` is a list of symbol tokens or of {"exchange", "token"} dicts;
+        plain tokens are looked up on `exchange`. Returns a map of token to quote.
+        "FULL" mode quotes also carry the day's traded volume.
+        """
+        try:
+            if not self.ensure_session():
+                return None
+
+            # Group tokens per exchange, preserving order and dropping duplicates
+            tokens_by_exchange = {}
+            for item in tokens:
+                if isinstance(item, dict):
+                    item_exchange = item.get('exchange', exchange)
+                    item_token = str(item['token'])
+                else:
+                    item_exchange, item_token = exchange, str(item)
+                exchange_tokens = tokens_by_exchange.setdefault(item_exchange, [])
+                if item_token not in exchange_tokens:
+                    exchange_tokens.append(item_token)
+
+            quotes = {}
+            for item_exchange, exchange_tokens in tokens_by_exchange.items():
+                for start in range(0, len(exchange_tokens), MARKET_DATA_BATCH_SIZE):
+                    chunk = exchange_tokens[start:start + MARKET_DATA_BATCH_SIZE]
+                    response = self.market_api.getMarketData(mode, {item_exchange: chunk})
+                    if not response or not response.get('status'):
+                        logger.error(f"Market data request failed for {item_exchange}: {response}")
+                        continue
+
+                    for quote in response['data'].get('fetched', []):
+                        quotes[quote['symbolToken']] = {
+                            "exchange": quote.get('exchange', item_exchange),
+                            "tradingsymbol": quote.get('tradingSymbol'),
+                            "ltp": quote.get('ltp'),
+                            "open": quote.get('open'),
+                            "high": quote.get('high'),
+                            "low": quote.get('low'),
+                            "close": quote.get('close')
+                        }
+                        if mode == "FULL":
+                            quotes[quote['symbolToken']]['volume'] = quote.get('tradeVolume')
+            return quotes
+        except Exception as e:
+            logger.error(f"Error fetching live prices: {str(e)}")
+            return None
+
+    def _fetch_candles(self, token, start, end, interval, exchange):
+        """Fetch candles for [start, end] from the broker as a columnar array"""
+        params = {
+            "exchange": exchange,
+            "symboltoken": token,
+            "interval": interval,
+            "fromdate": format_broker_date(start),
+            "todate": format_broker_date(end)
+        }
+        response = self.market_api.getCandleData(params)
+        if not response or not response.get('status'):
+            raise ValueError(f"Candle request failed: {(response or {}).get('message')}")
+        return candles_to_array(response.get('data') or [])
+
+    def iter_historical_data(self, token, from_date, to_date, interval="ONE_DAY", exchange="NSE", lane_name=None):
+        """Yield columnar candle arrays for a token in chronological order
+
+        Settled candles are served from the local candle store; only the
+        missing head/tail of the stored range and the still-forming candles
+        after the last settled one are fetched from the broker. Long ranges
+        are split into broker-sized chunks that are fetched concurrently.
+        When the symbol is being streamed, candles built from live ticks
+        replace the broker calls for the current session. Broker calls run
+        in `lane_name`, or the caller's rate governor lane.
+        """
+        key = (exchange, str(token), interval)
+        start, end = parse_broker_date(from_date), parse_broker_date(to_date)
+        stored_end = min(end, settled_until(interval))
+        ticks_from = tick_store.covered_from(exchange, token, interval)
+        if ticks_from is not None and ticks_from <= end:
+            stored_end = min(stored_end, ticks_from - 1)
+        else:
+            ticks_from = None
+
+        def fetch(chunk_start, chunk_end):
+            return self._fetch_candles(token, chunk_start, chunk_end, interval, exchange)
+
+        # Each step is ('fetch' | 'store' | 'live', start, end, chunk futures)
+        steps = []
+        if start <= stored_end:
+            coverage = candle_store.coverage(key)
+            if not coverage or start > coverage[1] or stored_end < coverage[0]:
+                steps.append(('fetch', start, stored_end))
+            else:
+                if start < coverage[0]:
+                    steps.append(('fetch', start, coverage[0]))
+                steps.append(('store', max(start, coverage[0]), min(stored_end, coverage[1])))
+                if stored_end > coverage[1]:
+                    steps.append(('fetch', coverage[1], stored_end))
+        # Candles that can still change are never stored
+        if end > stored_end:
+            steps.append(('live', max(start, stored_end), end))
+
+        # Start every broker request up front so head, tail and live chunks overlap
+        steps = [
+            (kind, s, e, None if kind == 'store' or (kind == 'live' and ticks_from is not None)
+             else submit_chunks(fetch, s, e, interval, lane_name))
+            for kind, s, e in steps
+        ]
+
+        last_timestamp = float('-inf')
+        try:
+            for kind, step_start, step_end, futures in steps:
+                if kind == 'store':
+                    arrays = [candle_store.read(key, step_start, step_end)]
+                elif futures is None:
+                    live = tick_store.candles(exchange, token, interval, max(step_start, ticks_from), step_end)
+                    if live is None:
+                        # Ticks were evicted since covered_from(); fall back to the broker
+                        live = merge_candles(*[future.result() for future in
+                                               submit_chunks(fetch, step_start, step_end, interval, lane_name)])
+                    arrays = [live]
+                else:
+                    arrays = [future.result() for future in futures]
+                    if kind == 'fetch':
+                        candle_store.write(key, merge_candles(*arrays), step_start, step_end)
+
+                for array in arrays:
+                    array = merge_candles(array)
+                    array = array[:, array[0] > last_timestamp]
+                    if array.shape[1]:
+                        last_timestamp = array[0, -1]
+                        yield array
+        finally:
+            for _, _, _, futures in steps:
+                for future in futures or []:
+                    future.cancel()
+
+    def get_candles(self, token, from_date, to_date, interval="ONE_DAY", exchange="NSE"):
+        """Get historical candles for a token as a columnar array"""
+        try:
+            if not self.ensure_session():
+                return None
+            return merge_candles(*self.iter_historical_data(token, from_date, to_date, interval, exchange))
+        except Exception as e:
+            logger.error(f"Error fetching candles for {token}: {str(e)}")
+            return None
+
+    def get_stored_candles(self, token, start, interval="ONE_DAY", exchange="NSE"):
+        """Settled candles since `start` from the local candle store, without calling the broker
+
+        Returns None when the stored range does not reach back to `start` or
+        forward to the latest settled candle.
+        """
+        key = (exchange, str(token), interval)
+        coverage = candle_store.coverage(key)
+        if not coverage or coverage[0] > start or coverage[1] < settled_candle_start(interval):
+            return None
+        return candle_store.read(key, start, coverage[1])
+
+    def get_historical_data(self, token, from_date, to_date, interval="ONE_DAY", exchange="NSE"):
         """Get historical data for a token"""
         try:
-            if not self.market_api:
-                if not self.connect():
-                    return None
-
-            params = {
-                "exchange": "NSE",
-                "symboltoken": token,
-                "interval": interval,
-                "fromdate": from_date,
-                "todate": to_date
+            candles = self.get_candles(token, from_date, to_date, interval, exchange)
+            if candles is None:
+                return None
+            return {
+                "status": True,
+                "message": "SUCCESS",
+                "errorcode": "",
+                "data": array_to_candles(candles)
             }
-            return self.market_api.getCandleData(params)
         except Exception as e:
             logger.error(f"Error fetching historical data: {str(e)}")
             return None
 
-# Create a singleton instance
-angel_one_service = AngelOneService() 
\ No newline at end of file
+class SessionRegistry:
+    """Per-user Angel One sessions keyed by client_id, evicting the least recently used"""
+
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def login(self, client_id, pin, totp_key):
+        """Log in with full credentials and register the session, or return None on failure"""
+        service = AngelOneService(client_id, pin, totp_key)
+        service.invalidate_cache()
+        if not service.connect():
+            return None
+
+        with self._lock:
+            self._sessions[client_id] = service
+            self._sessions.move_to_end(client_id)
+            while len(self._sessions) > self.max_sessions:
+                evicted_id, evicted = self._sessions.popitem(last=False)
+                evicted.invalidate_cache()
+                logger.info(f"Evicted Angel One session for {evicted_id}")
+        return service
+
+    def get(self, client_id):
+        """Return the session for client_id, or None if the user has to log in again"""
+        with self._lock:
+            service = self._sessions.get(client_id)
+            if service:
+                self._sessions.move_to_end(client_id)
+            return service
+
+    def logout(self, client_id):
+        """Forget the session for client_id"""
+        with self._lock:
+            service = self._sessions.pop(client_id, None)
+        if service:
+            service.invalidate_cache()
+
+# Create a singleton registry
+session_registry = SessionRegistry() 
\ No newline at end of file
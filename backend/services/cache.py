@@ -0,0 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, time as dt_time, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Indian market timezone and regular NSE/BSE session hours
+IST = timezone(timedelta(hours=5, minutes=30))
+MARKET_OPEN = dt_time(9, 15)
+MARKET_CLOSE = dt_time(15, 30)
+
+
+def is_market_open(now=None):
+    """Check whether the regular equity session is currently open"""
+    now = now or datetime.now(IST)
+    if now.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= now.time() <= MARKET_CLOSE
+
+
+def market_ttl(open_ttl, closed_ttl):
+    """Pick a TTL depending on whether the market is open"""
+    return open_ttl if is_market_open() else closed_ttl
+
+
+class _InFlight:
+    """A pending upstream call that concurrent callers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.generation = None
+
+
+class TTLCache:
+    """Bounded LRU cache with per-entry TTLs and single-flight loading"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Bumped by invalidate(), so loads started before it don't store what they fetched
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader, ttl, should_cache=bool):
+        """Return the cached value for key or load it once for all concurrent callers
+
+        `ttl` may be a number or a callable returning one. Results for which
+        `should_cache` is false (e.g. failed upstream calls) are handed to the
+        waiting callers but not stored.
+        """
+        value = self.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[key] = _InFlight()
+                in_flight.generation = self._generation
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if not leader:
+            in_flight.event.wait()
+            if in_flight.error:
+                raise in_flight.error
+            return in_flight.value
+
+        try:
+            in_flight.value = loader()
+            if should_cache(in_flight.value):
+                ttl = ttl() if callable(ttl) else ttl
+                with self._lock:
+                    # Invalidated while loading: hand the value to this load's callers but don't keep it
+                    if in_flight.generation == self._generation:
+                        self._store(key, in_flight.value, ttl)
+            return in_flight.value
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+            in_flight.event.set()
+
+    def invalidate(self, prefix=None):
+        """Drop every entry, or only entries whose tuple key starts with prefix
+
+        Loads already in flight finish for their current callers but are not
+        stored, and later callers start a fresh load instead of joining them.
+        """
+        with self._lock:
+            self._generation += 1
+            if prefix is None:
+                self._entries.clear()
+                self._in_flight.clear()
+                return
+            prefix = tuple(prefix)
+            for key in [k for k in self._entries if k[:len(prefix)] == prefix]:
+                del self._entries[key]
+            for key in [k for k in self._in_flight if k[:len(prefix)] == prefix]:
+                del self._in_flight[key]
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from services.cache import IST, MARKET_OPEN, is_market_open
+
+logger = logging.getLogger(__name__)
+
+# Candles are stored column-wise as a (6, n) float64 array:
+# timestamp (epoch seconds), open, high, low, close, volume
+COLUMN_COUNT = 6
+
+# Length of each broker candle interval in seconds
+INTERVAL_SECONDS = {
+    "ONE_MINUTE": 60,
+    "THREE_MINUTE": 180,
+    "FIVE_MINUTE": 300,
+    "TEN_MINUTE": 600,
+    "FIFTEEN_MINUTE": 900,
+    "THIRTY_MINUTE": 1800,
+    "ONE_HOUR": 3600,
+    "ONE_DAY": 86400
+}
+
+# Date format used by the broker's getCandleData API
+BROKER_DATE_FORMAT = "%Y-%m-%d %H:%M"
+
+CANDLE_STORE_DIR = os.getenv(
+    'CANDLE_STORE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'candles')
+)
+CANDLE_STORE_MAX_BYTES = int(os.getenv('CANDLE_STORE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Appended segments per key before they are merged into the base file
+MAX_SEGMENTS = 8
+
+
+def parse_broker_date(value):
+    """Convert a broker date string (IST) to epoch seconds"""
+    return datetime.strptime(value, BROKER_DATE_FORMAT).replace(tzinfo=IST).timestamp()
+
+
+def format_broker_date(timestamp):
+    """Convert epoch seconds to a broker date string (IST)"""
+    return datetime.fromtimestamp(timestamp, IST).strftime(BROKER_DATE_FORMAT)
+
+
+def candles_to_array(candles):
+    """Convert broker candle rows [timestamp, o, h, l, c, v] to a columnar array"""
+    array = np.empty((COLUMN_COUNT, len(candles)), dtype=np.float64)
+    for i, candle in enumerate(candles):
+        array[0, i] = datetime.fromisoformat(candle[0]).timestamp()
+        array[1:, i] = candle[1:6]
+    return array
+
+
+def array_to_candles(array):
+    """Convert a columnar array back to broker candle rows"""
+    return [
+        [datetime.fromtimestamp(ts, IST).isoformat(), o, h, l, c, int(v)]
+        for ts, o, h, l, c, v in array.T.tolist()
+    ]
+
+
+def merge_candles(*arrays):
+    """Merge columnar arrays into one sorted by timestamp, later arrays winning on duplicates"""
+    arrays = [a for a in arrays if a is not None and a.shape[1]]
+    if not arrays:
+        return np.empty((COLUMN_COUNT, 0), dtype=np.float64)
+    merged = np.concatenate(arrays, axis=1)
+    # Reverse so np.unique keeps the last occurrence of each timestamp;
+    # its indices come back in ascending timestamp order
+    _, first_index = np.unique(merged[0, ::-1], return_index=True)
+    return merged[:, merged.shape[1] - 1 - first_index]
+
+
+def settled_until(interval, now=None):
+    """Latest candle timestamp that can no longer change"""
+    now = now or time.time()
+    if is_market_open(datetime.fromtimestamp(now, IST)):
+        return now - INTERVAL_SECONDS[interval]
+    return now
+
+
+def settled_candle_start(interval, now=None):
+    """Timestamp of the latest candle that can no longer change
+
+    Daily candles are stamped at 00:00 IST and intraday ones at multiples
+    of the interval from the session open.
+    """
+    settled = datetime.fromtimestamp(settled_until(interval, now), IST)
+    if interval == "ONE_DAY":
+        return settled.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    session_open = settled.replace(hour=MARKET_OPEN.hour, minute=MARKET_OPEN.minute, second=0, microsecond=0).timestamp()
+    step = INTERVAL_SECONDS[interval]
+    return session_open + (settled.timestamp() - session_open) // step * step
+
+
+class CandleStore:
+    """On-disk OHLCV store keyed by (exchange, token, interval)
+
+    Each key covers one contiguous time range. Data lives in a memory-mapped
+    base file plus small appended segments that compaction folds back in.
+    """
+
+    def __init__(self, root=CANDLE_STORE_DIR, max_bytes=CANDLE_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._meta = {}
+        self._sizes = None
+
+    def _dir(self, key):
+        return os.path.join(self.root, *[str(part) for part in key])
+
+    def _load_meta(self, key):
+        if key not in self._meta:
+            path = os.path.join(self._dir(key), 'meta.json')
+            try:
+                with open(path) as f:
+                    self._meta[key] = json.load(f)
+            except (OSError, ValueError):
+                self._meta[key] = None
+        return self._meta[key]
+
+    def _save_meta(self, key, meta):
+        self._meta[key] = meta
+        path = os.path.join(self._dir(key), 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def _save_array(self, key, name, array):
+        path = os.path.join(self._dir(key), name)
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, array)
+        os.replace(path + '.tmp', path)
+
+    def _load_arrays(self, key, meta):
+        arrays = []
+        for name in (['base.npy'] if meta.get('base') else []) + meta['segments']:
+            arrays.append(np.load(os.path.join(self._dir(key), name), mmap_mode='r'))
+        return arrays
+
+    def coverage(self, key):
+        """Return the (start, end) epoch range stored for key, or None"""
+        with self._lock:
+            meta = self._load_meta(key)
+            return (meta['start'], meta['end']) if meta else None
+
+    def read(self, key, start, end):
+        """Return stored candles for key with start <= timestamp <= end"""
+        with self._lock:
+            meta = self._load_meta(key)
+            if not meta:
+                return np.empty((COLUMN_COUNT, 0), dtype=np.float64)
+            arrays = self._load_arrays(key, meta)
+            if meta['segments']:
+                arrays = [merge_candles(*arrays)]
+            meta['last_access'] = time.time()
+
+        result = []
+        for array in arrays:
+            lo = np.searchsorted(array[0], start, side='left')
+            hi = np.searchsorted(array[0], end, side='right')
+            result.append(np.array(array[:, lo:hi]))
+        return merge_candles(*result)
+
+    def write(self, key, candles, start, end):
+        """Store candles fetched for [start, end] and extend the key's coverage
+
+        A range that does not touch the existing coverage replaces it, so each
+        key always describes a single contiguous range.
+        """
+        with self._lock:
+            os.makedirs(self._dir(key), exist_ok=True)
+            meta = self._load_meta(key)
+            if meta and (start > meta['end'] or end < meta['start']):
+                self.drop(key)
+                os.makedirs(self._dir(key), exist_ok=True)
+                meta = None
+            if not meta:
+                meta = {"start": start, "end": end, "base": False, "segments": [], "next_segment": 0}
+
+            if candles.shape[1]:
+                name = f"seg-{meta['next_segment']}.npy"
+                self._save_array(key, name, merge_candles(candles))
+                meta['segments'].append(name)
+                meta['next_segment'] += 1
+
+            meta['start'] = min(meta['start'], start)
+            meta['end'] = max(meta['end'], end)
+            meta['last_access'] = time.time()
+            self._save_meta(key, meta)
+
+            if len(meta['segments']) > MAX_SEGMENTS:
+                self.compact(key)
+            self._key_sizes()[key] = self.size_bytes(key)
+            self.enforce_size_cap()
+
+    def compact(self, key=None):
+        """Fold appended segments into a single sorted, de-duplicated base file"""
+        with self._lock:
+            keys = [key] if key else self.keys()
+            for compact_key in keys:
+                meta = self._load_meta(compact_key)
+                if not meta or not meta['segments']:
+                    continue
+                merged = merge_candles(*self._load_arrays(compact_key, meta))
+                self._save_array(compact_key, 'base.npy', merged)
+                old_segments = meta['segments']
+                meta.update(base=True, segments=[])
+                self._save_meta(compact_key, meta)
+                for name in old_segments:
+                    os.remove(os.path.join(self._dir(compact_key), name))
+                self._key_sizes()[compact_key] = self.size_bytes(compact_key)
+
+    def drop(self, key):
+        """Remove everything stored for key"""
+        with self._lock:
+            directory = self._dir(key)
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+                os.rmdir(directory)
+            self._meta[key] = None
+            self._key_sizes().pop(key, None)
+
+    def keys(self):
+        """List every key currently on disk"""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            if 'meta.json' in filenames:
+                found.append(tuple(os.path.relpath(dirpath, self.root).split(os.sep)))
+        return found
+
+    def size_bytes(self, key=None):
+        """Total size on disk of one key or of the whole store"""
+        if key is None:
+            return sum(self._key_sizes().values())
+        directory = self._dir(key)
+        if not os.path.isdir(directory):
+            return 0
+        return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+    def _key_sizes(self):
+        # Scanned from disk once, then kept up to date by write/compact/drop
+        if self._sizes is None:
+            self._sizes = {key: self.size_bytes(key) for key in self.keys()}
+        return self._sizes
+
+    def enforce_size_cap(self):
+        """Evict least recently used keys until the store fits in max_bytes"""
+        with self._lock:
+            sizes = dict(self._key_sizes())
+            total = sum(sizes.values())
+            if total <= self.max_bytes:
+                return
+            by_access = sorted(sizes, key=lambda k: (self._load_meta(k) or {}).get('last_access', 0))
+            for key in by_access:
+                if total <= self.max_bytes:
+                    break
+                total -= sizes[key]
+                logger.info(f"Evicting candles for {key} to stay under the store size cap")
+                self.drop(key)
+
+
+# Create a singleton instance
+candle_store = CandleStore()
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import logging
+from datetime import date
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FEE_SCHEDULE_PATH = os.getenv(
+    'FEE_SCHEDULE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'fee_schedules.json')
+)
+
+# Rate fields every segment of a fee schedule version must define
+RATE_FIELDS = (
+    "brokerage_rate", "brokerage_cap", "brokerage_flat",
+    "stt_buy", "stt_sell", "exchange", "sebi", "gst", "stamp_buy"
+)
+
+# Charge columns returned for every trade
+CHARGE_FIELDS = ("brokerage", "stt", "exchange_charges", "sebi_charges", "gst", "stamp_duty", "total")
+
+
+class FeeSchedules:
+    """Versioned fee schedule table, reloaded whenever the file changes
+
+    Rates are held as (version, segment) arrays so a batch of trades can
+    look up every rate with a single fancy-indexing operation.
+    """
+
+    def __init__(self, path=FEE_SCHEDULE_PATH):
+        self.path = path
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.versions = []
+        self.effective_from = np.empty(0, dtype='datetime64[D]')
+        self.segments = []
+        self.rates = {}
+
+    def _reload_if_changed(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return
+        with open(self.path) as f:
+            table = json.load(f)
+
+        versions = sorted(table['versions'], key=lambda v: v['effective_from'])
+        segments = sorted({segment for v in versions for segment in v['segments']})
+        rates = {field: np.full((len(versions), len(segments)), np.nan) for field in RATE_FIELDS}
+        for row, version in enumerate(versions):
+            for segment, segment_rates in version['segments'].items():
+                column = segments.index(segment)
+                for field in RATE_FIELDS:
+                    rates[field][row, column] = segment_rates[field]
+
+        self.versions = [v['version'] for v in versions]
+        self.effective_from = np.array([v['effective_from'] for v in versions], dtype='datetime64[D]')
+        self.segments = segments
+        self.rates = rates
+        self._mtime = mtime
+        logger.info(f"Loaded fee schedule versions {self.versions} from {self.path}")
+
+    def snapshot(self):
+        """Return the current (versions, effective_from, segments, rates), reloading if needed"""
+        with self._lock:
+            self._reload_if_changed()
+            return self.versions, self.effective_from, self.segments, self.rates
+
+
+fee_schedules = FeeSchedules()
+
+
+def _column(values, n, dtype=None):
+    """Broadcast a scalar or list input to an array of length n"""
+    array = np.asarray(values, dtype=dtype)
+    if array.ndim == 0:
+        array = np.full(n, array, dtype=array.dtype)
+    if len(array) != n:
+        raise ValueError("All trade columns must have the same length")
+    return array
+
+
+def calculate_charges(segment, side, quantity, price, trade_date=None, version=None):
+    """Compute statutory charges for a batch of single-side trades
+
+    Every argument is a column (or a scalar applied to all trades). `side`
+    is BUY or SELL. The schedule version is picked per trade from its
+    trade_date unless `version` pins one. Trades dated before the earliest
+    version are charged with it and flagged in `backdated`, since older
+    rates aren't recorded. Returns a dict of charge arrays.
+    """
+    quantity = np.asarray(quantity, dtype=np.float64)
+    n = quantity.size
+    price = _column(price, n, np.float64)
+    is_buy = np.char.upper(_column(side, n).astype(str)) == 'BUY'
+
+    versions, effective_from, segments, rates = fee_schedules.snapshot()
+    segment_names, segment_inverse = np.unique(_column(segment, n).astype(str), return_inverse=True)
+    unknown = [name for name in segment_names if name not in segments]
+    if unknown:
+        raise ValueError(f"Unknown segment(s): {', '.join(unknown)}")
+    segment_index = np.array([segments.index(name) for name in segment_names])[segment_inverse]
+
+    if version is not None:
+        if version not in versions:
+            raise ValueError(f"Unknown fee schedule version: {version}")
+        version_index = np.full(n, versions.index(version))
+        backdated = np.zeros(n, dtype=bool)
+    else:
+        dates = _column(trade_date if trade_date is not None else date.today().isoformat(), n)
+        version_index = np.searchsorted(effective_from, dates.astype('datetime64[D]'), side='right') - 1
+        backdated = version_index < 0
+        version_index = np.maximum(version_index, 0)
+
+    # A segment a version doesn't list has NaN rates, which must not leak into the charges
+    missing = np.isnan(rates[RATE_FIELDS[0]][version_index, segment_index])
+    if missing.any():
+        pairs = sorted({(versions[v], segments[s]) for v, s in zip(version_index[missing], segment_index[missing])})
+        raise ValueError("No rates for " + ", ".join(f"{segment} in fee schedule {name}" for name, segment in pairs))
+
+    def rate(field):
+        return rates[field][version_index, segment_index]
+
+    value = quantity * price
+    percentage_brokerage = np.minimum(value * rate('brokerage_rate'), rate('brokerage_cap'))
+    brokerage = np.where(rate('brokerage_rate') > 0, percentage_brokerage, rate('brokerage_flat'))
+    stt = value * np.where(is_buy, rate('stt_buy'), rate('stt_sell'))
+    exchange_charges = value * rate('exchange')
+    sebi_charges = value * rate('sebi')
+    gst = (brokerage + exchange_charges) * rate('gst')
+    stamp_duty = np.where(is_buy, value * rate('stamp_buy'), 0.0)
+
+    return {
+        "brokerage": brokerage,
+        "stt": stt,
+        "exchange_charges": exchange_charges,
+        "sebi_charges": sebi_charges,
+        "gst": gst,
+        "stamp_duty": stamp_duty,
+        "total": brokerage + stt + exchange_charges + sebi_charges + gst + stamp_duty,
+        "schedule_version": np.array(versions)[version_index],
+        "backdated": backdated
+    }
@@ -0,0 +1,188 @@
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Recent messages kept verbatim per session; older ones are folded into the summary
+HISTORY_WINDOW = int(os.getenv('CHAT_HISTORY_WINDOW', 12))
+
+# Messages that must pile up past the window before a summarization runs
+COMPACT_BATCH = 6
+
+# Prompt tokens allowed for history, and for the summary within it
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKENS', 1200))
+SUMMARY_TOKEN_BUDGET = 300
+
+# Sessions idle this many seconds are dropped, and the store never holds more than MAX_SESSION_BYTES
+SESSION_IDLE_TIMEOUT = int(os.getenv('CHAT_SESSION_IDLE_TIMEOUT', 1800))
+MAX_SESSION_BYTES = int(os.getenv('CHAT_SESSION_MAX_BYTES', 32 * 1024 * 1024))
+
+# Seconds between idle sweeps, which piggyback on normal calls
+SWEEP_INTERVAL = 60
+
+# Summaries run off the request path, one at a time
+summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-summary')
+
+
+def estimate_tokens(text):
+    """Rough token count, about four characters per token"""
+    return len(text) // 4 + 1
+
+
+def truncate_to_tokens(text, budget):
+    """Cut text to roughly `budget` tokens on a word boundary"""
+    limit = budget * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0] + '…'
+
+
+def extractive_summary(summary, turns):
+    """Fold turns into the summary by keeping the first sentence of each"""
+    lines = [summary] if summary else []
+    for role, text in turns:
+        first_sentence = re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+        lines.append(f"{role}: {first_sentence}")
+    return truncate_to_tokens("\n".join(lines), SUMMARY_TOKEN_BUDGET)
+
+
+class ChatSession:
+    """One conversation: a compact summary plus the most recent messages"""
+
+    def __init__(self):
+        self.summary = ""
+        self.turns = deque()
+        self.overflow = []
+        self.compacting = False
+        self.last_active = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        texts = [self.summary] + [text for _, text in self.turns] + [text for _, text in self.overflow]
+        return sum(len(text) for text in texts)
+
+
+class ChatSessionStore:
+    """Per-user chat history with bounded windows, token budgets and eviction
+
+    `summarizer(summary, turns)` folds messages that fell out of the window
+    into the summary; it defaults to an extractive summary and can be
+    replaced with a model-backed one. It runs in the background, so a slow
+    or failing summarizer never delays a reply.
+    """
+
+    def __init__(self, summarizer=extractive_summary, max_bytes=MAX_SESSION_BYTES):
+        self.summarizer = summarizer
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _session(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = ChatSession()
+            self._sessions.move_to_end(session_id)
+            session.last_active = time.monotonic()
+        self._maybe_sweep()
+        return session
+
+    def context(self, session_id, budget=CONTEXT_TOKEN_BUDGET):
+        """History for the next prompt: the summary, then as many recent messages as fit the budget"""
+        if not session_id:
+            return ""
+        session = self._session(session_id)
+        with session.lock:
+            summary = truncate_to_tokens(session.summary, SUMMARY_TOKEN_BUDGET) if session.summary else ""
+            remaining = budget - (estimate_tokens(summary) if summary else 0)
+            recent = []
+            for role, text in reversed(list(session.overflow) + list(session.turns)):
+                line = f"{role}: {text}"
+                cost = estimate_tokens(line)
+                if cost > remaining:
+                    break
+                recent.append(line)
+                remaining -= cost
+
+        parts = []
+        if summary:
+            parts.append(f"Earlier in this conversation:\n{summary}")
+        if recent:
+            parts.append("Recent messages:\n" + "\n".join(reversed(recent)))
+        return "\n\n".join(parts)
+
+    def append(self, session_id, user_message, assistant_message):
+        """Record one exchange and schedule summarization once enough messages overflow the window"""
+        if not session_id or not assistant_message:
+            return
+        session = self._session(session_id)
+        with session.lock:
+            session.turns.append(("User", user_message))
+            session.turns.append(("Advisor", assistant_message))
+            while len(session.turns) > HISTORY_WINDOW:
+                session.overflow.append(session.turns.popleft())
+            if len(session.overflow) < COMPACT_BATCH or session.compacting:
+                return
+            session.compacting = True
+            summary, batch = session.summary, list(session.overflow)
+        summary_executor.submit(self._compact, session, summary, batch)
+
+    def _compact(self, session, summary, batch):
+        try:
+            new_summary = self.summarizer(summary, batch)
+        except Exception as e:
+            logger.warning(f"Chat summarization failed, using extractive summary: {str(e)}")
+            new_summary = extractive_summary(summary, batch)
+        with session.lock:
+            session.summary = truncate_to_tokens(new_summary or summary, SUMMARY_TOKEN_BUDGET)
+            del session.overflow[:len(batch)]
+            # Messages that overflowed while this ran get their own pass
+            if len(session.overflow) < COMPACT_BATCH:
+                session.compacting = False
+                return
+            summary, batch = session.summary, list(session.overflow)
+        summary_executor.submit(self._compact, session, summary, batch)
+
+    def clear(self, session_id):
+        """Forget a conversation"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        self.evict()
+
+    def evict(self):
+        """Drop idle sessions, then the least recently used until under max_bytes"""
+        now = time.monotonic()
+        with self._lock:
+            for session_id in [sid for sid, s in self._sessions.items()
+                               if now - s.last_active > SESSION_IDLE_TIMEOUT]:
+                del self._sessions[session_id]
+            total = sum(session.nbytes for session in self._sessions.values())
+            while total > self.max_bytes and self._sessions:
+                session_id, session = self._sessions.popitem(last=False)
+                total -= session.nbytes
+                logger.info(f"Evicted chat session {session_id} to stay under memory cap")
+
+    def stats(self):
+        """Number of live sessions and the bytes of history they hold"""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": sum(session.nbytes for session in self._sessions.values())
+            }
+
+
+# Create a singleton instance
+chat_sessions = ChatSessionStore()
@@ -0,0 +1,63 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Markdown symbols removed from chat answers
+MARKDOWN_SYMBOLS = str.maketrans('', '', '*#')
+
+
+class MarkdownStripper:
+    """Incremental version of the chat answer cleanup
+
+    Drops markdown symbols, trims leading and trailing whitespace and
+    collapses blank-line runs into one paragraph break, one chunk at a time.
+    Whitespace is held back until the next visible character shows whether
+    it is a paragraph break or the end of the answer.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.pending = ''
+
+    def feed(self, chunk):
+        """Return the cleaned text that can be sent for this chunk"""
+        output = []
+        for char in chunk.translate(MARKDOWN_SYMBOLS):
+            if char.isspace():
+                self.pending += char
+                continue
+            if self.started and self.pending:
+                output.append('\n\n' if self.pending.count('\n') >= 2 else self.pending)
+            self.pending = ''
+            self.started = True
+            output.append(char)
+        return ''.join(output)
+
+    def finish(self):
+        """Trailing whitespace is dropped, so nothing is left to send"""
+        self.pending = ''
+        return ''
+
+
+def sse(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def iter_text(response):
+    """Yield text from a streaming Gemini response, cancelling it if the consumer stops early"""
+    completed = False
+    try:
+        for chunk in response:
+            text = getattr(chunk, 'text', '')
+            if text:
+                yield text
+        completed = True
+    finally:
+        if not completed:
+            # The generation runs over a gRPC stream; cancelling it stops upstream work
+            cancel = getattr(getattr(response, '_iterator', None), 'cancel', None)
+            if cancel:
+                cancel()
+            logger.info("Chat stream closed before completion, upstream generation cancelled")
@@ -1,9 +1,34 @@
 import os
-import google.generativeai as genai
+import json
+import time
+import logging
 from dotenv import load_dotenv
+from services.llm_cache import llm_cache
+from services.llm_dispatch import llm_dispatcher
+from services.registry import service_registry, ServiceUnavailable
+from services.chat_sessions import chat_sessions, extractive_summary
+from services.portfolio_context import portfolio_context, static_holdings
+from services.metrics import InstrumentedClient, track_upstream
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Model discovery is cached on disk so restarts skip the list_models round trip
+MODEL_CACHE_PATH = os.getenv(
+    'MODEL_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'gemini_models.json')
+)
+MODEL_DISCOVERY_TTL = int(os.getenv('MODEL_DISCOVERY_TTL', 24 * 3600))
+
+# Chat models in order of preference
+PREFERRED_MODELS = [
+    "models/gemini-1.5-pro",
+    "models/gemini-1.5-pro-latest",
+    "models/gemini-1.5-pro-001",
+    "models/gemini-1.5-pro-002"
+]
+
 # Static portfolio data
 STATIC_PORTFOLIO = {
     "stocks": [
@@ -14,42 +39,144 @@ STATIC_PORTFOLIO = {
     "risk_tolerance": "Medium"
 }
 
+def configure_genai():
+    """Import and configure the Gemini SDK"""
+    # Imported here since the SDK alone takes a noticeable part of start-up
+    import google.generativeai as genai
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY is missing in .env file")
+    genai.configure(api_key=api_key)
+    return genai
+
+def _read_model_cache():
+    try:
+        with open(MODEL_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def discover_models():
+    """Names of available Gemini models, from the disk cache while it is fresh"""
+    cached = _read_model_cache()
+    if cached and time.time() - cached.get('fetched_at', 0) < MODEL_DISCOVERY_TTL:
+        return cached['models']
+
+    try:
+        with track_upstream('gemini', 'list_models'):
+            models = [m.name for m in service_registry.get('genai').list_models()]
+    except Exception as e:
+        if cached:
+            logger.warning(f"Model discovery failed, using cached list: {str(e)}")
+            return cached['models']
+        raise
+
+    try:
+        os.makedirs(os.path.dirname(MODEL_CACHE_PATH), exist_ok=True)
+        temp_path = f"{MODEL_CACHE_PATH}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"models": models, "fetched_at": time.time()}, f)
+        os.replace(temp_path, MODEL_CACHE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not cache model list: {str(e)}")
+    return models
+
+def create_chat_model():
+    """Find the most suitable Gemini model and initialize it"""
+    models = discover_models()
+    model_name = next((name for name in PREFERRED_MODELS if name in models), None)
+    if not model_name:
+        raise ValueError("No suitable Gemini model found in available models")
+    logger.info(f"Gemini chat model: {model_name}")
+    return InstrumentedClient(service_registry.get('genai').GenerativeModel(model_name), 'gemini')
+
+def get_chat_model():
+    """The chat model, or None if Gemini is not configured"""
+    try:
+        return service_registry.get('chat_model')
+    except ServiceUnavailable as e:
+        logger.error(f"Error configuring Gemini API: {str(e)}")
+        return None
+
+service_registry.register('genai', configure_genai)
+service_registry.register('chat_model', create_chat_model)
+service_registry.register(
+    'advisor_model',
+    lambda: InstrumentedClient(service_registry.get('genai').GenerativeModel('gemini-pro'), 'gemini'),
+    warm=False, required=False
+)
+
+def summarize_turns(summary, turns):
+    """Fold older chat messages into the running summary with the model, as background work"""
+    model = get_chat_model()
+    if not model:
+        return extractive_summary(summary, turns)
+    transcript = "\n".join(f"{role}: {text}" for role, text in turns)
+    prompt = f"""Update this summary of a conversation between an investor and their financial advisor.
+Keep facts about the investor's holdings, goals, preferences and any advice already given. Use at most 120 words.
+
+Current summary:
+{summary or "(none)"}
+
+New messages:
+{transcript}"""
+    response = llm_dispatcher.call(
+        lambda timeout: model.generate_content(prompt, request_options={"timeout": timeout}),
+        lane='background'
+    )
+    return response.text.strip()
+
+chat_sessions.summarizer = summarize_turns
+
 class GeminiService:
     def __init__(self):
-        genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel('gemini-pro')
+        self.model_name = 'gemini-pro'
 
-    def generate_response(self, user_query):
+    @property
+    def model(self):
+        return service_registry.get('advisor_model')
+
+    def generate_response(self, user_query, bypass_cache=False, session_id=None):
         try:
-            # Calculate portfolio metrics
-            total_investment = sum(stock["quantity"] * stock["buy_price"] for stock in STATIC_PORTFOLIO["stocks"])
-            portfolio_weights = {
-                stock["symbol"]: (stock["quantity"] * stock["buy_price"] / total_investment) * 100 
-                for stock in STATIC_PORTFOLIO["stocks"]
-            }
+            history = chat_sessions.context(session_id)
+            summary = self._portfolio_context()
+            portfolio = summary.text
+            response = llm_cache.get_or_generate(
+                user_query, {"holdings": summary.version, "history": history}, self.model_name,
+                lambda: llm_dispatcher.call(lambda timeout: self._generate(user_query, portfolio, history, timeout)),
+                bypass=bypass_cache
+            )
+            chat_sessions.append(session_id, user_query, response)
+            return response
+        except Exception as e:
+            logger.error(f"Gemini API Error: {str(e)}")
+            return "I apologize, but I encountered an error. Please try again."
 
-            # Construct the analysis prompt
-            analysis_prompt = f"""
-            You are a financial advisor. Here is the static portfolio information:
+    def _portfolio_context(self):
+        """Compact portfolio summary, rebuilt only when the holdings change"""
+        return portfolio_context.get("static", static_holdings(STATIC_PORTFOLIO), [
+            f"Investment goal: {STATIC_PORTFOLIO['investment_goal']}",
+            f"Risk tolerance: {STATIC_PORTFOLIO['risk_tolerance']}"
+        ])
 
-            Holdings:
-            {[f"- {stock['symbol']}: {stock['quantity']} shares at ₹{stock['buy_price']}" for stock in STATIC_PORTFOLIO['stocks']]}
+    def _generate(self, user_query, portfolio, history, timeout):
+        """Build the portfolio prompt and ask the model"""
+        # Construct the analysis prompt
+        analysis_prompt = f"""
+        You are a financial advisor. Here is the portfolio information:
 
-            Total Investment: ₹{total_investment:,.2f}
-            Portfolio Weights: {portfolio_weights}
-            Investment Goal: {STATIC_PORTFOLIO['investment_goal']}
-            Risk Tolerance: {STATIC_PORTFOLIO['risk_tolerance']}
+        {portfolio}
 
-            User Question: {user_query}
+        {history}
 
-            Please provide your analysis and advice in response to the user's specific question in short (100 words max)
+        User Question: {user_query}
 
-            response = self.model.generate_content(analysis_prompt)
-            return response.text
+        Please provide your analysis and advice in response to the user's specific question in short (100 words max)
+        """
 
-        except Exception as e:
-            print(f"Gemini API Error: {str(e)}")
-            return "I apologize, but I encountered an error. Please try again."
+        response = self.model.generate_content(analysis_prompt, request_options={"timeout": timeout})
+        return response.text
 
 # Create singleton instance
 gemini_service = GeminiService() 
\ No newline at end of file
@@ -0,0 +1,56 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from services.candle_store import INTERVAL_SECONDS
+from services.rate_governor import current_lane, lane
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of days the broker returns per getCandleData request
+MAX_DAYS_PER_REQUEST = {
+    "ONE_MINUTE": 30,
+    "THREE_MINUTE": 60,
+    "FIVE_MINUTE": 100,
+    "TEN_MINUTE": 100,
+    "FIFTEEN_MINUTE": 200,
+    "THIRTY_MINUTE": 200,
+    "ONE_HOUR": 400,
+    "ONE_DAY": 2000
+}
+
+# Broker dates have minute resolution, so chunks are separated by one minute
+DATE_RESOLUTION = 60
+
+
+history_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='history')
+
+
+def plan_chunks(start, end, interval):
+    """Split [start, end] (epoch seconds) into ranges the broker accepts in one request"""
+    span = MAX_DAYS_PER_REQUEST[interval] * 86400 - INTERVAL_SECONDS[interval]
+    chunks = []
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(chunk_start + span, end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + DATE_RESOLUTION
+    return chunks
+
+
+def submit_chunks(fetch, start, end, interval, lane_name=None):
+    """Start fetching every chunk of [start, end] concurrently
+
+    `fetch(chunk_start, chunk_end)` is called once per chunk, in the
+    caller's rate governor lane unless `lane_name` is given; the governor
+    paces the broker calls. Returns the futures in chronological order.
+    """
+    lane_name = lane_name or current_lane()
+
+    def fetch_in_lane(chunk_start, chunk_end):
+        with lane(lane_name):
+            return fetch(chunk_start, chunk_end)
+
+    chunks = plan_chunks(start, end, interval)
+    if len(chunks) > 1:
+        logger.info(f"Splitting {interval} history request into {len(chunks)} chunks")
+    return [history_executor.submit(fetch_in_lane, s, e) for s, e in chunks]
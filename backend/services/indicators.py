@@ -0,0 +1,491 @@
+import copy
+import threading
+import logging
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from services.cache import IST, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Indicators accepted in a set such as "sma:50,rsi,macd:12:26:9", with their default parameters
+DEFAULT_PARAMS = {
+    "sma": (20,),
+    "ema": (20,),
+    "rsi": (14,),
+    "macd": (12, 26, 9),
+    "bb": (20, 2),
+    "vwap": (),
+    "atr": (14,)
+}
+DEFAULT_SET = "sma,ema,rsi,macd,bb,vwap,atr"
+
+# Bounds on window lengths, and on indicators per set
+MIN_PERIOD, MAX_PERIOD = 2, 500
+MAX_SET_SIZE = 16
+
+# Exponential smoothing runs in blocks of this many candles; within a block it is a closed-form cumsum
+EWM_BLOCK = 64
+
+# Indicator series kept for reuse, and how long an unused one is kept in seconds
+SERIES_CACHE_ENTRIES = 2048
+SERIES_TTL = 6 * 3600
+
+
+# Vectorized indicators over whole series. They work along the last axis, so a
+# (symbols, candles) matrix is handled in one call; values before a window fills are NaN.
+
+def _recurrence(values, alpha, initial):
+    """y[t] = (1 - alpha) * y[t-1] + alpha * values[t], continuing from y[-1] = initial"""
+    decay = 1.0 - alpha
+    out = np.empty_like(values)
+    previous = np.asarray(initial, dtype=np.float64)
+    for start in range(0, values.shape[-1], EWM_BLOCK):
+        block = values[..., start:start + EWM_BLOCK]
+        powers = decay ** np.arange(1, block.shape[-1] + 1)
+        out[..., start:start + block.shape[-1]] = powers * (
+            previous[..., None] + alpha * np.cumsum(block / powers, axis=-1))
+        previous = out[..., start + block.shape[-1] - 1]
+    return out
+
+
+def smooth(values, period, alpha):
+    """Exponential smoothing seeded with the mean of the first `period` values"""
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < period:
+        return out
+    seed = values[..., :period].mean(axis=-1)
+    out[..., period - 1] = seed
+    out[..., period:] = _recurrence(values[..., period:], alpha, seed)
+    return out
+
+
+def sma(values, period):
+    values = np.asarray(values, dtype=np.float64)
+    out = np.full(values.shape, np.nan)
+    if values.shape[-1] < period:
+        return out
+    sums = np.cumsum(values, axis=-1)
+    out[..., period - 1] = sums[..., period - 1]
+    out[..., period:] = sums[..., period:] - sums[..., :-period]
+    out[..., period - 1:] /= period
+    return out
+
+
+def ema(values, period):
+    return smooth(values, period, 2.0 / (period + 1))
+
+
+def rsi(close, period=14):
+    """Wilder's relative strength index"""
+    close = np.asarray(close, dtype=np.float64)
+    delta = np.diff(close, axis=-1)
+    average_gain = smooth(np.maximum(delta, 0), period, 1.0 / period)
+    average_loss = smooth(np.maximum(-delta, 0), period, 1.0 / period)
+    out = np.full(close.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[..., 1:] = np.where(average_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + average_gain / average_loss))
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """MACD line, signal line and histogram"""
+    close = np.asarray(close, dtype=np.float64)
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = np.full(close.shape, np.nan)
+    if close.shape[-1] >= slow:
+        signal_line[..., slow - 1:] = ema(line[..., slow - 1:], signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close, period=20, width=2):
+    """Upper band, middle band (SMA) and lower band, `width` population standard deviations apart"""
+    close = np.asarray(close, dtype=np.float64)
+    middle = sma(close, period)
+    deviation = np.full(close.shape, np.nan)
+    if close.shape[-1] >= period:
+        deviation[..., period - 1:] = sliding_window_view(close, period, axis=-1).std(axis=-1)
+    return middle + width * deviation, middle, middle - width * deviation
+
+
+def session_ids(timestamps):
+    """IST trading day of each epoch timestamp, for anchoring intraday VWAP"""
+    return np.floor((np.asarray(timestamps) + IST.utcoffset(None).total_seconds()) / 86400)
+
+
+def vwap(high, low, close, volume, sessions=None):
+    """Volume-weighted typical price, restarting at each change in `sessions` if given"""
+    price_volume = (np.asarray(high) + np.asarray(low) + np.asarray(close)) / 3.0 * volume
+    cumulative_pv = np.cumsum(price_volume, axis=-1)
+    cumulative_volume = np.cumsum(np.asarray(volume, dtype=np.float64), axis=-1)
+    if sessions is not None:
+        positions = np.arange(len(sessions))
+        starts = np.r_[True, sessions[1:] != sessions[:-1]]
+        before = np.maximum.accumulate(np.where(starts, positions, 0)) - 1
+        padded_pv = np.concatenate([np.zeros(cumulative_pv.shape[:-1] + (1,)), cumulative_pv], axis=-1)
+        padded_volume = np.concatenate([np.zeros(cumulative_volume.shape[:-1] + (1,)), cumulative_volume], axis=-1)
+        cumulative_pv = cumulative_pv - padded_pv[..., before + 1]
+        cumulative_volume = cumulative_volume - padded_volume[..., before + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(cumulative_volume > 0, cumulative_pv / cumulative_volume, np.nan)
+
+
+def true_range(high, low, close):
+    high, low, close = (np.asarray(column, dtype=np.float64) for column in (high, low, close))
+    previous = np.concatenate([close[..., :1], close[..., :-1]], axis=-1)
+    ranges = np.maximum(high - low, np.maximum(np.abs(high - previous), np.abs(low - previous)))
+    if ranges.shape[-1]:
+        ranges[..., 0] = high[..., 0] - low[..., 0]
+    return ranges
+
+
+def atr(high, low, close, period=14):
+    """Wilder's average true range"""
+    return smooth(true_range(high, low, close), period, 1.0 / period)
+
+
+# Incremental state. load() computes the whole series with the functions above and
+# keeps what update() needs to produce the next values from one more candle in O(1).
+# Candles are columns of the candle store layout: timestamp, open, high, low, close, volume.
+
+class _Smoother:
+    """Running exponential smoothing, seeded like smooth()"""
+
+    def __init__(self, period, alpha):
+        self.period = period
+        self.alpha = alpha
+        self.count = 0
+        self.total = 0.0
+        self.value = np.nan
+
+    def load(self, values):
+        out = smooth(values, self.period, self.alpha)
+        self.count = len(values)
+        if self.count < self.period:
+            self.total = float(np.sum(values))
+        else:
+            self.value = float(out[-1])
+        return out
+
+    def update(self, x):
+        self.count += 1
+        if self.count < self.period:
+            self.total += x
+        elif self.count == self.period:
+            self.value = (self.total + x) / self.period
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class _Window:
+    """Last `period` values in a ring, with their running sum and sum of squares"""
+
+    def __init__(self, period):
+        self.period = period
+        self.ring = np.zeros(period)
+        self.position = 0
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+
+    def load(self, values):
+        tail = np.asarray(values[-self.period:], dtype=np.float64)
+        self.ring[:len(tail)] = tail
+        self.position = len(tail) % self.period
+        self.count = len(values)
+        self.total, self.squares = float(tail.sum()), float((tail * tail).sum())
+
+    def push(self, x):
+        old = self.ring[self.position] if self.count >= self.period else 0.0
+        self.ring[self.position] = x
+        self.position = (self.position + 1) % self.period
+        self.count += 1
+        if self.position == 0:
+            # Re-sum once per lap so floating point drift cannot build up
+            self.total, self.squares = float(self.ring.sum()), float((self.ring * self.ring).sum())
+        else:
+            self.total += x - old
+            self.squares += x * x - old * old
+
+    @property
+    def full(self):
+        return self.count >= self.period
+
+    def mean(self):
+        return self.total / self.period if self.full else np.nan
+
+    def std(self):
+        if not self.full:
+            return np.nan
+        mean = self.total / self.period
+        return max(self.squares / self.period - mean * mean, 0.0) ** 0.5
+
+
+class SMA:
+    def __init__(self, period=20):
+        self.window = _Window(period)
+        self.columns = (f"sma_{period}",)
+
+    def load(self, candles):
+        self.window.load(candles[4])
+        return (sma(candles[4], self.window.period),)
+
+    def update(self, candle):
+        self.window.push(candle[4])
+        return (self.window.mean(),)
+
+
+class EMA:
+    def __init__(self, period=20):
+        self.smoother = _Smoother(period, 2.0 / (period + 1))
+        self.columns = (f"ema_{period}",)
+
+    def load(self, candles):
+        return (self.smoother.load(candles[4]),)
+
+    def update(self, candle):
+        return (self.smoother.update(candle[4]),)
+
+
+class RSI:
+    def __init__(self, period=14):
+        self.gains = _Smoother(period, 1.0 / period)
+        self.losses = _Smoother(period, 1.0 / period)
+        self.previous = None
+        self.columns = (f"rsi_{period}",)
+
+    def load(self, candles):
+        close = candles[4]
+        delta = np.diff(close)
+        self.gains.load(np.maximum(delta, 0))
+        self.losses.load(np.maximum(-delta, 0))
+        self.previous = float(close[-1]) if len(close) else None
+        return (rsi(close, self.gains.period),)
+
+    def update(self, candle):
+        close, previous = candle[4], self.previous
+        self.previous = close
+        if previous is None:
+            return (np.nan,)
+        gain = self.gains.update(max(close - previous, 0.0))
+        loss = self.losses.update(max(previous - close, 0.0))
+        if np.isnan(gain):
+            return (np.nan,)
+        return (100.0 if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss),)
+
+
+class MACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = _Smoother(fast, 2.0 / (fast + 1))
+        self.slow = _Smoother(slow, 2.0 / (slow + 1))
+        self.signal = _Smoother(signal, 2.0 / (signal + 1))
+        name = "macd" if (fast, slow, signal) == DEFAULT_PARAMS["macd"] else f"macd_{fast}_{slow}_{signal}"
+        self.columns = (name, f"{name}_signal", f"{name}_hist")
+
+    def load(self, candles):
+        close = candles[4]
+        line = self.fast.load(close) - self.slow.load(close)
+        signal = np.full(line.shape, np.nan)
+        signal[self.slow.period - 1:] = self.signal.load(line[self.slow.period - 1:])
+        return line, signal, line - signal
+
+    def update(self, candle):
+        line = self.fast.update(candle[4]) - self.slow.update(candle[4])
+        if np.isnan(line):
+            return np.nan, np.nan, np.nan
+        signal = self.signal.update(line)
+        return line, signal, line - signal
+
+
+class Bollinger:
+    def __init__(self, period=20, width=2):
+        self.window = _Window(period)
+        self.width = width
+        name = "bb" if (period, width) == DEFAULT_PARAMS["bb"] else f"bb_{period}_{width:g}"
+        self.columns = (f"{name}_upper", f"{name}_middle", f"{name}_lower")
+
+    def load(self, candles):
+        self.window.load(candles[4])
+        return bollinger(candles[4], self.window.period, self.width)
+
+    def update(self, candle):
+        self.window.push(candle[4])
+        middle, deviation = self.window.mean(), self.window.std()
+        return middle + self.width * deviation, middle, middle - self.width * deviation
+
+
+class VWAP:
+    """VWAP anchored to each IST trading day for intraday candles, or to the first candle for daily ones"""
+
+    def __init__(self, intraday=True):
+        self.intraday = intraday
+        self.session = None
+        self.price_volume = 0.0
+        self.volume = 0.0
+        self.columns = ("vwap",)
+
+    def load(self, candles):
+        sessions = session_ids(candles[0]) if self.intraday else None
+        typical = (candles[2] + candles[3] + candles[4]) / 3.0
+        if candles.shape[1]:
+            current = sessions == sessions[-1] if self.intraday else slice(None)
+            self.session = sessions[-1] if self.intraday else None
+            self.price_volume = float((typical[current] * candles[5][current]).sum())
+            self.volume = float(candles[5][current].sum())
+        return (vwap(candles[2], candles[3], candles[4], candles[5], sessions),)
+
+    def update(self, candle):
+        if self.intraday:
+            session = session_ids(candle[0])
+            if session != self.session:
+                self.session, self.price_volume, self.volume = session, 0.0, 0.0
+        self.price_volume += (candle[2] + candle[3] + candle[4]) / 3.0 * candle[5]
+        self.volume += candle[5]
+        return (self.price_volume / self.volume if self.volume > 0 else np.nan,)
+
+
+class ATR:
+    def __init__(self, period=14):
+        self.smoother = _Smoother(period, 1.0 / period)
+        self.previous = None
+        self.columns = (f"atr_{period}",)
+
+    def load(self, candles):
+        self.previous = float(candles[4, -1]) if candles.shape[1] else None
+        return (self.smoother.load(true_range(candles[2], candles[3], candles[4])),)
+
+    def update(self, candle):
+        high, low, close = candle[2], candle[3], candle[4]
+        previous, self.previous = self.previous, close
+        if previous is None:
+            return (self.smoother.update(high - low),)
+        return (self.smoother.update(max(high - low, abs(high - previous), abs(low - previous))),)
+
+
+INDICATORS = {"sma": SMA, "ema": EMA, "rsi": RSI, "macd": MACD, "bb": Bollinger, "vwap": VWAP, "atr": ATR}
+
+
+def parse_set(text):
+    """Parse "sma:50,rsi,macd:12:26:9" into a tuple of (name, params); raises ValueError on bad input"""
+    spec = []
+    for item in (text or DEFAULT_SET).split(','):
+        name, *params = item.strip().lower().split(':')
+        if not name:
+            continue
+        if name not in INDICATORS:
+            raise ValueError(f"Unknown indicator '{name}', expected one of {', '.join(INDICATORS)}")
+        defaults = DEFAULT_PARAMS[name]
+        if len(params) > len(defaults):
+            raise ValueError(f"{name} takes at most {len(defaults)} parameters")
+        try:
+            values = [float(p) if name == "bb" and i == 1 else int(p) for i, p in enumerate(params)]
+        except ValueError:
+            raise ValueError(f"Bad parameters for {name}: {':'.join(params)}")
+        values += defaults[len(values):]
+        periods = values[:1] if name == "bb" else values
+        if any(not MIN_PERIOD <= period <= MAX_PERIOD for period in periods):
+            raise ValueError(f"{name} periods must be between {MIN_PERIOD} and {MAX_PERIOD}")
+        if name == "macd" and values[0] >= values[1]:
+            raise ValueError("macd fast period must be shorter than the slow one")
+        if (name, tuple(values)) not in spec:
+            spec.append((name, tuple(values)))
+    if not spec or len(spec) > MAX_SET_SIZE:
+        raise ValueError(f"Pass between 1 and {MAX_SET_SIZE} indicators")
+    return tuple(spec)
+
+
+def build_indicators(spec, intraday):
+    return [VWAP(intraday) if name == "vwap" else INDICATORS[name](*params) for name, params in spec]
+
+
+class IndicatorSeries:
+    """Indicator values over one token's settled candles, extended one candle at a time"""
+
+    def __init__(self, spec, intraday, candles):
+        self.indicators = build_indicators(spec, intraday)
+        self.columns = [column for indicator in self.indicators for column in indicator.columns]
+        count = candles.shape[1]
+        # Row 0 holds timestamps, then one row per column; capacity doubles as candles are appended
+        self.values = np.empty((len(self.columns) + 1, max(2 * count, 64)))
+        self.values[0, :count] = candles[0]
+        row = 1
+        for indicator in self.indicators:
+            for series in indicator.load(candles):
+                self.values[row, :count] = series
+                row += 1
+        self.count = count
+        self.lock = threading.Lock()
+
+    @property
+    def first(self):
+        return self.values[0, 0] if self.count else None
+
+    @property
+    def last(self):
+        return self.values[0, self.count - 1] if self.count else None
+
+    def _step(self, indicators, candle):
+        return [candle[0]] + [value for indicator in indicators for value in indicator.update(candle)]
+
+    def append(self, candles):
+        """Fold candles newer than the last one into the state, in O(1) per candle"""
+        for candle in candles.T:
+            if self.count == self.values.shape[1]:
+                self.values = np.concatenate([self.values, np.empty_like(self.values)], axis=1)
+            self.values[:, self.count] = self._step(self.indicators, candle)
+            self.count += 1
+
+    def provisional(self, candles):
+        """Values for still-forming candles, computed on a copy of the state so they can change later"""
+        if not candles.shape[1]:
+            return np.empty((len(self.columns) + 1, 0))
+        indicators = copy.deepcopy(self.indicators)
+        return np.array([self._step(indicators, candle) for candle in candles.T]).T
+
+    def window(self, start, end):
+        values = self.values[:, :self.count]
+        return values[:, (values[0] >= start) & (values[0] <= end)]
+
+
+class IndicatorEngine:
+    """Keeps indicator series per token and set, and extends them with new candles instead of recomputing
+
+    A request whose candles start inside a cached series reuses its values,
+    which also gives them warm-up history from earlier candles. Candles that
+    are not settled yet (the live one) are evaluated without being kept.
+    """
+
+    def __init__(self, max_entries=SERIES_CACHE_ENTRIES):
+        self._series = TTLCache(max_entries=max_entries)
+        self._lock = threading.Lock()
+
+    def compute(self, key, spec, candles, settled_until, intraday):
+        """Timestamps and indicator columns covering `candles`, as (columns, values array)"""
+        cache_key = (key, spec)
+        settled = candles[:, candles[0] <= settled_until]
+        forming = candles[:, candles[0] > settled_until]
+
+        with self._lock:
+            series = self._series.get(cache_key)
+            # Rebuild when the candles start before the cached series or leave a gap after it
+            if series is None or not series.count or not settled.shape[1] \
+                    or not series.first <= settled[0, 0] <= series.last:
+                series = IndicatorSeries(spec, intraday, settled)
+            self._series.set(cache_key, series, SERIES_TTL)
+
+        with series.lock:
+            if settled.shape[1] and series.count:
+                series.append(settled[:, settled[0] > series.last])
+            values = series.window(candles[0, 0], candles[0, -1]) if candles.shape[1] else series.window(0, -1)
+            tail = series.provisional(forming)
+        return series.columns, np.concatenate([values, tail], axis=1)
+
+    def stats(self):
+        return self._series.stats()
+
+
+# Create a singleton instance
+indicator_engine = IndicatorEngine()
@@ -0,0 +1,326 @@
+import json
+import os
+import shutil
+import threading
+import time
+import logging
+from datetime import datetime, time as dt_time
+
+import numpy as np
+import requests
+
+from services.cache import IST
+from services.metrics import track_upstream
+
+logger = logging.getLogger(__name__)
+
+# Angel One's scrip master, a JSON list of every tradable instrument; a local file path works too
+INSTRUMENT_MASTER_URL = os.getenv(
+    'INSTRUMENT_MASTER_URL',
+    'https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json'
+)
+
+# Built indexes live here, one folder per build
+INSTRUMENT_INDEX_DIR = os.getenv(
+    'INSTRUMENT_INDEX_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'instruments')
+)
+
+# The broker publishes the day's master before the open; rebuild once a day after this time (IST)
+INSTRUMENT_REFRESH_AT = dt_time(8, 30)
+
+# Seconds between checks of whether a refresh is due, and between retries after a failed one
+REFRESH_CHECK_INTERVAL = 900
+
+# Matches looked at per search segment before filtering, and results returned by default
+SEARCH_SCAN_ROWS = 256
+SEARCH_LIMIT = 10
+
+# Search tiers, listed in this order: NSE cash, other cash (BSE), then derivatives and other segments
+TIERS = (b'0', b'1', b'2')
+CASH_EXCHANGES = ("NSE", "BSE")
+
+# Row columns, and the sorted key arrays built over them
+ROW_COLUMNS = ("token", "symbol", "name", "expiry", "exchange", "instrument_type", "strike", "lot_size", "tick_size")
+KEY_COLUMNS = ("symbol_keys", "symbol_rows", "name_keys", "name_rows", "token_keys", "token_rows")
+
+
+def _bytes(values):
+    """Fixed-width bytes array, upper-cased and ASCII-only, so keys compare bytewise"""
+    return np.array([str(v).upper().encode('ascii', 'ignore') for v in values], dtype=np.bytes_)
+
+
+def _codes(values):
+    """Small-integer codes for a low-cardinality column, and the labels they stand for"""
+    labels, codes = np.unique(np.array(values, dtype=str), return_inverse=True)
+    return codes.astype(np.uint8 if len(labels) < 256 else np.uint16), [str(label) for label in labels]
+
+
+def _sorted_keys(keys):
+    order = np.argsort(keys, kind='stable')
+    return keys[order], order.astype(np.int32)
+
+
+def build_index(instruments, directory):
+    """Convert scrip master records into column and sorted key arrays saved under `directory`"""
+    os.makedirs(directory, exist_ok=True)
+    exchange, exchanges = _codes([i.get('exch_seg', '') for i in instruments])
+    instrument_type, types = _codes([i.get('instrumenttype', '') for i in instruments])
+    columns = {
+        "token": _bytes(i['token'] for i in instruments),
+        "symbol": _bytes(i['symbol'] for i in instruments),
+        "name": _bytes(i.get('name', '') for i in instruments),
+        "expiry": _bytes(i.get('expiry', '') for i in instruments),
+        "exchange": exchange,
+        "instrument_type": instrument_type,
+        "strike": np.array([float(i.get('strike') or -1) for i in instruments], dtype=np.float64),
+        "lot_size": np.array([int(float(i.get('lotsize') or 1)) for i in instruments], dtype=np.int32),
+        "tick_size": np.array([float(i.get('tick_size') or 0) for i in instruments], dtype=np.float32)
+    }
+
+    # Cash equities and indices sort into the first tiers, so a prefix search finds them first
+    cash_codes = [code for code, label in enumerate(exchanges) if label in CASH_EXCHANGES]
+    derivative_codes = [code for code, label in enumerate(types) if label not in ("", "AMXIDX")]
+    cash = np.isin(exchange, cash_codes) & ~np.isin(instrument_type, derivative_codes)
+    nse = exchange == (exchanges.index("NSE") if "NSE" in exchanges else -1)
+    tier = np.select([cash & nse, cash], TIERS[:2], TIERS[2]).astype('S1')
+    exchange_names = np.array([label.encode() for label in exchanges], dtype=np.bytes_)[exchange]
+
+    columns["symbol_keys"], columns["symbol_rows"] = _sorted_keys(np.char.add(tier, columns["symbol"]))
+    columns["name_keys"], columns["name_rows"] = _sorted_keys(np.char.add(tier, columns["name"]))
+    columns["token_keys"], columns["token_rows"] = _sorted_keys(
+        np.char.add(np.char.add(exchange_names, b':'), columns["token"]))
+
+    for name, array in columns.items():
+        np.save(os.path.join(directory, f"{name}.npy"), array, allow_pickle=False)
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({"exchanges": exchanges, "instrument_types": types, "count": len(instruments),
+                   "built_at": datetime.now(IST).isoformat(timespec='seconds')}, f)
+
+
+class InstrumentIndex:
+    """Read-only view of a built index, memory-mapped from disk
+
+    Lookups are binary searches over sorted fixed-width byte keys, so
+    resolving a symbol or token and prefix searches touch only a few pages.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        self.exchanges = meta['exchanges']
+        self.instrument_types = meta['instrument_types']
+        self.count = meta['count']
+        self.built_at = meta['built_at']
+        self._exchange_codes = {label: code for code, label in enumerate(self.exchanges)}
+        for name in ROW_COLUMNS + KEY_COLUMNS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r'))
+
+    def row(self, i):
+        """One instrument as a dict"""
+        return {
+            "token": self.token[i].decode(),
+            "symbol": self.symbol[i].decode(),
+            "name": self.name[i].decode(),
+            "exchange": self.exchanges[self.exchange[i]],
+            "instrument_type": self.instrument_types[self.instrument_type[i]],
+            "expiry": self.expiry[i].decode(),
+            "strike": float(self.strike[i]),
+            "lot_size": int(self.lot_size[i]),
+            "tick_size": float(self.tick_size[i])
+        }
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        lo = int(np.searchsorted(keys, prefix, side='left'))
+        hi = int(np.searchsorted(keys, prefix + b'\xff', side='left'))
+        return lo, hi
+
+    def resolve_token(self, token, exchange="NSE"):
+        """Instrument for an exchange and symbol token, or None"""
+        key = f"{exchange}:{token}".upper().encode('ascii', 'ignore')
+        i = int(np.searchsorted(self.token_keys, key))
+        if i < len(self.token_keys) and self.token_keys[i] == key:
+            return self.row(int(self.token_rows[i]))
+        return None
+
+    def resolve_symbol(self, symbol, exchange="NSE"):
+        """Instrument for a trading symbol on an exchange, or None; RELIANCE also finds RELIANCE-EQ"""
+        code = self._exchange_codes.get(exchange.upper())
+        if code is None:
+            return None
+        symbol = symbol.upper().encode('ascii', 'ignore')
+        for candidate in (symbol, symbol + b'-EQ'):
+            for tier in TIERS:
+                key = tier + candidate
+                lo = int(np.searchsorted(self.symbol_keys, key, 'left'))
+                hi = int(np.searchsorted(self.symbol_keys, key, 'right'))
+                rows = self.symbol_rows[lo:hi]
+                rows = rows[self.exchange[rows] == code]
+                if len(rows):
+                    return self.row(int(rows[0]))
+        return None
+
+    def search(self, query, limit=SEARCH_LIMIT, exchange=None):
+        """Instruments whose symbol or name starts with `query`, equities first"""
+        prefix = query.strip().upper().encode('ascii', 'ignore')
+        if not prefix:
+            return []
+        code = self._exchange_codes.get(exchange.upper()) if exchange else None
+        if exchange and code is None:
+            return []
+
+        found = []
+        seen = set()
+        for tier in TIERS:
+            for keys, rows in ((self.symbol_keys, self.symbol_rows), (self.name_keys, self.name_rows)):
+                lo, hi = self._prefix_range(keys, tier + prefix)
+                # Scan matches in blocks so an exchange filter can't turn into a full scan of a huge range
+                while lo < hi and len(found) < limit:
+                    block = rows[lo:min(hi, lo + SEARCH_SCAN_ROWS)]
+                    if code is not None:
+                        block = block[self.exchange[block] == code]
+                    for i in block.tolist():
+                        if i not in seen:
+                            seen.add(i)
+                            found.append(i)
+                            if len(found) == limit:
+                                break
+                    lo += SEARCH_SCAN_ROWS
+                if len(found) >= limit:
+                    return [self.row(i) for i in found]
+        return [self.row(i) for i in found]
+
+
+class InstrumentMaster:
+    """The current instrument index, rebuilt daily in the background
+
+    Readers always use the index already loaded; a refresh builds a new
+    one in a fresh folder and swaps it in when complete, so requests never
+    wait for a download.
+    """
+
+    def __init__(self, directory=INSTRUMENT_INDEX_DIR, source=INSTRUMENT_MASTER_URL):
+        self.directory = directory
+        self.source = source
+        self._index = None
+        self._loaded = False
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        """The loaded index, or None while the first one is being built"""
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._index = self._load_latest()
+                    self._loaded = True
+            if self._index is None:
+                self.refresh_async()
+        return self._index
+
+    def _builds(self):
+        try:
+            return sorted(name for name in os.listdir(self.directory) if name.startswith('index-'))
+        except OSError:
+            return []
+
+    def _load_latest(self):
+        for name in reversed(self._builds()):
+            try:
+                return InstrumentIndex(os.path.join(self.directory, name))
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f"Skipping unreadable instrument index {name}: {str(e)}")
+        return None
+
+    def _download(self):
+        if os.path.exists(self.source):
+            with open(self.source) as f:
+                return json.load(f)
+        with track_upstream('angelone', 'scrip_master'):
+            response = requests.get(self.source, timeout=120)
+            response.raise_for_status()
+            return response.json()
+
+    def refresh(self):
+        """Download the scrip master, build a new index and swap it in"""
+        started = time.perf_counter()
+        instruments = self._download()
+        name = f"index-{datetime.now(IST).strftime('%Y%m%d-%H%M%S')}"
+        temp_dir = os.path.join(self.directory, f".{name}.tmp")
+        build_index(instruments, temp_dir)
+        os.replace(temp_dir, os.path.join(self.directory, name))
+        index = InstrumentIndex(os.path.join(self.directory, name))
+        with self._lock:
+            self._index, self._loaded = index, True
+
+        # Readers of older builds keep their mappings, so their folders can go
+        for old in self._builds()[:-2]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+        logger.info(f"Instrument index rebuilt: {index.count} instruments in {time.perf_counter() - started:.1f}s")
+        return index
+
+    def refresh_async(self):
+        """Start a refresh in the background unless one is already running"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Instrument index refresh failed: {str(e)}")
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, name='instrument-refresh', daemon=True).start()
+
+    def refresh_due(self):
+        """Whether today's master is out and the index predates it"""
+        index = self.index
+        if index is None:
+            return not self._refreshing
+        now = datetime.now(IST)
+        published = datetime.combine(now.date(), INSTRUMENT_REFRESH_AT, tzinfo=IST)
+        return now >= published and datetime.fromisoformat(index.built_at) < published
+
+    def start(self):
+        """Keep the index fresh from a daemon thread"""
+        def run():
+            while True:
+                try:
+                    if self.refresh_due():
+                        self.refresh_async()
+                except Exception as e:
+                    logger.error(f"Instrument refresh check failed: {str(e)}")
+                time.sleep(REFRESH_CHECK_INTERVAL)
+        threading.Thread(target=run, name='instrument-scheduler', daemon=True).start()
+
+    def search(self, query, limit=SEARCH_LIMIT, exchange=None):
+        index = self.index
+        return index.search(query, limit, exchange) if index else None
+
+    def resolve_token(self, token, exchange="NSE"):
+        index = self.index
+        return index.resolve_token(token, exchange) if index else None
+
+    def resolve_symbol(self, symbol, exchange="NSE"):
+        index = self.index
+        return index.resolve_symbol(symbol, exchange) if index else None
+
+    def stats(self):
+        """Size and build time of the loaded index"""
+        index = self._index
+        return {
+            "loaded": index is not None,
+            "instruments": index.count if index else 0,
+            "built_at": index.built_at if index else None,
+            "refreshing": self._refreshing
+        }
+
+
+# Create a singleton instance
+instrument_master = InstrumentMaster()
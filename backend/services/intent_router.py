@@ -0,0 +1,177 @@
+import re
+import threading
+import time
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Questions asking for an opinion always go to the model, even if they mention a number
+ADVICE_PATTERN = re.compile(
+    r"\b(should|recommend|advi[cs]e|suggest|why|risk|buy|sell|hold|rebalance|improve|opinion|better|best)\b"
+)
+
+# Lookup intents in the order they are tried
+INTENT_PATTERNS = [
+    ("pnl_today", re.compile(r"\b(today|today's|daily|day's|intraday)\b.*\b(p&l|p/l|pnl|profit|loss|gain|change|up|down)\b"
+                             r"|\b(p&l|p/l|pnl|profit|loss|gain|change|up|down)\b.*\b(today|daily)\b")),
+    ("allocation", re.compile(r"\b(allocation|allocated|weights?|weightage|breakdown|split|distribution|composition)\b")),
+    ("holding_value", re.compile(r"\b(worth|value|valued|price|ltp|trading at)\b")),
+    ("pnl_total", re.compile(r"\b(p&l|p/l|pnl|profit|loss|gains?|returns?|up or down)\b")),
+]
+
+# Words lookup questions are made of; any other word may name a stock the user
+# doesn't hold (or misspell one they do), so the question goes to the model
+VOCABULARY = frozenset("""
+    a about account across all am an and any are at be by can could current currently daily day did do does
+    each entire far for from get give has have how i in is it its last latest lost made market me money
+    much my net now of on or overall per please right see show so tell the this to today total up was
+    were what whats whole with you your
+    change changed composition distribution down gain gains holding holdings intraday investment
+    investments invested loss losses p&l p/l pnl portfolio position positions price prices profit profits
+    return returns share shares split stock stocks value valued worth ltp trading allocation allocated
+    breakdown weight weights weightage
+""".split())
+
+# Words as split out of a lowercased question
+WORD_PATTERN = re.compile(r"[a-z0-9&/'’]+")
+
+
+def _symbol(holding):
+    """Trading symbol without the exchange series suffix"""
+    return holding['tradingsymbol'].upper().removesuffix('-EQ')
+
+
+def _amount(value):
+    sign = '-' if value < 0 else ''
+    return f"{sign}₹{abs(value):,.2f}"
+
+
+def _names_other(text, symbols):
+    """Whether a question has words that are neither held symbols nor lookup vocabulary"""
+    for symbol in symbols:
+        text = re.sub(rf"\b{re.escape(symbol.lower())}\b", " ", text)
+    for word in WORD_PATTERN.findall(text):
+        word = word.replace("’", "'").removesuffix("'s").strip("'")
+        if word and not word.isdigit() and word not in VOCABULARY:
+            return True
+    return False
+
+
+def classify(message, symbols=None):
+    """Return (intent, symbol) for a lookup question, or (None, None) for the model
+
+    `symbol` is the holding a question is about, if it names one. With the
+    held `symbols` given, a question naming anything else goes to the model;
+    without them only the question's shape is checked.
+    """
+    text = message.lower()
+    if ADVICE_PATTERN.search(text):
+        return None, None
+    if symbols is not None and _names_other(text, symbols):
+        return None, None
+
+    mentioned = next((s for s in symbols or () if re.search(rf"\b{re.escape(s.lower())}\b", text)), None)
+    for intent, pattern in INTENT_PATTERNS:
+        if not pattern.search(text):
+            continue
+        if intent == "holding_value":
+            return ("holding_value", mentioned) if mentioned else ("portfolio_value", None)
+        if intent == "pnl_total" and mentioned:
+            return "holding_pnl", mentioned
+        return intent, None
+    return None, None
+
+
+def answer(intent, symbol, holdings, positions):
+    """Answer a lookup intent from live holdings and positions"""
+    invested = sum(float(h['averageprice']) * float(h['quantity']) for h in holdings)
+    current = sum(float(h['ltp']) * float(h['quantity']) for h in holdings)
+
+    if intent == "pnl_today":
+        # Same figure as the dashboard's daily P&L
+        daily_pl = sum(float(p['dayPl']) for p in positions)
+        change = daily_pl / invested * 100 if invested > 0 else 0
+        return f"Your P&L today is {_amount(daily_pl)} ({change:+.2f}% of your investment)."
+
+    if intent == "pnl_total":
+        pnl = current - invested
+        change = pnl / invested * 100 if invested > 0 else 0
+        return (f"Your holdings are worth {_amount(current)} against {_amount(invested)} invested, "
+                f"an overall P&L of {_amount(pnl)} ({change:+.2f}%).")
+
+    if intent == "portfolio_value":
+        return f"Your holdings are currently worth {_amount(current)} across {len(holdings)} stocks."
+
+    if intent == "allocation":
+        if current <= 0:
+            return "You have no holdings to allocate."
+        weights = sorted(((_symbol(h), float(h['ltp']) * float(h['quantity'])) for h in holdings),
+                         key=lambda item: item[1], reverse=True)
+        lines = [f"- {name}: {value / current * 100:.1f}% ({_amount(value)})" for name, value in weights]
+        return "Your current allocation by market value:\n" + "\n".join(lines)
+
+    holding = next(h for h in holdings if _symbol(h) == symbol)
+    quantity = float(holding['quantity'])
+    value = float(holding['ltp']) * quantity
+    if intent == "holding_value":
+        return (f"Your {quantity:g} shares of {symbol} are worth {_amount(value)} "
+                f"at ₹{float(holding['ltp']):,.2f} each.")
+
+    pnl = value - float(holding['averageprice']) * quantity
+    return (f"{symbol}: bought at ₹{float(holding['averageprice']):,.2f}, now ₹{float(holding['ltp']):,.2f}, "
+            f"P&L {_amount(pnl)} on {quantity:g} shares.")
+
+
+class IntentRouter:
+    """Answers numeric portfolio questions locally and counts how many skip the model"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def route(self, message, angel_one):
+        """Return {"intent", "response"} if the question was answered locally, else None"""
+        started = time.perf_counter()
+        intent, symbol = classify(message)
+
+        # Holdings are only fetched for lookups; questions naming anything but a holding go to the model
+        holdings = None
+        if intent and angel_one:
+            result = angel_one.get_holdings()
+            if result and result.get('status'):
+                holdings = result.get('data') or []
+                intent, symbol = classify(message, [_symbol(h) for h in holdings])
+
+        response = None
+        if intent and holdings is not None:
+            try:
+                positions_data = []
+                if intent == "pnl_today":
+                    positions = angel_one.get_portfolio_positions()
+                    positions_data = (positions or {}).get('data') or []
+                response = answer(intent, symbol, holdings, positions_data)
+            except Exception as e:
+                logger.error(f"Local answer for {intent} failed: {str(e)}")
+
+        route = "local" if response else "llm"
+        reason = "no_intent" if not intent else ("answered" if response else "no_portfolio_data")
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._counts[route] += 1
+        logger.info(f"Chat routed to {route}: intent={intent} reason={reason} elapsed_ms={elapsed:.1f}")
+        return {"intent": intent, "response": response} if response else None
+
+    def stats(self):
+        """Local and model counts and the share answered locally"""
+        with self._lock:
+            total = self._counts['local'] + self._counts['llm']
+            return {
+                "local": self._counts['local'],
+                "llm": self._counts['llm'],
+                "offload_rate": round(self._counts['local'] / total, 4) if total else None
+            }
+
+
+# Create a singleton instance
+intent_router = IntentRouter()
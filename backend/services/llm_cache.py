@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import logging
+
+from services.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a generated answer is reused, and how many answers are kept in memory
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 1024))
+
+# Optional directory that keeps answers across restarts; memory only when unset
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR')
+
+
+def normalize_message(message):
+    """Fold case, whitespace and trailing punctuation so equivalent questions share a key"""
+    return re.sub(r'\s+', ' ', message).strip().rstrip('?!. ').lower()
+
+
+def fingerprint(context):
+    """Stable hash of the portfolio context a prompt was built from"""
+    encoded = json.dumps(context, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class LLMResponseCache:
+    """TTL/LRU cache of model answers with an optional disk backend
+
+    Entries are keyed by the normalized question, the portfolio fingerprint
+    and the model name, so a changed portfolio or model never serves a
+    stale answer. Concurrent identical questions share one generation.
+    """
+
+    def __init__(self, max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL, disk_dir=LLM_CACHE_DIR):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._memory = TTLCache(max_entries)
+        self._lock = threading.Lock()
+        self.lookup_hits = 0
+        self.disk_hits = 0
+        self.generated = 0
+        self.bypassed = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def key(message, context, model_name):
+        return (model_name, fingerprint(context), normalize_message(message))
+
+    def _disk_path(self, key):
+        name = hashlib.sha256("\x1f".join(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{name}.json")
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) < time.time():
+            self._disk_remove(path)
+            return None
+        # Touch the file so pruning evicts the least recently used answers
+        os.utime(path)
+        return entry.get('response')
+
+    def _disk_set(self, key, response):
+        path = self._disk_path(key)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({"response": response, "expires_at": time.time() + self.ttl}, f)
+            os.replace(temp_path, path)
+            self._disk_prune()
+        except OSError as e:
+            logger.error(f"LLM cache disk write failed: {str(e)}")
+
+    def _disk_prune(self):
+        paths = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir) if name.endswith('.json')]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            self._disk_remove(path)
+
+    @staticmethod
+    def _disk_remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_or_generate(self, message, context, model_name, generate, bypass=False):
+        """Return a cached answer or call `generate()` and cache its result
+
+        With `bypass` the model is always called and its answer replaces
+        any cached one. Empty answers are returned but never cached.
+        """
+        key = self.key(message, context, model_name)
+
+        def load():
+            if not bypass and self.disk_dir:
+                response = self._disk_get(key)
+                if response:
+                    with self._lock:
+                        self.disk_hits += 1
+                    return response
+            response = generate()
+            with self._lock:
+                self.generated += 1
+            if response and self.disk_dir:
+                self._disk_set(key, response)
+            return response
+
+        if bypass:
+            with self._lock:
+                self.bypassed += 1
+            response = load()
+            if response:
+                self._memory.set(key, response, self.ttl)
+            return response
+        return self._memory.get_or_load(key, load, self.ttl)
+
+    def lookup(self, message, context, model_name):
+        """Return a cached answer without generating one, or None"""
+        key = self.key(message, context, model_name)
+        response = self._memory.get(key)
+        if response is not None:
+            with self._lock:
+                self.lookup_hits += 1
+            return response
+        if self.disk_dir:
+            response = self._disk_get(key)
+            if response:
+                with self._lock:
+                    self.disk_hits += 1
+                self._memory.set(key, response, self.ttl)
+                return response
+        return None
+
+    def store(self, message, context, model_name, response):
+        """Cache an answer generated outside get_or_generate, e.g. a streamed one"""
+        if not response:
+            return
+        key = self.key(message, context, model_name)
+        with self._lock:
+            self.generated += 1
+        self._memory.set(key, response, self.ttl)
+        if self.disk_dir:
+            self._disk_set(key, response)
+
+    def invalidate(self):
+        """Drop every cached answer from memory and disk"""
+        self._memory.invalidate()
+        if self.disk_dir:
+            for name in os.listdir(self.disk_dir):
+                self._disk_remove(os.path.join(self.disk_dir, name))
+
+    def stats(self):
+        """Hit/miss counters across memory and disk"""
+        memory = self._memory.stats()
+        with self._lock:
+            return {
+                "hits": memory['hits'] + self.lookup_hits + self.disk_hits,
+                "misses": self.generated,
+                "memory_hits": memory['hits'] + self.lookup_hits,
+                "disk_hits": self.disk_hits,
+                "bypassed": self.bypassed,
+                "size": memory['size']
+            }
+
+
+# Create a singleton instance
+llm_cache = LLMResponseCache()
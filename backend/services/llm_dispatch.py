@@ -0,0 +1,166 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import logging
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Concurrent model calls, callers allowed to wait for one, and the default per-call deadline in seconds
+LLM_WORKERS = int(os.getenv('LLM_WORKERS', 4))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 16))
+LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', 30))
+
+# Priority lanes, lowest value served first. Background work may only fill
+# half the queue so interactive chat always has room to wait.
+LANES = {
+    "interactive": 0,
+    "background": 1
+}
+
+# Recent samples kept per lane for latency percentiles
+METRIC_SAMPLES = 1024
+
+
+class LLMOverloaded(Exception):
+    """Too many calls are already waiting for a model slot"""
+
+
+class LLMTimeout(Exception):
+    """The call's deadline passed before a model slot became free"""
+
+
+class _Ticket:
+    """A granted model slot and the deadline the call must finish by"""
+
+    def __init__(self, lane, deadline):
+        self.lane = lane
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self.failed = False
+        self.released = False
+
+    def remaining(self):
+        """Seconds left until the deadline"""
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class LLMDispatcher:
+    """Bounds concurrent model calls with priority lanes, deadlines and backpressure
+
+    Callers wait for one of `workers` slots in priority order. When
+    `max_queue` callers are already waiting new ones are rejected at once
+    instead of tying up request threads, and a caller whose deadline passes
+    while queued gives up. The remaining deadline is handed to the call so
+    the model request itself is bounded too.
+    """
+
+    def __init__(self, workers=LLM_WORKERS, max_queue=LLM_MAX_QUEUE, deadline=LLM_DEADLINE):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._counters = {lane: Counter() for lane in LANES}
+        self._queue_wait = {lane: deque(maxlen=METRIC_SAMPLES) for lane in LANES}
+        self._service_time = {lane: deque(maxlen=METRIC_SAMPLES) for lane in LANES}
+
+    def acquire(self, lane='interactive', timeout=None):
+        """Wait for a model slot and return its ticket
+
+        Raises LLMOverloaded if the lane's queue is full and LLMTimeout if
+        the deadline passes first. Every ticket must be passed to release().
+        """
+        enqueued = time.monotonic()
+        deadline = enqueued + (timeout or self.deadline)
+        limit = self.max_queue if LANES[lane] == 0 else self.max_queue // 2
+        with self._cond:
+            self._counters[lane]['submitted'] += 1
+            if len(self._waiters) >= limit:
+                self._counters[lane]['rejected'] += 1
+                raise LLMOverloaded(f"{len(self._waiters)} model calls already waiting")
+
+            entry = (LANES[lane], next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while self._in_flight >= self.workers or self._waiters[0] != entry:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counters[lane]['timed_out'] += 1
+                        raise LLMTimeout("Timed out waiting for a model slot")
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._waiters)
+            self._in_flight += 1
+            # The next waiter may be able to take another free slot
+            self._cond.notify_all()
+            self._queue_wait[lane].append(time.monotonic() - enqueued)
+        return _Ticket(lane, deadline)
+
+    def release(self, ticket):
+        """Free a slot and record how long the call held it"""
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            self._in_flight -= 1
+            self._counters[ticket.lane]['failed' if ticket.failed else 'completed'] += 1
+            self._service_time[ticket.lane].append(time.monotonic() - ticket.started)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, lane='interactive', timeout=None):
+        """Hold a model slot for the duration of a with block"""
+        ticket = self.acquire(lane, timeout)
+        try:
+            yield ticket
+        except BaseException:
+            ticket.failed = True
+            raise
+        finally:
+            self.release(ticket)
+
+    def call(self, fn, lane='interactive', timeout=None):
+        """Run `fn(remaining_seconds)` in a model slot and return its result"""
+        with self.slot(lane, timeout) as ticket:
+            return fn(ticket.remaining())
+
+    def stats(self):
+        """Queue depth, slot usage, counters and latency percentiles per lane"""
+        def percentiles(samples):
+            if not samples:
+                return {"p50": None, "p95": None}
+            p50, p95 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95])
+            return {"p50": round(float(p50), 4), "p95": round(float(p95), 4)}
+
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "lanes": {
+                    lane: {
+                        **{name: self._counters[lane][name]
+                           for name in ('submitted', 'rejected', 'timed_out', 'completed', 'failed')},
+                        "queue_wait": percentiles(self._queue_wait[lane]),
+                        "service_time": percentiles(self._service_time[lane])
+                    }
+                    for lane in LANES
+                }
+            }
+
+
+# Create a singleton instance
+llm_dispatcher = LLMDispatcher()
@@ -0,0 +1,240 @@
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import logging
+from datetime import date, datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Logs go to <LOG_DIR>/<date>/app.log, the layout the broker SDK already writes to
+LOG_DIR = os.getenv(
+    'LOG_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
+)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+
+# A day's log rolls over to app.log.1, app.log.2, ... past this size
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+
+# Records waiting for the writer thread; beyond this new records are dropped rather than blocking
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+# Share of DEBUG records kept, since those are emitted per candle, quote or chunk
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', 0.01))
+
+# Also write human-readable lines to stderr (from the writer thread)
+LOG_CONSOLE = os.getenv('LOG_CONSOLE', '1') not in ('0', 'false', 'no')
+
+# Field names whose values are credentials, matched as whole words in "key": "value", 'key': 'value' and
+# key=value forms. Quoted values are masked up to the closing quote, unquoted ones up to the next
+# separator or the end of the line, so values with spaces are masked whole.
+SECRET_KEYS = r"password|totp|secret|client_secret|secret_?key|api_?key|jwt_?token|refresh_?token|feed_?token|access_?token|token|authorization|x-privatekey"
+SECRET_FIELD_PATTERN = re.compile(
+    rf"""(?P<key>["']?\b(?:{SECRET_KEYS})\b["']?\s*[:=]\s*)"""
+    r"""(?:(?P<quote>["'])(?:\\.|(?!(?P=quote)).)*(?P=quote)|[^,;&}\r\n]+)""",
+    re.IGNORECASE
+)
+SECRET_KEY_PATTERN = re.compile(rf"(?:{SECRET_KEYS})", re.IGNORECASE)
+BEARER_PATTERN = re.compile(r"(Bearer\s+)[\w\-.=]+", re.IGNORECASE)
+JWT_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+")
+
+# Attributes every LogRecord has; anything else came in through `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sampled'}
+
+
+def redact(text):
+    """Mask credentials, bearer tokens and JWTs in a log message"""
+    # Tokens first, so a field match on "Authorization: Bearer ..." can't stop short of the token
+    text = BEARER_PATTERN.sub(r"\1[REDACTED]", text)
+    text = JWT_PATTERN.sub("[REDACTED]", text)
+    return SECRET_FIELD_PATTERN.sub(
+        lambda m: f"{m.group('key')}{m.group('quote') or ''}[REDACTED]{m.group('quote') or ''}", text)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a random share of DEBUG records"""
+
+    def __init__(self, rate=LOG_DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        if random.random() < self.rate:
+            record.sampled = self.rate
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class RedactingFilter(logging.Filter):
+    """Redact the rendered message, traceback and `extra=` fields; runs on the writer thread"""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        for key, value in list(vars(record).items()):
+            if key in _RECORD_ATTRS or value is None or isinstance(value, (bool, int, float)):
+                continue
+            if SECRET_KEY_PATTERN.fullmatch(key):
+                setattr(record, key, "[REDACTED]")
+            else:
+                setattr(record, key, redact(str(value)))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with `extra=` fields included"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName
+        }
+        if getattr(record, 'sampled', None):
+            entry["sample_rate"] = record.sampled
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DatedRotatingFileHandler(RotatingFileHandler):
+    """Writes to <directory>/<date>/app.log, starting a new folder each day and rotating by size within it"""
+
+    def __init__(self, directory, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.directory = directory
+        self.date = date.today()
+        super().__init__(self._path(self.date), maxBytes=max_bytes, backupCount=backup_count,
+                         encoding='utf-8', delay=True)
+
+    def _path(self, day):
+        folder = os.path.join(self.directory, day.isoformat())
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, 'app.log')
+
+    def shouldRollover(self, record):
+        return date.today() != self.date or super().shouldRollover(record)
+
+    def doRollover(self):
+        today = date.today()
+        if today == self.date:
+            super().doRollover()
+            return
+        # New day: close the old file; the next emit opens the new day's one
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.date = today
+        self.baseFilename = self._path(today)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of waiting"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the traceback here, where the exception is still in scope; the rest is left to the writer
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogPipeline:
+    """Routes all logging through a bounded queue to one background writer
+
+    Request threads only filter, render the message and enqueue; JSON
+    formatting, redaction, console output and disk writes happen on the
+    listener thread.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self.queue_handler = NonBlockingQueueHandler(self.queue)
+        self.sampler = SamplingFilter()
+        self.queue_handler.addFilter(self.sampler)
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def configure(self, directory=LOG_DIR, level=LOG_LEVEL, console=LOG_CONSOLE):
+        """Install the pipeline on the root logger; later calls are no-ops"""
+        with self._lock:
+            if self.listener:
+                return
+            handlers = []
+            file_handler = DatedRotatingFileHandler(directory)
+            file_handler.setFormatter(JsonFormatter())
+            handlers.append(file_handler)
+            if console:
+                console_handler = logging.StreamHandler(sys.stderr)
+                console_handler.setFormatter(logging.Formatter('%(levelname)s:%(name)s:%(message)s'))
+                handlers.append(console_handler)
+            redactor = RedactingFilter()
+            for handler in handlers:
+                handler.addFilter(redactor)
+
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(self.queue_handler)
+            root.setLevel(level)
+
+            self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
+
+    def capture_sdk_logger(self):
+        """Send the broker SDK's logzero output through the pipeline
+
+        SmartConnect points logzero at logs/<date>/app.log (and stderr) every
+        time it is constructed, writing full request headers synchronously.
+        """
+        if not self.listener:
+            return
+        sdk_logger = logging.getLogger('logzero_default')
+        for handler in list(sdk_logger.handlers):
+            sdk_logger.removeHandler(handler)
+        sdk_logger.propagate = True
+
+    def stop(self):
+        """Flush queued records and stop the writer"""
+        with self._lock:
+            if self.listener:
+                self.listener.stop()
+                self.listener = None
+
+    def stats(self):
+        """Records queued, dropped because the queue was full, and DEBUG records sampled out"""
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.queue_handler.dropped,
+            "sampled_out": self.sampler.sampled_out
+        }
+
+
+# Create a singleton instance
+log_pipeline = LogPipeline()
@@ -0,0 +1,162 @@
+import random
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Exchange segment codes used by the broker's streaming API
+EXCHANGE_TYPES = {
+    "NSE": 1,
+    "NFO": 2,
+    "BSE": 3,
+    "BFO": 4,
+    "MCX": 5
+}
+EXCHANGE_NAMES = {code: name for name, code in EXCHANGE_TYPES.items()}
+
+# Quote mode includes cumulative day volume alongside the LTP
+QUOTE_MODE = 2
+
+# Seconds to wait before reconnecting a dropped upstream socket
+RECONNECT_DELAY = 2
+
+
+class AngelOneFeed:
+    """Single upstream SmartAPI WebSocket connection with automatic reconnect
+
+    `credentials()` is called before every (re)connect and returns the
+    auth_token/api_key/client_code/feed_token of a live session, or None
+    when there is none yet. `on_tick(tick)` receives normalised ticks;
+    `on_connect()` is called after every (re)connect so the owner can
+    resubscribe its tokens.
+    """
+
+    def __init__(self, credentials, on_tick, on_connect):
+        self.credentials = credentials
+        self.on_tick = on_tick
+        self.on_connect = on_connect
+        self._socket = None
+        self._running = False
+
+    def start(self):
+        """Connect in a background thread"""
+        self._running = True
+        threading.Thread(target=self._run, name='angel-one-feed', daemon=True).start()
+
+    def _run(self):
+        from SmartApi.smartWebSocketV2 import SmartWebSocketV2
+
+        while self._running:
+            # Tokens expire and sessions log out, so every reconnect uses whichever session is live now
+            try:
+                credentials = self.credentials()
+            except Exception as e:
+                logger.error(f"Market feed credentials unavailable: {str(e)}")
+                credentials = None
+            if not credentials:
+                logger.warning(f"No live session for the market feed, retrying in {RECONNECT_DELAY}s")
+                time.sleep(RECONNECT_DELAY)
+                continue
+
+            # Reconnects are handled by this loop rather than the SDK's own retry
+            self._socket = SmartWebSocketV2(credentials['auth_token'], credentials['api_key'],
+                                            credentials['client_code'], credentials['feed_token'],
+                                            max_retry_attempt=0)
+            self._socket.on_open = lambda wsapp: self.on_connect()
+            self._socket.on_data = lambda wsapp, data: self.on_tick(self._normalise(data))
+            self._socket.on_error = lambda *args: logger.warning(f"Market feed error: {args}")
+            try:
+                self._socket.connect()
+            except Exception as e:
+                logger.error(f"Market feed connection failed: {str(e)}")
+            if self._running:
+                logger.info(f"Market feed disconnected, reconnecting in {RECONNECT_DELAY}s")
+                time.sleep(RECONNECT_DELAY)
+
+    @staticmethod
+    def _normalise(data):
+        return {
+            "exchange": EXCHANGE_NAMES.get(data.get('exchange_type'), str(data.get('exchange_type'))),
+            "token": str(data['token']),
+            "ltp": data['last_traded_price'] / 100,
+            "volume": data.get('volume_trade_for_the_day'),
+            "timestamp": data['exchange_timestamp'] / 1000
+        }
+
+    def _token_list(self, exchange, tokens):
+        return [{"exchangeType": EXCHANGE_TYPES[exchange], "tokens": list(tokens)}]
+
+    def subscribe(self, exchange, tokens):
+        if self._socket and self._socket.wsapp:
+            self._socket.subscribe("tradewise", QUOTE_MODE, self._token_list(exchange, tokens))
+
+    def unsubscribe(self, exchange, tokens):
+        if self._socket and self._socket.wsapp:
+            self._socket.unsubscribe("tradewise", QUOTE_MODE, self._token_list(exchange, tokens))
+
+    def stop(self):
+        self._running = False
+        if self._socket:
+            self._socket.close_connection()
+
+
+class FakeFeed:
+    """Local random-walk tick generator with the same interface as AngelOneFeed
+
+    Used when MARKET_FEED=fake so the streaming path can be exercised offline.
+    `disconnect()` simulates a dropped socket followed by a reconnect.
+    """
+
+    def __init__(self, on_tick, on_connect, tick_interval=0.1):
+        self.on_tick = on_tick
+        self.on_connect = on_connect
+        self.tick_interval = tick_interval
+        self.subscribed = set()
+        self.subscribe_calls = 0
+        self._prices = {}
+        self._volumes = {}
+        self._running = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._run, name='fake-feed', daemon=True).start()
+
+    def _run(self):
+        self.on_connect()
+        while self._running:
+            with self._lock:
+                subscribed = list(self.subscribed)
+            for exchange, token in subscribed:
+                price = self._prices.get((exchange, token), 100 + int(token) % 900)
+                price = round(max(1.0, price * (1 + random.gauss(0, 0.001))), 2)
+                self._prices[(exchange, token)] = price
+                volume = self._volumes.get((exchange, token), 0) + random.randint(1, 100)
+                self._volumes[(exchange, token)] = volume
+                self.on_tick({
+                    "exchange": exchange,
+                    "token": token,
+                    "ltp": price,
+                    "volume": volume,
+                    "timestamp": time.time()
+                })
+            time.sleep(self.tick_interval)
+
+    def subscribe(self, exchange, tokens):
+        with self._lock:
+            self.subscribe_calls += 1
+            self.subscribed.update((exchange, token) for token in tokens)
+
+    def unsubscribe(self, exchange, tokens):
+        with self._lock:
+            self.subscribed.difference_update((exchange, token) for token in tokens)
+
+    def disconnect(self):
+        """Drop every upstream subscription and reconnect, like a real socket would"""
+        with self._lock:
+            self.subscribed.clear()
+        self.on_connect()
+
+    def stop(self):
+        self._running = False
@@ -0,0 +1,138 @@
+import threading
+import time
+import logging
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Seconds between conflated tick flushes to SocketIO rooms
+FLUSH_INTERVAL = 0.25
+
+
+class MarketStream:
+    """Fans one upstream tick feed out to SocketIO rooms, one room per symbol
+
+    Upstream subscriptions are reference counted per (exchange, token), so
+    broker load follows the number of distinct symbols rather than clients.
+    Ticks are conflated: each flush sends only the latest tick per symbol.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.tick_listeners = []
+        self._emit = None
+        self._start_task = None
+        self._feed = None
+        self._refcounts = Counter()
+        self._subscriptions = defaultdict(set)
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def room(exchange, token):
+        """SocketIO room name for a symbol"""
+        return f"{exchange}:{token}"
+
+    def attach(self, emit, start_task):
+        """Set how ticks are emitted and how the flush loop is started"""
+        self._emit = emit
+        self._start_task = start_task
+
+    def ensure_feed(self, feed_factory):
+        """Create the process-wide upstream feed on first use
+
+        `feed_factory(on_tick, on_connect)` must return an unstarted feed.
+        """
+        with self._lock:
+            if self._feed:
+                return
+            self._feed = feed_factory(self._on_tick, self._on_connect)
+        self._feed.start()
+        self._start_task(self._flush_loop)
+
+    def subscribe(self, client_id, exchange, tokens):
+        """Add a client's interest in tokens, subscribing upstream only for new symbols"""
+        upstream = []
+        with self._lock:
+            for token in tokens:
+                key = (exchange, token)
+                if key in self._subscriptions[client_id]:
+                    continue
+                self._subscriptions[client_id].add(key)
+                self._refcounts[key] += 1
+                if self._refcounts[key] == 1:
+                    upstream.append(token)
+        if upstream and self._feed:
+            self._feed.subscribe(exchange, upstream)
+
+    def unsubscribe(self, client_id, exchange, tokens):
+        """Drop a client's interest in tokens, unsubscribing upstream when nobody is left"""
+        upstream = []
+        with self._lock:
+            for token in tokens:
+                key = (exchange, token)
+                if key not in self._subscriptions[client_id]:
+                    continue
+                self._subscriptions[client_id].discard(key)
+                self._refcounts[key] -= 1
+                if self._refcounts[key] <= 0:
+                    del self._refcounts[key]
+                    self._latest.pop(key, None)
+                    upstream.append(token)
+            if not self._subscriptions[client_id]:
+                del self._subscriptions[client_id]
+        if upstream and self._feed:
+            self._feed.unsubscribe(exchange, upstream)
+
+    def remove_client(self, client_id):
+        """Drop every subscription held by a disconnected client"""
+        with self._lock:
+            keys = list(self._subscriptions.get(client_id, ()))
+        by_exchange = defaultdict(list)
+        for exchange, token in keys:
+            by_exchange[exchange].append(token)
+        for exchange, tokens in by_exchange.items():
+            self.unsubscribe(client_id, exchange, tokens)
+
+    def is_watched(self, exchange, token):
+        """Whether any client is currently subscribed to a symbol"""
+        with self._lock:
+            return (exchange, token) in self._refcounts
+
+    def _on_connect(self):
+        # A fresh upstream socket has no subscriptions, so replay all of them
+        with self._lock:
+            by_exchange = defaultdict(list)
+            for exchange, token in self._refcounts:
+                by_exchange[exchange].append(token)
+        for exchange, tokens in by_exchange.items():
+            logger.info(f"Resubscribing {len(tokens)} {exchange} tokens on market feed")
+            self._feed.subscribe(exchange, tokens)
+
+    def _on_tick(self, tick):
+        key = (tick['exchange'], tick['token'])
+        with self._lock:
+            if key in self._refcounts:
+                self._latest[key] = tick
+        for listener in self.tick_listeners:
+            try:
+                listener(tick)
+            except Exception as e:
+                logger.error(f"Tick listener failed: {str(e)}")
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                pending, self._latest = self._latest, {}
+            for (exchange, token), tick in pending.items():
+                self._emit('tick', tick, self.room(exchange, token))
+
+    def stats(self):
+        """Number of distinct upstream symbols and connected subscribers"""
+        with self._lock:
+            return {"symbols": len(self._refcounts), "clients": len(self._subscriptions)}
+
+
+# Create a singleton instance
+market_stream = MarketStream()
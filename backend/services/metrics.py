@@ -0,0 +1,239 @@
+import bisect
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Latency bucket upper bounds in seconds, from fast cache hits to slow model calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count per label set"""
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                                for labels, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down per label set"""
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+                                for labels, value in items]
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set
+
+    Observing is a bisect and three additions under a lock, cheap enough
+    to leave on for every request.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text format
+
+    Collectors are callables run at scrape time that return
+    (name, kind, documentation, [(labels_dict, value), ...]) tuples, for
+    numbers other modules already track, such as cache hit counters.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Create a singleton instance
+metrics = MetricsRegistry()
+
+upstream_latency = metrics.histogram(
+    "upstream_request_duration_seconds", "Latency of calls to external services", ("service", "call"))
+upstream_errors = metrics.counter(
+    "upstream_errors_total", "Calls to external services that raised or reported failure", ("service", "call"))
+upstream_in_flight = metrics.gauge(
+    "upstream_in_flight", "Calls to external services currently running", ("service",))
+http_latency = metrics.histogram(
+    "http_request_duration_seconds", "Flask request latency until the response is returned", ("method", "route", "status"))
+http_in_flight = metrics.gauge("http_requests_in_flight", "Requests currently being handled")
+
+
+@contextmanager
+def track_upstream(service, call):
+    """Record latency, errors and concurrency of one external call"""
+    upstream_in_flight.inc(service)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        upstream_errors.inc(service, call)
+        raise
+    finally:
+        upstream_latency.observe(time.perf_counter() - started, service, call)
+        upstream_in_flight.dec(service)
+
+
+def instrumented(service, call):
+    """Decorator form of track_upstream"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with track_upstream(service, call):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class InstrumentedClient:
+    """Proxy that times every method call on an SDK client
+
+    Broker APIs often report failure as {"status": False} rather than
+    raising, so such responses count as errors too.
+    """
+
+    def __init__(self, client, service):
+        self._client = client
+        self._service = service
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with track_upstream(self._service, name):
+                result = attribute(*args, **kwargs)
+            if isinstance(result, dict) and result.get('status') is False:
+                upstream_errors.inc(self._service, name)
+            return result
+        return call
+
+
+def instrument_app(app):
+    """Time every Flask request by route template, method and status"""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        http_in_flight.inc()
+
+    @app.teardown_request
+    def record_request(error=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        http_in_flight.dec()
+        status = g.pop('metrics_status', 500 if error else 200)
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        http_latency.observe(time.perf_counter() - started, request.method, route, str(status))
+
+    @app.after_request
+    def remember_status(response):
+        g.metrics_status = response.status_code
+        return response
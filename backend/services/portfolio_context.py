@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from services.cache import IST
+from services.chat_sessions import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SECTORS_PATH = os.getenv(
+    'SECTORS_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'sectors.json')
+)
+
+# Holdings listed individually, and prompt tokens the whole summary may use
+PORTFOLIO_CONTEXT_TOP_N = int(os.getenv('PORTFOLIO_CONTEXT_TOP_N', 10))
+PORTFOLIO_CONTEXT_TOKENS = int(os.getenv('PORTFOLIO_CONTEXT_TOKENS', 400))
+
+# Prices move even when holdings don't, so summaries are refreshed after this many seconds
+PORTFOLIO_CONTEXT_MAX_AGE = 300
+
+# Summaries kept, one per client
+MAX_CONTEXTS = 1024
+
+# Upper bounds (in percent of value) of the weight buckets, largest first
+WEIGHT_BUCKETS = [(20, "over 20%"), (10, "10-20%"), (5, "5-10%"), (0, "under 5%")]
+
+
+def _load_sectors():
+    try:
+        with open(SECTORS_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Sector map unavailable: {str(e)}")
+        return {}
+
+
+def _symbol(holding):
+    return holding['tradingsymbol'].upper().removesuffix('-EQ')
+
+
+def _amount(value):
+    sign = '-' if value < 0 else ''
+    return f"{sign}₹{abs(value):,.0f}"
+
+
+def holdings_fingerprint(holdings):
+    """Hash of what is held (symbols, quantities, average prices), independent of order and prices"""
+    rows = sorted((_symbol(h), float(h['quantity']), float(h['averageprice'])) for h in holdings)
+    return hashlib.sha256(json.dumps(rows).encode('utf-8')).hexdigest()[:16]
+
+
+class PortfolioContext:
+    """A prompt-ready portfolio summary and the holdings version it describes"""
+
+    def __init__(self, version, text, built_at):
+        self.version = version
+        self.text = text
+        self.built_at = built_at
+
+
+class PortfolioContextBuilder:
+    """Builds compact, token-budgeted portfolio summaries for chat prompts
+
+    Summaries are cached per client and versioned by the holdings
+    fingerprint, so they are only recomputed when holdings change or the
+    prices in them get older than PORTFOLIO_CONTEXT_MAX_AGE.
+    """
+
+    def __init__(self, top_n=PORTFOLIO_CONTEXT_TOP_N, token_budget=PORTFOLIO_CONTEXT_TOKENS):
+        self.top_n = top_n
+        self.token_budget = token_budget
+        self.sectors = _load_sectors()
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, client_key, holdings, extra_lines=()):
+        """Return the PortfolioContext for a client's holdings, rebuilding it only if stale"""
+        version = holdings_fingerprint(holdings)
+        with self._lock:
+            context = self._contexts.get(client_key)
+            if context and context.version == version and time.monotonic() - context.built_at < PORTFOLIO_CONTEXT_MAX_AGE:
+                self._contexts.move_to_end(client_key)
+                return context
+
+        context = PortfolioContext(version, self.summarize(holdings, extra_lines), time.monotonic())
+        with self._lock:
+            self._contexts[client_key] = context
+            self._contexts.move_to_end(client_key)
+            while len(self._contexts) > MAX_CONTEXTS:
+                self._contexts.popitem(last=False)
+        return context
+
+    def summarize(self, holdings, extra_lines=()):
+        """Summarize holdings as compact text within the token budget"""
+        if not holdings:
+            return "The investor currently has no holdings."
+
+        symbols = np.array([_symbol(h) for h in holdings])
+        columns = np.array([[h['quantity'], h['averageprice'], h['ltp']] for h in holdings], dtype=np.float64)
+        quantity, average_price, ltp = columns.T
+        invested = quantity * average_price
+        value = quantity * ltp
+        total_value, total_invested = value.sum(), invested.sum()
+        weights = value / total_value * 100 if total_value > 0 else np.zeros_like(value)
+        returns = np.divide(value - invested, invested, out=np.zeros_like(value), where=invested > 0) * 100
+        total_pnl = total_value - total_invested
+        total_return = total_pnl / total_invested * 100 if total_invested > 0 else 0.0
+
+        # Sections in order of importance; lower ones are dropped first to fit the budget
+        sections = [
+            f"Portfolio as of {datetime.now(IST).strftime('%d %b %H:%M')} IST: {len(holdings)} holdings, "
+            f"value {_amount(total_value)}, invested {_amount(total_invested)}, "
+            f"P&L {_amount(total_pnl)} ({total_return:+.1f}%)"
+        ]
+        sections.extend(extra_lines)
+
+        order = np.argsort(-value)
+        top = order[:self.top_n]
+        entries = [f"{symbols[i]} {weights[i]:.1f}% ({returns[i]:+.1f}%)" for i in top]
+        rest = order[self.top_n:]
+        others = f"; {len(rest)} others {weights[rest].sum():.1f}%" if len(rest) else ""
+
+        sector_names = np.array([self.sectors.get(symbol, "Other") for symbol in symbols])
+        names, inverse = np.unique(sector_names, return_inverse=True)
+        sector_weights = np.bincount(inverse, weights=weights, minlength=len(names))
+        sector_line = "Sectors: " + ", ".join(
+            f"{names[i]} {sector_weights[i]:.1f}%" for i in np.argsort(-sector_weights))
+
+        bucket_parts = []
+        upper = np.inf
+        for lower, label in WEIGHT_BUCKETS:
+            in_bucket = (weights >= lower) & (weights < upper)
+            if in_bucket.any():
+                bucket_parts.append(f"{label}: {int(in_bucket.sum())} ({weights[in_bucket].sum():.1f}%)")
+            upper = lower
+        bucket_line = "Weight buckets: " + "; ".join(bucket_parts)
+
+        best, worst = np.argmax(returns), np.argmin(returns)
+        movers_line = (f"Best: {symbols[best]} {returns[best]:+.1f}%, "
+                       f"worst: {symbols[worst]} {returns[worst]:+.1f}%")
+
+        # Drop the lowest holdings from the top list before any whole section goes
+        remaining = self.token_budget - sum(estimate_tokens(line) for line in sections)
+        optional = [sector_line, movers_line, bucket_line]
+        while entries:
+            top_line = "Top holdings (weight, return): " + "; ".join(entries) + others
+            if estimate_tokens(top_line) <= remaining or len(entries) == 1:
+                break
+            entries.pop()
+            others = f"; {len(order) - len(entries)} others {weights[order[len(entries):]].sum():.1f}%"
+        sections.append(top_line)
+        remaining -= estimate_tokens(top_line)
+
+        for line in optional:
+            cost = estimate_tokens(line)
+            if cost <= remaining:
+                sections.append(line)
+                remaining -= cost
+        return "\n".join(sections)
+
+
+def static_holdings(portfolio):
+    """Holdings in broker format for a static {"stocks": [...]} portfolio, valued at cost"""
+    return [
+        {"tradingsymbol": stock["symbol"], "quantity": stock["quantity"],
+         "averageprice": stock["buy_price"], "ltp": stock["buy_price"]}
+        for stock in portfolio["stocks"]
+    ]
+
+
+# Create a singleton instance
+portfolio_context = PortfolioContextBuilder()
@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import logging
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Broker requests-per-second limits per endpoint, shared by every session since they use the same API keys
+ENDPOINT_LIMITS = {
+    "ltpData": 10,
+    "getMarketData": 10,
+    "getCandleData": 3,
+    "getProfile": 3,
+    "holding": 1,
+    "position": 1
+}
+
+# Priority lanes, lowest value served first
+LANES = {
+    "interactive": 0,
+    "background": 1
+}
+
+# Longest an interactive call waits for its turn before giving up, in seconds
+GOVERNOR_MAX_WAIT = float(os.getenv('GOVERNOR_MAX_WAIT', 20))
+
+# Background work is shed once it would wait longer than this, or this many background calls are queued
+BACKGROUND_MAX_WAIT = float(os.getenv('GOVERNOR_BACKGROUND_MAX_WAIT', 10))
+BACKGROUND_MAX_QUEUE = int(os.getenv('GOVERNOR_BACKGROUND_MAX_QUEUE', 64))
+
+# Interactive waits longer than this are logged
+SLOW_WAIT_WARNING = 1.0
+
+# Upper bound on a single sleep, so waiters re-check even if a wake-up is missed
+MAX_POLL = 0.5
+
+# Recent wait samples kept per endpoint for percentiles
+METRIC_SAMPLES = 1024
+
+_current_lane = ContextVar('broker_lane', default='interactive')
+
+
+class RateLimited(Exception):
+    """A broker call was shed, or would wait past its limit, instead of being queued"""
+
+    def __init__(self, endpoint, lane, expected_wait):
+        super().__init__(f"{endpoint} call in {lane} lane would wait {expected_wait:.1f}s")
+        self.endpoint = endpoint
+        self.lane = lane
+        self.expected_wait = expected_wait
+
+
+def current_lane():
+    """Priority lane of broker calls made from the current context"""
+    return _current_lane.get()
+
+
+@contextmanager
+def lane(name):
+    """Make broker calls inside the block in the given priority lane"""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane: {name}")
+    token = _current_lane.set(name)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class _Endpoint:
+    """Token bucket and waiting callers for one broker endpoint"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(1.0, float(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waiters = []
+        self.cond = threading.Condition()
+        self.counters = {name: Counter() for name in LANES}
+        self.waits = deque(maxlen=METRIC_SAMPLES)
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def expected_wait(self, priority):
+        """Seconds until a new caller of this priority would get a token"""
+        ahead = sum(1 for waiter in self.waiters if waiter[0] <= priority)
+        return max(0.0, (ahead + 1 - self.tokens) / self.rate)
+
+    def queued(self, priority):
+        return sum(1 for waiter in self.waiters if waiter[0] == priority)
+
+
+class RateGovernor:
+    """Paces broker calls per endpoint with token buckets and a priority queue
+
+    Each endpoint's bucket refills at its requests-per-second limit. Callers
+    queue in priority order (interactive before background, then first come
+    first served) instead of failing with throttling errors upstream.
+    Background calls are shed with RateLimited when the queue is under
+    pressure, and interactive calls give up after GOVERNOR_MAX_WAIT.
+    """
+
+    def __init__(self, limits=ENDPOINT_LIMITS):
+        self._endpoints = {name: _Endpoint(rate) for name, rate in limits.items()}
+        self._sequence = itertools.count()
+
+    def expected_wait(self, endpoint, lane_name=None):
+        """Seconds a call made now would wait for its turn"""
+        state = self._endpoints.get(endpoint)
+        if not state:
+            return 0.0
+        with state.cond:
+            state.refill(time.monotonic())
+            return state.expected_wait(LANES[lane_name or current_lane()])
+
+    def acquire(self, endpoint, lane_name=None, timeout=None):
+        """Wait for the endpoint's next free request slot and return the seconds waited
+
+        Raises RateLimited when a background call is shed or the wait
+        would exceed `timeout` (GOVERNOR_MAX_WAIT by default).
+        """
+        state = self._endpoints.get(endpoint)
+        if not state:
+            return 0.0
+        lane_name = lane_name or current_lane()
+        priority = LANES[lane_name]
+        timeout = GOVERNOR_MAX_WAIT if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with state.cond:
+            state.refill(started)
+            expected = state.expected_wait(priority)
+            shed = lane_name == 'background' and (
+                expected > BACKGROUND_MAX_WAIT or state.queued(priority) >= BACKGROUND_MAX_QUEUE)
+            if shed or expected > timeout:
+                state.counters[lane_name]['shed' if shed else 'rejected'] += 1
+                raise RateLimited(endpoint, lane_name, expected)
+
+            waiter = [priority, next(self._sequence)]
+            heapq.heappush(state.waiters, waiter)
+            # A higher priority arrival may have displaced the head, which must re-check
+            state.cond.notify_all()
+            try:
+                while True:
+                    now = time.monotonic()
+                    state.refill(now)
+                    if state.waiters[0] is waiter and state.tokens >= 1:
+                        heapq.heappop(state.waiters)
+                        state.tokens -= 1
+                        state.cond.notify_all()
+                        break
+                    if now >= deadline:
+                        state.counters[lane_name]['timed_out'] += 1
+                        raise RateLimited(endpoint, lane_name, state.expected_wait(priority))
+                    delay = (1 - state.tokens) / state.rate if state.waiters[0] is waiter else MAX_POLL
+                    state.cond.wait(min(max(delay, 0.001), MAX_POLL, deadline - now))
+            except BaseException:
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+                    heapq.heapify(state.waiters)
+                    state.cond.notify_all()
+                raise
+
+            waited = time.monotonic() - started
+            state.counters[lane_name]['granted'] += 1
+            state.waits.append(waited)
+
+        if lane_name == 'interactive' and waited > SLOW_WAIT_WARNING:
+            logger.warning(f"Interactive {endpoint} call waited {waited:.2f}s for the broker rate limit")
+        return waited
+
+    def stats(self):
+        """Tokens, queue depth, expected wait and outcomes per endpoint and lane"""
+        stats = {}
+        for name, state in self._endpoints.items():
+            with state.cond:
+                state.refill(time.monotonic())
+                waits = np.array(state.waits) if state.waits else None
+                stats[name] = {
+                    "rate": state.rate,
+                    "tokens": round(state.tokens, 2),
+                    "wait_p95": round(float(np.percentile(waits, 95)), 4) if waits is not None else None,
+                    "lanes": {
+                        lane_name: {
+                            "queued": state.queued(priority),
+                            "expected_wait": round(state.expected_wait(priority), 3),
+                            **state.counters[lane_name]
+                        }
+                        for lane_name, priority in LANES.items()
+                    }
+                }
+        return stats
+
+
+# Create a singleton instance
+rate_governor = RateGovernor()
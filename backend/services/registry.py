@@ -0,0 +1,118 @@
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a client whose construction failed is tried again
+RETRY_INTERVAL = 30
+
+
+class ServiceUnavailable(Exception):
+    """A client could not be constructed or failed its warmup check"""
+
+
+class _Service:
+    def __init__(self, factory, check, warm, required):
+        self.factory = factory
+        self.check = check
+        self.warm = warm
+        self.required = required
+        self.instance = None
+        self.error = None
+        self.failed_at = None
+        self.status = "pending"
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+
+class ServiceRegistry:
+    """Constructs third-party clients on first use instead of at import
+
+    Nothing here touches the network until a client is requested or
+    warm_up() runs, so workers start without waiting on external APIs.
+    """
+
+    def __init__(self):
+        self._services = {}
+
+    def register(self, name, factory, check=None, warm=True, required=True):
+        """Register `factory()` to build a client and an optional `check(client)` run during warmup
+
+        Only required services hold back readiness; the rest are reported.
+        """
+        self._services[name] = _Service(factory, check, warm, required)
+
+    def get(self, name):
+        """Return the client, constructing it on first use"""
+        service = self._services[name]
+        if service.instance is not None:
+            return service.instance
+        with service.lock:
+            if service.instance is not None:
+                return service.instance
+            if service.failed_at and time.monotonic() - service.failed_at < RETRY_INTERVAL:
+                raise ServiceUnavailable(f"{name} unavailable: {service.error}")
+            try:
+                service.instance = service.factory()
+            except Exception as e:
+                self._mark(name, service, "error", e)
+                raise ServiceUnavailable(f"{name} unavailable: {str(e)}") from e
+            if service.status != "ready":
+                self._mark(name, service, "constructed")
+            return service.instance
+
+    def _mark(self, name, service, status, error=None):
+        service.status = status
+        service.error = str(error) if error else None
+        service.failed_at = time.monotonic() if error else None
+        service.checked_at = datetime.now(timezone.utc).isoformat()
+        if error:
+            logger.warning(f"Service {name} {status}: {service.error}")
+        else:
+            logger.info(f"Service {name} {status}")
+
+    def _warm(self, name, service):
+        """Construct one service and run its check; True if it is ready"""
+        started = time.monotonic()
+        try:
+            client = self.get(name)
+            if service.check:
+                service.check(client)
+            self._mark(name, service, "ready")
+        except Exception as e:
+            if service.status != "error":
+                self._mark(name, service, "error", e)
+        logger.info(f"Warmed up {name} in {time.monotonic() - started:.2f}s")
+        return service.status == "ready"
+
+    def warm_up(self):
+        """Construct every warm service and run its check, recording the outcome
+
+        Required services that fail are retried every RETRY_INTERVAL seconds
+        until they pass, so readiness recovers without a restart.
+        """
+        pending = [(name, service) for name, service in self._services.items() if service.warm]
+        while True:
+            pending = [(name, service) for name, service in pending
+                       if not self._warm(name, service) and service.required]
+            if not pending:
+                return
+            logger.info(f"Retrying warmup of {', '.join(name for name, _ in pending)} in {RETRY_INTERVAL}s")
+            time.sleep(RETRY_INTERVAL)
+
+    def readiness(self):
+        """Whether every required service passed warmup, with per-service status"""
+        services = {
+            name: {"status": service.status, "required": service.required,
+                   "error": service.error, "checked_at": service.checked_at}
+            for name, service in self._services.items()
+        }
+        ready = all(service.status == "ready" for service in self._services.values()
+                    if service.warm and service.required)
+        return {"ready": ready, "services": services}
+
+
+# Create a singleton instance
+service_registry = ServiceRegistry()
@@ -0,0 +1,291 @@
+import json
+import os
+import random
+import threading
+import time
+import logging
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+from SmartApi.smartExceptions import DataException, NetworkException
+
+from services.cache import TTLCache
+from services.rate_governor import rate_governor
+
+logger = logging.getLogger(__name__)
+
+# Deadline in seconds for one attempt of each read call; these reads are idempotent and may be retried
+CALL_TIMEOUTS = {
+    "ltpData": 2,
+    "getMarketData": 3,
+    "getCandleData": 10,
+    "getProfile": 5,
+    "holding": 5,
+    "position": 5
+}
+
+# HTTP timeout handed to the SDK, so an abandoned attempt still frees its worker thread
+BROKER_HTTP_TIMEOUT = max(CALL_TIMEOUTS.values())
+
+# Attempts per call and the backoff before each retry (full jitter up to the capped exponential delay)
+RETRY_ATTEMPTS = int(os.getenv('BROKER_RETRY_ATTEMPTS', 3))
+RETRY_BASE_DELAY = 0.2
+RETRY_MAX_DELAY = 2.0
+
+# Each first attempt earns this many retry tokens, capped at RETRY_BUDGET_CAP; a retry spends one.
+# Retries therefore stay under ~20% of traffic and stop when the broker is failing across the board.
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_CAP = 10
+
+# Calls hedged with a second attempt once the first runs past the call's recent p95 latency
+HEDGED_CALLS = {"ltpData"} if os.getenv('BROKER_HEDGING', '1') not in ('0', 'false', 'no') else set()
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+
+# Consecutive failures that open an endpoint's circuit, and seconds before a probe is let through
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BROKER_BREAKER_FAILURES', 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv('BROKER_BREAKER_RESET', 30))
+
+# Last good responses served while the broker is unhealthy, and how old they may be
+STALE_MAX_AGE = int(os.getenv('BROKER_STALE_MAX_AGE', 3600))
+STALE_MAX_ENTRIES = 4096
+
+# Recent latency samples kept per call for the hedging threshold
+LATENCY_SAMPLES = 256
+
+# Failures worth retrying: the request may not have reached the broker or its answer was lost
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+    NetworkException, DataException, ConnectionError, TimeoutError
+)
+
+# Attempts run here so callers can stop waiting at the deadline even if the HTTP call hangs
+broker_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='broker')
+
+
+class CallTimeout(TimeoutError):
+    """A broker call attempt did not finish within its deadline"""
+
+
+class CircuitOpen(Exception):
+    """The endpoint's circuit is open and no cached response is available"""
+
+
+class CircuitBreaker:
+    """Closed, open or half-open state of one broker endpoint"""
+
+    def __init__(self, threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        """Whether a call may go upstream; in half-open state only one probe at a time"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def release_probe(self):
+        """Let another probe through after one ended without a verdict on the broker's health"""
+        with self._lock:
+            self.probing = False
+
+    def record_failure(self):
+        """Count a failure; returns True if this opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            reopened = self.probing
+            self.probing = False
+            if reopened or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class BrokerResilience:
+    """Timeouts, budgeted retries, hedging and circuit breaking for broker reads
+
+    Every attempt first waits for the rate governor, so retries and hedges
+    are paced like any other call. Hedges are only sent when the governor
+    has a token to spare. When an endpoint's circuit is open, or a call
+    fails after its retries, the last good response for the same call is
+    returned marked {"stale": True} if there is one.
+    """
+
+    def __init__(self):
+        self.breakers = {name: CircuitBreaker() for name in CALL_TIMEOUTS}
+        self.last_good = TTLCache(max_entries=STALE_MAX_ENTRIES)
+        self._latencies = {name: deque(maxlen=LATENCY_SAMPLES) for name in CALL_TIMEOUTS}
+        self._retry_tokens = float(RETRY_BUDGET_CAP)
+        self._counters = {name: Counter() for name in CALL_TIMEOUTS}
+        self._lock = threading.Lock()
+
+    def handles(self, name):
+        return name in CALL_TIMEOUTS
+
+    def hedge_delay(self, name):
+        """Recent p95 latency of a call, or None until enough samples exist"""
+        with self._lock:
+            samples = list(self._latencies[name])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(HEDGE_MIN_DELAY, float(np.percentile(samples, 95)))
+
+    def _count(self, name, event):
+        with self._lock:
+            self._counters[name][event] += 1
+
+    def _earn_retry_tokens(self):
+        with self._lock:
+            self._retry_tokens = min(RETRY_BUDGET_CAP, self._retry_tokens + RETRY_BUDGET_RATIO)
+
+    def _spend_retry_token(self):
+        with self._lock:
+            if self._retry_tokens < 1:
+                return False
+            self._retry_tokens -= 1
+            return True
+
+    def _submit(self, name, function, args, kwargs):
+        rate_governor.acquire(name)
+        started = time.monotonic()
+
+        def timed():
+            result = function(*args, **kwargs)
+            with self._lock:
+                self._latencies[name].append(time.monotonic() - started)
+            return result
+        return broker_executor.submit(timed)
+
+    def _attempt(self, name, function, args, kwargs):
+        """One attempt, hedged if the call is slow; raises CallTimeout past the deadline"""
+        futures = [self._submit(name, function, args, kwargs)]
+        deadline = time.monotonic() + CALL_TIMEOUTS[name]
+
+        hedge_delay = self.hedge_delay(name) if name in HEDGED_CALLS else None
+        if hedge_delay is not None and hedge_delay < CALL_TIMEOUTS[name]:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and rate_governor.expected_wait(name) == 0:
+                futures.append(self._submit(name, function, args, kwargs))
+                self._count(name, 'hedged')
+
+        error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1 and future is futures[1]:
+                        self._count(name, 'hedge_won')
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        if error and not pending:
+            raise error
+        for future in pending:
+            future.cancel()
+        raise CallTimeout(f"{name} took longer than {CALL_TIMEOUTS[name]}s")
+
+    def call(self, name, function, args, kwargs, owner):
+        """Run a broker read with the resilience policy; `owner` keys the stale responses"""
+        key = (owner, name, json.dumps([args, kwargs], sort_keys=True, default=str))
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            return self._stale(name, key, CircuitOpen(f"Circuit for {name} is open"))
+
+        self._earn_retry_tokens()
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                result = self._attempt(name, function, args, kwargs)
+            except TRANSIENT_ERRORS as e:
+                if breaker.record_failure():
+                    logger.warning(f"Circuit for {name} opened after repeated failures: {str(e)}")
+                    return self._stale(name, key, e)
+                last_try = attempt == RETRY_ATTEMPTS - 1
+                if last_try or not self._spend_retry_token():
+                    return self._stale(name, key, e)
+                self._count(name, 'retried')
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                logger.info(f"Retrying {name} in {delay:.2f}s after: {str(e)}")
+                time.sleep(delay)
+                continue
+            except Exception:
+                # Rejected by the rate governor or by the broker itself; says nothing about its health
+                breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            if isinstance(result, dict) and result.get('status'):
+                self.last_good.set(key, (result, time.monotonic()), STALE_MAX_AGE)
+            return result
+
+    def _stale(self, name, key, error):
+        """The last good response for this call, or re-raise the error"""
+        cached = self.last_good.get(key)
+        if cached is None:
+            self._count(name, 'failed')
+            raise error
+        response, stored_at = cached
+        self._count(name, 'stale_served')
+        logger.warning(f"Serving stale {name} response after: {str(error)}")
+        return {**response, "stale": True, "stale_age": round(time.monotonic() - stored_at, 1)}
+
+    def stats(self):
+        """Breaker state, recent p95 latency and retry/hedge/stale counts per call"""
+        with self._lock:
+            counters = {name: dict(counter) for name, counter in self._counters.items()}
+            retry_tokens = self._retry_tokens
+        calls = {}
+        for name, breaker in self.breakers.items():
+            p95 = self.hedge_delay(name)
+            calls[name] = {"circuit": breaker.state, "p95": round(p95, 4) if p95 else None, **counters[name]}
+        return {"retry_tokens": round(retry_tokens, 2), "calls": calls}
+
+
+class ResilientClient:
+    """Proxy that sends broker reads through BrokerResilience; other calls pass straight through"""
+
+    def __init__(self, client, owner, resilience):
+        self._client = client
+        self._owner = owner
+        self._resilience = resilience
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute) or not self._resilience.handles(name):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self._resilience.call(name, attribute, args, kwargs, self._owner)
+        return call
+
+
+# Create a singleton instance
+broker_resilience = BrokerResilience()
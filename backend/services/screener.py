@@ -0,0 +1,425 @@
+import ast
+import csv
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+import numpy as np
+
+from services import indicators
+from services.cache import is_market_open
+from services.candle_store import IST, INTERVAL_SECONDS, format_broker_date, merge_candles, settled_until
+from services.instruments import instrument_master
+from services.rate_governor import lane
+
+logger = logging.getLogger(__name__)
+
+# Named universes are NSE index constituent CSVs (a "Symbol" column) or JSON lists of symbols, e.g. nifty500.csv
+SCREENER_UNIVERSE_DIR = os.getenv(
+    'SCREENER_UNIVERSE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'universes')
+)
+
+# Largest universe scanned in one request
+MAX_UNIVERSE = 1000
+
+# Worker processes evaluating filters; 0 evaluates in the request thread
+SCREENER_WORKERS = int(os.getenv('SCREENER_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Symbols evaluated per worker task
+CHUNK_SIZE = 50
+
+# Concurrent candle fetches per scan. They run in the background lane, so keeping
+# this small keeps the broker queue short enough that the governor doesn't shed them.
+FETCH_CONCURRENCY = 4
+
+# Longest expression accepted, and the regular session length used to size intraday lookbacks
+MAX_FILTER_LENGTH = 500
+SESSION_SECONDS = 375 * 60
+
+# Candle ranges end on a multiple of this many seconds, so repeat scans are served by the candle
+# store instead of each fetching a fresh tail; daily candles are re-checked at most hourly
+RANGE_STEP = {"ONE_DAY": 3600}
+MAX_INTRADAY_STEP = 900
+
+# Price fields, taken from the last candle
+FIELDS = {"open": 1, "high": 2, "low": 3, "close": 4, "volume": 5}
+
+
+def _change(candles, period=1):
+    """Percent change of the close over `period` candles"""
+    close = candles[:, 4]
+    if close.shape[-1] <= period:
+        return np.full(close.shape[0], np.nan)
+    return (close[:, -1] / close[:, -1 - period] - 1) * 100
+
+
+def _window(candles, row, period, reduce):
+    if candles.shape[-1] < period:
+        return np.full(candles.shape[0], np.nan)
+    return reduce(candles[:, row, -period:], axis=-1)
+
+
+# Filter functions: (arity range, candles needed for the given args, implementation on a (symbols, 6, candles) block)
+FUNCTIONS = {
+    "sma": ((1, 1), lambda n: n, lambda c, n: indicators.sma(c[:, 4], n)[:, -1]),
+    "ema": ((1, 1), lambda n: 3 * n, lambda c, n: indicators.ema(c[:, 4], n)[:, -1]),
+    "rsi": ((0, 1), lambda n=14: 3 * n + 1, lambda c, n=14: indicators.rsi(c[:, 4], n)[:, -1]),
+    "atr": ((0, 1), lambda n=14: 3 * n, lambda c, n=14: indicators.atr(c[:, 2], c[:, 3], c[:, 4], n)[:, -1]),
+    "macd": ((0, 3), lambda f=12, s=26, g=9: 3 * s + g,
+             lambda c, f=12, s=26, g=9: indicators.macd(c[:, 4], f, s, g)[0][:, -1]),
+    "macd_signal": ((0, 3), lambda f=12, s=26, g=9: 3 * s + g,
+                    lambda c, f=12, s=26, g=9: indicators.macd(c[:, 4], f, s, g)[1][:, -1]),
+    "macd_hist": ((0, 3), lambda f=12, s=26, g=9: 3 * s + g,
+                  lambda c, f=12, s=26, g=9: indicators.macd(c[:, 4], f, s, g)[2][:, -1]),
+    "bb_upper": ((0, 2), lambda n=20, w=2: n, lambda c, n=20, w=2: indicators.bollinger(c[:, 4], n, w)[0][:, -1]),
+    "bb_lower": ((0, 2), lambda n=20, w=2: n, lambda c, n=20, w=2: indicators.bollinger(c[:, 4], n, w)[2][:, -1]),
+    "highest": ((1, 1), lambda n: n, lambda c, n: _window(c, 2, n, np.max)),
+    "lowest": ((1, 1), lambda n: n, lambda c, n: _window(c, 3, n, np.min)),
+    "avg_volume": ((0, 1), lambda n=20: n, lambda c, n=20: _window(c, 5, n, np.mean)),
+    "change": ((0, 1), lambda n=1: n + 1, _change),
+}
+
+# Functions built on exponential smoothing, which needs a period of at least 2
+SMOOTHED = {"ema", "rsi", "atr", "macd", "macd_signal", "macd_hist"}
+
+_COMPARISONS = {
+    ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+    ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal
+}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+class FilterError(ValueError):
+    """A screener filter expression that can't be parsed or uses something not allowed"""
+
+
+class Filter:
+    """A parsed filter such as "rsi(14) < 30 and close > sma(200)"
+
+    Expressions may use the price fields, the functions in FUNCTIONS with
+    numeric arguments, numbers, arithmetic, comparisons, and/or/not. They
+    are evaluated on a whole block of symbols at once; a comparison
+    involving a value without enough history is false.
+    """
+
+    def __init__(self, text):
+        if not text or len(text) > MAX_FILTER_LENGTH:
+            raise FilterError(f"Filter must be between 1 and {MAX_FILTER_LENGTH} characters")
+        try:
+            self.tree = ast.parse(text.strip(), mode='eval').body
+        except SyntaxError as e:
+            raise FilterError(f"Invalid filter: {e.msg}")
+        if not self._is_condition(self.tree):
+            raise FilterError("Filter must be a condition, e.g. rsi(14) < 30")
+        self.text = text
+        self.lookback = 2
+        self._check(self.tree)
+
+    def _is_condition(self, node):
+        if isinstance(node, ast.BoolOp):
+            return all(self._is_condition(value) for value in node.values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return self._is_condition(node.operand)
+        return isinstance(node, ast.Compare)
+
+    def _check(self, node):
+        if isinstance(node, ast.BoolOp) or isinstance(node, ast.Compare):
+            for child in (node.values if isinstance(node, ast.BoolOp) else [node.left, *node.comparators]):
+                self._check(child)
+            if isinstance(node, ast.Compare) and any(type(op) not in _COMPARISONS for op in node.ops):
+                raise FilterError("Only <, <=, >, >=, == and != comparisons are allowed")
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            self._check(node.operand)
+        elif isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            self._check(node.left)
+            self._check(node.right)
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            pass
+        elif isinstance(node, ast.Name):
+            if node.id not in FIELDS:
+                raise FilterError(f"Unknown field '{node.id}', expected one of {', '.join(FIELDS)}")
+        elif isinstance(node, ast.Call):
+            self._check_call(node)
+        else:
+            raise FilterError(f"Unsupported expression: {ast.unparse(node)}")
+
+    def _check_call(self, node):
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name not in FUNCTIONS:
+            raise FilterError(f"Unknown function '{ast.unparse(node.func)}', expected one of {', '.join(FUNCTIONS)}")
+        (least, most), needed, _ = FUNCTIONS[name]
+        args = [arg.value for arg in node.args if isinstance(arg, ast.Constant)
+                and isinstance(arg.value, (int, float)) and not isinstance(arg.value, bool)]
+        if node.keywords or len(args) != len(node.args) or not least <= len(args) <= most:
+            raise FilterError(f"{name} takes {least} to {most} numeric arguments")
+        periods = args[:1] if name.startswith("bb_") else args
+        shortest = indicators.MIN_PERIOD if name in SMOOTHED or name.startswith("bb_") else 1
+        if any(not isinstance(period, int) or not shortest <= period <= indicators.MAX_PERIOD for period in periods):
+            raise FilterError(f"{name} periods must be whole numbers from {shortest} to {indicators.MAX_PERIOD}")
+        self.lookback = max(self.lookback, needed(*args))
+
+    def evaluate(self, candles):
+        """Match mask and term values for a (symbols, 6, candles) block"""
+        values = {}
+
+        def run(node):
+            if isinstance(node, ast.BoolOp):
+                combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+                result = run(node.values[0])
+                for child in node.values[1:]:
+                    result = combine(result, run(child))
+                return result
+            if isinstance(node, ast.Compare):
+                result, left = True, run(node.left)
+                for op, comparator in zip(node.ops, node.comparators):
+                    right = run(comparator)
+                    result = np.logical_and(result, _COMPARISONS[type(op)](left, right))
+                    left = right
+                return result
+            if isinstance(node, ast.UnaryOp):
+                operand = run(node.operand)
+                return np.logical_not(operand) if isinstance(node.op, ast.Not) else -operand
+            if isinstance(node, ast.BinOp):
+                return _ARITHMETIC[type(node.op)](run(node.left), run(node.right))
+            if isinstance(node, ast.Constant):
+                return float(node.value)
+            key = ast.unparse(node)
+            if key not in values:
+                if isinstance(node, ast.Name):
+                    values[key] = candles[:, FIELDS[node.id], -1]
+                else:
+                    values[key] = FUNCTIONS[node.func.id][2](candles, *[arg.value for arg in node.args])
+            return values[key]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matched = np.broadcast_to(run(self.tree), (candles.shape[0],))
+        return np.asarray(matched, dtype=bool), values
+
+
+@lru_cache(maxsize=64)
+def compile_filter(text):
+    return Filter(text)
+
+
+def screen_chunk(text, tokens, candles):
+    """Evaluate a filter over one chunk of symbols; runs in a worker process
+
+    `candles` holds one (6, n) array per token. Symbols with the same
+    number of candles are stacked and evaluated together.
+    """
+    screen_filter = compile_filter(text)
+    by_length = {}
+    for i, array in enumerate(candles):
+        by_length.setdefault(array.shape[1], []).append(i)
+
+    matches = []
+    for rows in by_length.values():
+        matched, values = screen_filter.evaluate(np.stack([candles[i] for i in rows]))
+        for position in np.flatnonzero(matched).tolist():
+            matches.append({
+                "token": tokens[rows[position]],
+                "values": {
+                    key: None if math.isnan(value) else round(value, 4)
+                    for key, value in ((key, float(series[position])) for key, series in values.items())
+                }
+            })
+    return matches
+
+
+def universe_names():
+    try:
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(SCREENER_UNIVERSE_DIR)
+                      if name.endswith(('.csv', '.json')))
+    except OSError:
+        return []
+
+
+def load_universe(name):
+    """Symbols of a named universe, or None if there is no such file"""
+    for extension in ('.csv', '.json'):
+        path = os.path.join(SCREENER_UNIVERSE_DIR, os.path.basename(name) + extension)
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='') as f:
+            if extension == '.json':
+                return [str(symbol) for symbol in json.load(f)]
+            return [row['Symbol'].strip() for row in csv.DictReader(f) if row.get('Symbol')]
+    return None
+
+
+def resolve_universe(entries, exchange="NSE"):
+    """Map symbols or tokens to (token, symbol) pairs; returns (instruments, unresolved entries)"""
+    instruments, unresolved, seen = [], [], set()
+    for entry in entries:
+        entry = str(entry).strip()
+        if entry.isdigit():
+            instrument = instrument_master.resolve_token(entry, exchange)
+            token, symbol = entry, instrument['symbol'] if instrument else entry
+        else:
+            instrument = instrument_master.resolve_symbol(entry, exchange)
+            if not instrument:
+                unresolved.append(entry)
+                continue
+            token, symbol = instrument['token'], instrument['symbol']
+        if token not in seen:
+            seen.add(token)
+            instruments.append((token, symbol))
+    return instruments, unresolved
+
+
+def lookback_dates(candles_needed, interval):
+    """Broker from/to dates covering `candles_needed` settled candles, with room for weekends and holidays"""
+    per_day = max(1, SESSION_SECONDS // INTERVAL_SECONDS[interval]) if interval != "ONE_DAY" else 1
+    days = math.ceil(candles_needed / per_day * 7 / 5 * 1.1) + 7
+    end = settled_until(interval)
+    end -= end % RANGE_STEP.get(interval, min(INTERVAL_SECONDS[interval], MAX_INTRADAY_STEP))
+    return format_broker_date(end - days * 86400), format_broker_date(end)
+
+
+def live_candle(quote):
+    """Today's forming daily candle from a FULL quote: the day's open/high/low/volume and the last price
+
+    Stamped at 00:00 IST like the broker's daily candles. A quote only
+    describes the whole day, so there is no intraday equivalent.
+    """
+    ltp = quote.get('ltp')
+    if ltp is None:
+        return None
+    today = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    row = [today, quote.get('open') or ltp, quote.get('high') or ltp, quote.get('low') or ltp, ltp,
+           quote.get('volume') or 0.0]
+    return np.array(row, dtype=np.float64)[:, None]
+
+
+class Screener:
+    """Scans a universe for symbols matching a filter and yields matches as chunks finish
+
+    Quotes come from batched market data calls. Candles come through the
+    candle store up to the last settled candle, so a warm scan makes no
+    candle calls; while the market is open daily scans add today's candle
+    built from the quote, and intraday scans stop at the last settled
+    candle. Filters are evaluated on chunks of symbols in a process pool
+    while the next chunk's candles are still being fetched.
+    """
+
+    def __init__(self, workers=SCREENER_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.fetch_executor = ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY, thread_name_prefix='screener')
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None and self.workers > 0:
+                # Workers fork from a single-threaded server rather than from this multi-threaded process, where
+                # another thread could be holding a lock the child inherits. The server imports the main module
+                # (app.py skips its start-up when imported as __mp_main__) and this one once, up front.
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['__main__', __name__])
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def _submit(self, text, tokens, candles):
+        pool = self._get_pool()
+        if pool is not None:
+            try:
+                return pool.submit(screen_chunk, text, tokens, candles)
+            except (BrokenProcessPool, RuntimeError, OSError) as e:
+                logger.error(f"Screener process pool unavailable, evaluating in-process: {str(e)}")
+                with self._lock:
+                    self._pool, self.workers = None, 0
+        # In the request thread, so evaluation doesn't queue behind the candle fetches
+        future = Future()
+        try:
+            future.set_result(screen_chunk(text, tokens, candles))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _fetch(self, angel_one, token, from_date, to_date, interval, exchange):
+        with lane('background'):
+            return angel_one.get_candles(token, from_date, to_date, interval, exchange)
+
+    def scan(self, angel_one, screen_filter, instruments, interval="ONE_DAY", exchange="NSE"):
+        """Yield ("matches", [...]) per chunk with matches, then ("done", summary)"""
+        started = time.perf_counter()
+        symbols = dict(instruments)
+        from_date, to_date = lookback_dates(screen_filter.lookback, interval)
+        add_live = interval == "ONE_DAY" and is_market_open()
+        quotes = angel_one.get_live_prices([token for token, _ in instruments], exchange,
+                                           mode="FULL" if add_live else "OHLC") or {}
+
+        fetches = {
+            self.fetch_executor.submit(self._fetch, angel_one, token, from_date, to_date, interval, exchange): token
+            for token, _ in instruments
+        }
+        chunk_tokens, chunk_candles, evaluations = [], [], set()
+        errors, matched = [], 0
+
+        def finished(block):
+            nonlocal matched
+            done = {future for future in evaluations if future.done()} if not block else set(evaluations)
+            for future in done:
+                evaluations.discard(future)
+                try:
+                    matches = future.result()
+                except Exception as e:
+                    logger.error(f"Screener chunk failed: {str(e)}")
+                    continue
+                for match in matches:
+                    quote = quotes.get(match['token'], {})
+                    match.update(symbol=symbols.get(match['token']), exchange=exchange, ltp=quote.get('ltp'))
+                matched += len(matches)
+                if matches:
+                    yield "matches", matches
+
+        try:
+            pending = set(fetches)
+            while pending:
+                done, pending = wait(pending, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in done:
+                    token = fetches[future]
+                    candles = future.result() if future.exception() is None else None
+                    if candles is None or not candles.shape[1]:
+                        errors.append(token)
+                        continue
+                    if add_live and token in quotes:
+                        live = live_candle(quotes[token])
+                        if live is not None:
+                            candles = merge_candles(candles, live)
+                    chunk_tokens.append(token)
+                    chunk_candles.append(candles)
+                    if len(chunk_tokens) == CHUNK_SIZE:
+                        evaluations.add(self._submit(screen_filter.text, chunk_tokens, chunk_candles))
+                        chunk_tokens, chunk_candles = [], []
+                yield from finished(block=False)
+
+            if chunk_tokens:
+                evaluations.add(self._submit(screen_filter.text, chunk_tokens, chunk_candles))
+            wait(evaluations)
+            yield from finished(block=True)
+
+            yield "done", {
+                "scanned": len(instruments) - len(errors),
+                "matched": matched,
+                "failed": errors,
+                "elapsed": round(time.perf_counter() - started, 3)
+            }
+        finally:
+            # Stops queued candle fetches and chunk evaluations once the stream is closed early
+            for future in list(fetches) + list(evaluations):
+                future.cancel()
+
+
+# Create a singleton instance
+screener = Screener()
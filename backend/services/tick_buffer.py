@@ -0,0 +1,205 @@
+import threading
+import time
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Most recent ticks kept per token
+TICK_CAPACITY = 4096
+
+# Candle intervals built live from ticks, and completed candles kept per interval
+LIVE_INTERVALS = {
+    "ONE_MINUTE": 60,
+    "FIVE_MINUTE": 300,
+    "FIFTEEN_MINUTE": 900
+}
+CANDLE_CAPACITY = 512
+
+# Symbols nobody watches are dropped after this many idle seconds
+IDLE_EVICT_AFTER = 300
+
+# Upper bound on memory used by all buffers together
+MAX_TICK_MEMORY = 64 * 1024 * 1024
+
+
+class TickRingBuffer:
+    """Preallocated ring of (timestamp, price, cumulative volume) ticks"""
+
+    def __init__(self, capacity=TICK_CAPACITY):
+        self.capacity = capacity
+        self.data = np.zeros((3, capacity), dtype=np.float64)
+        self.count = 0
+
+    def append(self, timestamp, price, volume):
+        self.data[:, self.count % self.capacity] = (timestamp, price, volume)
+        self.count += 1
+
+    def last(self, n=None):
+        """Return up to n most recent ticks as a (3, n) array, oldest first"""
+        size = min(self.count, self.capacity)
+        n = size if n is None else min(n, size)
+        end = self.count % self.capacity
+        indices = (np.arange(end - n, end)) % self.capacity
+        return self.data[:, indices]
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class CandleBuilder:
+    """Builds candles for one interval incrementally, one tick at a time
+
+    Candles use the same columnar layout as the candle store. The first
+    bucket is discarded since ticks may have started part-way through it.
+    """
+
+    def __init__(self, seconds, capacity=CANDLE_CAPACITY):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.completed = np.zeros((6, capacity), dtype=np.float64)
+        self.count = 0
+        self.current = None
+        self.first_bucket = None
+
+    def update(self, timestamp, price, volume_delta):
+        # IST is UTC+5:30, a whole number of 15-minute buckets, so UTC alignment matches
+        bucket = timestamp - timestamp % self.seconds
+        if self.current is None or bucket > self.current[0]:
+            if self.current is not None and self.current[0] != self.first_bucket:
+                self.completed[:, self.count % self.capacity] = self.current
+                self.count += 1
+            if self.first_bucket is None:
+                self.first_bucket = bucket
+            self.current = np.array([bucket, price, price, price, price, 0.0])
+        elif bucket < self.current[0]:
+            return
+        current = self.current
+        current[2] = max(current[2], price)
+        current[3] = min(current[3], price)
+        current[4] = price
+        current[5] += volume_delta
+
+    def _completed(self):
+        size = min(self.count, self.capacity)
+        end = self.count % self.capacity
+        return self.completed[:, (np.arange(end - size, end)) % self.capacity]
+
+    def covered_from(self):
+        """Earliest candle timestamp from which every candle is fully built, or None"""
+        if self.count:
+            return float(self._completed()[0, 0])
+        if self.current is not None and self.current[0] != self.first_bucket:
+            return float(self.current[0])
+        return None
+
+    def candles(self, start, end):
+        """Completed candles plus the live partial one with start <= timestamp <= end"""
+        candles = self._completed()
+        if self.current is not None and self.current[0] != self.first_bucket:
+            candles = np.concatenate([candles, self.current[:, None]], axis=1)
+        return candles[:, (candles[0] >= start) & (candles[0] <= end)]
+
+    @property
+    def nbytes(self):
+        return self.completed.nbytes
+
+
+class SymbolTicks:
+    """Tick buffer and live candle builders for one symbol"""
+
+    def __init__(self):
+        self.ticks = TickRingBuffer()
+        self.builders = {interval: CandleBuilder(seconds) for interval, seconds in LIVE_INTERVALS.items()}
+        self.last_volume = None
+        self.last_update = time.time()
+
+    def add(self, timestamp, price, volume):
+        volume = volume or 0.0
+        # Ticks carry cumulative day volume; candles need the traded amount
+        delta = max(0.0, volume - self.last_volume) if self.last_volume is not None else 0.0
+        self.last_volume = volume
+        self.last_update = time.time()
+        self.ticks.append(timestamp, price, volume)
+        for builder in self.builders.values():
+            builder.update(timestamp, price, delta)
+
+    @property
+    def nbytes(self):
+        return self.ticks.nbytes + sum(builder.nbytes for builder in self.builders.values())
+
+
+class TickStore:
+    """Per-symbol tick buffers with memory accounting and idle eviction"""
+
+    def __init__(self, max_bytes=MAX_TICK_MEMORY):
+        self.max_bytes = max_bytes
+        self._symbols = {}
+        self._lock = threading.Lock()
+
+    def add(self, tick):
+        """Record a normalised tick from the market feed"""
+        key = (tick['exchange'], tick['token'])
+        with self._lock:
+            symbol = self._symbols.get(key)
+            if symbol is None:
+                symbol = self._symbols[key] = SymbolTicks()
+            symbol.add(tick['timestamp'], tick['ltp'], tick.get('volume'))
+
+    def covered_from(self, exchange, token, interval):
+        """Earliest timestamp from which live candles for the symbol are complete, or None"""
+        with self._lock:
+            symbol = self._symbols.get((exchange, str(token)))
+            if not symbol or interval not in symbol.builders:
+                return None
+            return symbol.builders[interval].covered_from()
+
+    def candles(self, exchange, token, interval, start, end):
+        """Live candles for [start, end] as a columnar array
+
+        Returns None when they no longer cover `start`, e.g. the symbol was
+        evicted (and maybe re-created) after covered_from() was checked.
+        """
+        with self._lock:
+            symbol = self._symbols.get((exchange, str(token)))
+            builder = symbol.builders.get(interval) if symbol else None
+            covered = builder.covered_from() if builder else None
+            if covered is None or covered > start:
+                return None
+            return builder.candles(start, end)
+
+    def recent_ticks(self, exchange, token, n=None):
+        """Most recent ticks as a (3, n) array of timestamp, price, cumulative volume"""
+        with self._lock:
+            symbol = self._symbols.get((exchange, str(token)))
+            return symbol.ticks.last(n) if symbol else None
+
+    def memory_usage(self):
+        """Bytes held per symbol and in total"""
+        with self._lock:
+            per_symbol = {f"{exchange}:{token}": symbol.nbytes
+                          for (exchange, token), symbol in self._symbols.items()}
+        return {"symbols": per_symbol, "total": sum(per_symbol.values())}
+
+    def evict(self, is_watched):
+        """Drop idle symbols nobody watches, then the stalest unwatched ones until under max_bytes"""
+        now = time.time()
+        with self._lock:
+            unwatched = sorted(
+                (key for key in self._symbols if not is_watched(*key)),
+                key=lambda k: self._symbols[k].last_update
+            )
+            total = sum(symbol.nbytes for symbol in self._symbols.values())
+            for key in unwatched:
+                symbol = self._symbols[key]
+                if now - symbol.last_update < IDLE_EVICT_AFTER and total <= self.max_bytes:
+                    continue
+                total -= symbol.nbytes
+                del self._symbols[key]
+                logger.info(f"Evicted tick buffers for {key[0]}:{key[1]}")
+
+
+# Create a singleton instance
+tick_store = TickStore()
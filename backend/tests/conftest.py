@@ -0,0 +1,32 @@
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Add backend directory to path
+
+from scripts import fakes
+
+# Keep every on-disk cache and the scrip master download in a scratch directory; set before services are imported
+SCRATCH = tempfile.mkdtemp(prefix='backend-tests-')
+os.environ.setdefault('CANDLE_STORE_DIR', os.path.join(SCRATCH, 'candles'))
+os.environ.setdefault('INSTRUMENT_INDEX_DIR', os.path.join(SCRATCH, 'instruments'))
+os.environ.setdefault('MODEL_CACHE_PATH', os.path.join(SCRATCH, 'gemini_models.json'))
+os.environ.setdefault('LOG_DIR', os.path.join(SCRATCH, 'logs'))
+os.environ.setdefault('LOG_CONSOLE', '0')
+if 'INSTRUMENT_MASTER_URL' not in os.environ:
+    with open(os.path.join(SCRATCH, 'scrip_master.json'), 'w') as f:
+        json.dump(fakes.fake_scrip_master(equities=200, derivatives_per_equity=2), f)
+    os.environ['INSTRUMENT_MASTER_URL'] = os.path.join(SCRATCH, 'scrip_master.json')
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    """A logged-in AngelOneService talking to FakeSmartConnect"""
+    import services.angel_one as angel_one
+    monkeypatch.setattr(angel_one, 'SmartConnect', fakes.FakeSmartConnect)
+    service = angel_one.session_registry.login("FAKE01", "1234", "JBSWY3DPEHPK3PXP")
+    yield service
+    angel_one.session_registry.logout("FAKE01")
@@ -0,0 +1,28 @@
+import threading
+
+from services.cache import TTLCache
+
+
+def test_load_started_before_invalidate_is_not_cached():
+    cache = TTLCache()
+    loading, release = threading.Event(), threading.Event()
+    results = []
+
+    def stale_loader():
+        loading.set()
+        release.wait(5)
+        return "stale"
+
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_load(("holdings", "C1"), stale_loader, 60)))
+    leader.start()
+    assert loading.wait(5)
+
+    cache.invalidate(("holdings", "C1"))
+    # A caller after the invalidation starts its own load instead of joining the stale one
+    assert cache.get_or_load(("holdings", "C1"), lambda: "fresh", 60) == "fresh"
+
+    release.set()
+    leader.join(5)
+
+    assert results == ["stale"]
+    assert cache.get(("holdings", "C1")) == "fresh"
@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+import pytest
+
+import services.charges as charges
+from services.charges import FeeSchedules, calculate_charges
+
+RATES = {
+    "brokerage_rate": 0, "brokerage_cap": 0, "brokerage_flat": 20, "stt_buy": 0, "stt_sell": 0.001,
+    "exchange": 0.0001, "sebi": 0.000001, "gst": 0.18, "stamp_buy": 0.00002
+}
+
+
+@pytest.fixture
+def schedules(tmp_path, monkeypatch):
+    path = tmp_path / "fee_schedules.json"
+    path.write_text(json.dumps({"versions": [
+        {"version": "v1", "effective_from": "2025-03-01", "segments": {"f&o": RATES}},
+        {"version": "v2", "effective_from": "2025-06-01", "segments": {"f&o": RATES, "commodity": RATES}}
+    ]}))
+    monkeypatch.setattr(charges, 'fee_schedules', FeeSchedules(str(path)))
+
+
+def test_trades_before_the_earliest_schedule_use_it_and_are_flagged(schedules):
+    result = calculate_charges("f&o", "SELL", [1, 1], [100, 100], trade_date=["2024-01-15", "2025-04-01"])
+
+    assert result["schedule_version"].tolist() == ["v1", "v1"]
+    assert result["backdated"].tolist() == [True, False]
+    assert np.isfinite(result["total"]).all()
+
+
+def test_segment_missing_from_the_version_in_force_is_an_error(schedules):
+    assert calculate_charges("commodity", "BUY", 1, 100, trade_date="2025-07-01")["schedule_version"][0] == "v2"
+
+    with pytest.raises(ValueError, match="commodity in fee schedule v1"):
+        calculate_charges("commodity", "BUY", 1, 100, trade_date="2025-04-01")
@@ -0,0 +1,33 @@
+import pytest
+
+from services.intent_router import classify, intent_router
+
+HELD = ["RELIANCE", "TCS", "M&M"]
+
+
+@pytest.mark.parametrize("message, expected", [
+    ("What's my portfolio worth?", ("portfolio_value", None)),
+    ("what is reliance worth", ("holding_value", "RELIANCE")),
+    ("how much is my M&M worth", ("holding_value", "M&M")),
+    ("total profit on TCS", ("holding_pnl", "TCS")),
+    ("What's my P&L today?", ("pnl_today", None)),
+])
+def test_lookups_about_holdings_are_local(message, expected):
+    assert classify(message, HELD) == expected
+
+
+@pytest.mark.parametrize("message", [
+    "what is INFY trading at",
+    "whats relance worth",
+    "what is the price of tata motors",
+    "should I sell TCS",
+])
+def test_questions_naming_anything_else_go_to_the_model(message):
+    assert classify(message, HELD) == (None, None)
+
+
+def test_route_answers_from_holdings(broker):
+    routed = intent_router.route("what is SYM1001 worth", broker)
+    assert routed["intent"] == "holding_value" and "SYM1001" in routed["response"]
+
+    assert intent_router.route("what is SYM9999 worth", broker) is None
@@ -0,0 +1,49 @@
+import threading
+
+import SmartApi.smartWebSocketV2 as smart_websocket
+
+import services.market_feed as market_feed
+from routes.stream import parse_subscription
+from services.market_feed import AngelOneFeed
+
+
+class DroppingSocket:
+    """Connects and immediately drops, recording the credentials it was given"""
+
+    connections = []
+
+    def __init__(self, auth_token, api_key, client_code, feed_token, max_retry_attempt=None):
+        self.connections.append(auth_token)
+        self.wsapp = None
+
+    def connect(self):
+        pass
+
+    def close_connection(self):
+        pass
+
+
+def test_reconnects_use_fresh_credentials(monkeypatch):
+    monkeypatch.setattr(smart_websocket, 'SmartWebSocketV2', DroppingSocket)
+    monkeypatch.setattr(market_feed, 'RECONNECT_DELAY', 0.01)
+    DroppingSocket.connections = []
+    issued, reconnected = iter(["jwt-1", None, "jwt-2", "jwt-3"]), threading.Event()
+
+    def credentials():
+        token = next(issued, None)
+        if len(DroppingSocket.connections) >= 3:
+            reconnected.set()
+        return token and {"auth_token": token, "api_key": "k", "client_code": "C1", "feed_token": "f"}
+
+    feed = AngelOneFeed(credentials, on_tick=lambda tick: None, on_connect=lambda: None)
+    feed.start()
+    assert reconnected.wait(5)
+    feed.stop()
+
+    # No session at the second attempt, so it waited instead of reusing the first token
+    assert DroppingSocket.connections[:3] == ["jwt-1", "jwt-2", "jwt-3"]
+
+
+def test_unknown_exchange_is_rejected():
+    assert parse_subscription({"exchange": "NASDAQ", "tokens": [1]}) == (None, None, "Unknown exchange: NASDAQ")
+    assert parse_subscription({"exchange": "BSE", "tokens": [500325]}) == ("BSE", ["500325"], None)
@@ -0,0 +1,57 @@
+import time
+
+import services.candle_store as candle_store_module
+from routes import stocks
+
+
+def make_holdings(tokens):
+    return [
+        {"tradingsymbol": f"SYM{token}-EQ", "exchange": "NSE", "symboltoken": str(token),
+         "quantity": 10, "averageprice": 100, "ltp": 110}
+        for token in tokens
+    ]
+
+
+def wait_for_fills(timeout=20):
+    deadline = time.monotonic() + timeout
+    while stocks._chart_fills and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not stocks._chart_fills
+
+
+def test_chart_is_served_from_stored_candles_while_market_is_open(broker, monkeypatch):
+    monkeypatch.setattr(candle_store_module, 'is_market_open', lambda now=None: True)
+    holdings = make_holdings(range(5001, 5013))
+    broker.market_api.calls.clear()
+
+    points, pending = stocks.portfolio_chart(broker, holdings)
+    assert (points, pending) == ([], 12)
+    wait_for_fills()
+    assert broker.market_api.calls['getCandleData'] == 12
+
+    # Once stored, polls make no broker calls at all
+    broker.market_api.calls.clear()
+    for _ in range(3):
+        points, pending = stocks.portfolio_chart(broker, holdings)
+        assert pending == 0 and points
+    assert broker.market_api.calls['getCandleData'] == 0
+
+
+def test_chart_fills_are_not_duplicated(broker, monkeypatch):
+    holdings = make_holdings(range(5101, 5106))
+    release = []
+    original = broker.get_candles
+
+    def slow_get_candles(*args):
+        while not release:
+            time.sleep(0.01)
+        return original(*args)
+
+    monkeypatch.setattr(broker, 'get_candles', slow_get_candles)
+    broker.market_api.calls.clear()
+    for _ in range(3):
+        assert stocks.portfolio_chart(broker, holdings) == ([], 5)
+    release.append(True)
+    wait_for_fills()
+
+    assert broker.market_api.calls['getCandleData'] == 5
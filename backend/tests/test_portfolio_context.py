@@ -0,0 +1,28 @@
+from services.llm_cache import LLMResponseCache
+from services.portfolio_context import PortfolioContextBuilder
+
+
+def holdings(ltp):
+    return [
+        {"tradingsymbol": "TCS-EQ", "quantity": 5, "averageprice": 3500, "ltp": ltp},
+        {"tradingsymbol": "INFY-EQ", "quantity": 10, "averageprice": 1500, "ltp": 1600}
+    ]
+
+
+def test_cache_key_survives_price_refreshes():
+    builder = PortfolioContextBuilder()
+    before = builder.get("client:A", holdings(3600))
+    builder._contexts.clear()
+    after = builder.get("client:A", holdings(3700))
+
+    assert before.text != after.text
+    assert (LLMResponseCache.key("how am I doing", {"holdings": before.version, "history": ""}, "m")
+            == LLMResponseCache.key("how am I doing", {"holdings": after.version, "history": ""}, "m"))
+
+
+def test_cache_key_changes_with_holdings():
+    changed = holdings(3600)
+    changed[0]["quantity"] = 6
+    builder = PortfolioContextBuilder()
+
+    assert builder.get("client:A", holdings(3600)).version != builder.get("client:B", changed).version
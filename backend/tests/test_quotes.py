@@ -0,0 +1,30 @@
+from scripts.fakes import FakeSmartConnect
+from services.angel_one import MARKET_DATA_BATCH_SIZE
+
+
+def test_quotes_are_fetched_in_batches(broker):
+    tokens = [str(1000 + i) for i in range(2 * MARKET_DATA_BATCH_SIZE + 1)]
+    broker.market_api.calls.clear()
+
+    quotes = broker.get_live_prices(tokens)
+
+    assert set(quotes) == set(tokens)
+    assert broker.market_api.calls['getMarketData'] == 3
+    assert broker.market_api.calls['ltpData'] == 0
+
+
+def test_quotes_are_grouped_per_exchange_and_deduplicated(broker):
+    broker.market_api.calls.clear()
+
+    quotes = broker.get_live_prices(["1001", "1001", {"exchange": "BSE", "token": "501001"}, {"token": "1002"}])
+
+    assert set(quotes) == {"1001", "1002", "501001"}
+    assert quotes["501001"]["exchange"] == "BSE"
+    assert broker.market_api.calls['getMarketData'] == 2
+
+
+def test_failed_batch_is_left_out(broker, monkeypatch):
+    monkeypatch.setattr(FakeSmartConnect, 'getMarketData',
+                        lambda self, mode, exchange_tokens: {"status": False, "message": "Rate limited"})
+
+    assert broker.get_live_prices(["1001", "1002"]) == {}
@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+import services.rate_governor as governor_module
+from services.rate_governor import RateGovernor, RateLimited
+
+
+def test_interactive_calls_are_served_before_queued_background_calls():
+    governor = RateGovernor({"getCandleData": 2})
+    governor.acquire("getCandleData")
+    governor.acquire("getCandleData")
+    served = []
+
+    def call(lane_name):
+        governor.acquire("getCandleData", lane_name)
+        served.append(lane_name)
+
+    background = threading.Thread(target=call, args=("background",))
+    background.start()
+    time.sleep(0.1)
+    interactive = threading.Thread(target=call, args=("interactive",))
+    interactive.start()
+    background.join(5)
+    interactive.join(5)
+
+    # The background call queued first, but the interactive one jumped ahead of it
+    assert served == ["interactive", "background"]
+
+
+def test_background_calls_are_shed_under_pressure(monkeypatch):
+    monkeypatch.setattr(governor_module, 'BACKGROUND_MAX_WAIT', 0.1)
+    governor = RateGovernor({"holding": 1})
+    governor.acquire("holding")
+
+    with pytest.raises(RateLimited):
+        governor.acquire("holding", "background")
+    with pytest.raises(RateLimited):
+        governor.acquire("holding", "interactive", timeout=0.1)
+
+    lanes = governor.stats()["holding"]["lanes"]
+    assert lanes["background"]["shed"] == 1
+    assert lanes["interactive"]["rejected"] == 1
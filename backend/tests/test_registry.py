@@ -0,0 +1,36 @@
+import threading
+
+import services.registry as registry
+from services.registry import ServiceRegistry
+
+
+def test_required_service_becomes_ready_after_a_failed_first_warmup(monkeypatch):
+    monkeypatch.setattr(registry, 'RETRY_INTERVAL', 0.01)
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("upstream down")
+        return object()
+
+    services = ServiceRegistry()
+    services.register("model", factory)
+    warmup = threading.Thread(target=services.warm_up, daemon=True)
+    warmup.start()
+    warmup.join(5)
+
+    assert not warmup.is_alive()
+    assert services.readiness()["ready"]
+    assert len(attempts) == 3
+
+
+def test_optional_service_is_not_retried(monkeypatch):
+    monkeypatch.setattr(registry, 'RETRY_INTERVAL', 0.01)
+    services = ServiceRegistry()
+    services.register("payments", lambda: 1 / 0, required=False)
+
+    services.warm_up()
+
+    readiness = services.readiness()
+    assert readiness["ready"] and readiness["services"]["payments"]["status"] == "error"
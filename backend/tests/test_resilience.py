@@ -0,0 +1,74 @@
+import time
+
+import pytest
+
+import services.resilience as resilience
+from scripts.fakes import FakeSmartConnect, FakeUpstreamError, broker_faults
+from services.resilience import BrokerResilience, CircuitOpen, ResilientClient
+
+TOKENS = {"NSE": ["1001"]}
+
+
+@pytest.fixture(autouse=True)
+def healthy_broker(monkeypatch):
+    monkeypatch.setattr(resilience, 'RETRY_BASE_DELAY', 0)
+    yield
+    broker_faults.configure(error_rate=0)
+
+
+def client(policy):
+    return ResilientClient(FakeSmartConnect(), "C1", policy)
+
+
+def test_circuit_opens_after_failures_and_closes_after_a_good_probe(monkeypatch):
+    monkeypatch.setattr(resilience, 'RETRY_ATTEMPTS', 1)
+    policy = BrokerResilience()
+    breaker = policy.breakers['getMarketData']
+    breaker.threshold, breaker.reset_timeout = 2, 0.2
+    broker = client(policy)
+
+    broker_faults.configure(error_rate=1)
+    for _ in range(2):
+        with pytest.raises(FakeUpstreamError):
+            broker.getMarketData("OHLC", TOKENS)
+    assert breaker.state == "open"
+
+    # Open: rejected without reaching the broker
+    with pytest.raises(CircuitOpen):
+        broker.getMarketData("OHLC", TOKENS)
+    assert broker._client.calls['getMarketData'] == 2
+
+    broker_faults.configure(error_rate=0)
+    time.sleep(0.25)
+    assert breaker.state == "half_open"
+    assert broker.getMarketData("OHLC", TOKENS)["status"]
+    assert breaker.state == "closed"
+
+
+def test_last_good_response_is_served_while_the_broker_fails():
+    policy = BrokerResilience()
+    broker = client(policy)
+    fresh = broker.getMarketData("OHLC", TOKENS)
+
+    broker_faults.configure(error_rate=1)
+    stale = broker.getMarketData("OHLC", TOKENS)
+
+    assert stale["stale"] and stale["data"] == fresh["data"]
+    assert policy.stats()["calls"]["getMarketData"]["stale_served"] == 1
+
+
+def test_retries_stop_when_the_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(resilience, 'RETRY_BUDGET_CAP', 2)
+    policy = BrokerResilience()
+    policy.breakers['getMarketData'].threshold = 1000
+    broker = client(policy)
+
+    broker_faults.configure(error_rate=1)
+    for _ in range(10):
+        with pytest.raises(FakeUpstreamError):
+            broker.getMarketData("OHLC", TOKENS)
+
+    # Without a budget every call would be tried RETRY_ATTEMPTS (3) times
+    retried = policy.stats()["calls"]["getMarketData"]["retried"]
+    assert 2 <= retried <= 4
+    assert broker._client.calls['getMarketData'] == 10 + retried
@@ -0,0 +1,61 @@
+import threading
+from datetime import datetime
+
+import services.screener as screener_module
+from scripts.fakes import FakeSmartConnect
+from services.candle_store import IST
+from services.screener import Screener, compile_filter
+
+
+def instruments(tokens):
+    return [(str(token), f"SYM{token}-EQ") for token in tokens]
+
+
+def test_daily_scan_adds_todays_candle_with_quote_volume(broker, monkeypatch):
+    monkeypatch.setattr(screener_module, 'is_market_open', lambda now=None: True)
+    seen = []
+    monkeypatch.setattr(screener_module, 'screen_chunk',
+                        lambda text, tokens, candles: seen.extend(zip(tokens, candles)) or [])
+
+    list(Screener(workers=0).scan(broker, compile_filter("close > 0"), instruments([6001])))
+
+    today = datetime.now(IST).replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    (token, candles), = seen
+    assert candles[0, -1] == today
+    assert candles[5, -1] == FakeSmartConnect("key")._quote("NSE", token, "FULL")["tradeVolume"]
+
+
+def test_intraday_scan_has_no_quote_candle(broker, monkeypatch):
+    monkeypatch.setattr(screener_module, 'is_market_open', lambda now=None: True)
+    seen = []
+    monkeypatch.setattr(screener_module, 'screen_chunk',
+                        lambda text, tokens, candles: seen.extend(candles) or [])
+
+    list(Screener(workers=0).scan(broker, compile_filter("close > 0"), instruments([6101]), interval="FIVE_MINUTE"))
+
+    # Every candle sits on the five minute grid from the session open, none stamped at quote time
+    assert seen and ((seen[0][0] - seen[0][0][0]) % 300 == 0).all()
+
+
+def test_closing_the_stream_cancels_pending_fetches(broker, monkeypatch):
+    monkeypatch.setattr(screener_module, 'CHUNK_SIZE', 1)
+    release, fetched = threading.Event(), []
+    original = broker.get_candles
+
+    def get_candles(token, *args):
+        fetched.append(token)
+        if token != "6201":
+            release.wait(5)
+        return original(token, *args)
+
+    monkeypatch.setattr(broker, 'get_candles', get_candles)
+    scanner = Screener(workers=0)
+    scan = scanner.scan(broker, compile_filter("close > 0"), instruments(range(6201, 6221)))
+
+    assert next(scan)[0] == "matches"
+    scan.close()
+    release.set()
+    scanner.fetch_executor.shutdown(wait=True)
+
+    # Only the first fetch and the ones already running when the stream closed were made
+    assert len(fetched) <= 1 + screener_module.FETCH_CONCURRENCY
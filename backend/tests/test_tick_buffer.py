@@ -0,0 +1,44 @@
+import time
+
+import services.angel_one as angel_one
+from services.candle_store import format_broker_date
+from services.tick_buffer import TickStore
+
+
+def fill(store, token, start, seconds):
+    for offset in range(0, seconds, 10):
+        store.add({"exchange": "NSE", "token": token, "timestamp": start + offset, "ltp": 100.0 + offset, "volume": offset})
+
+
+def test_candles_after_eviction_are_none():
+    store = TickStore(max_bytes=0)
+    start = 1_700_000_000 - 1_700_000_000 % 60
+    fill(store, "7001", start, 300)
+    covered = store.covered_from("NSE", "7001", "ONE_MINUTE")
+    assert store.candles("NSE", "7001", "ONE_MINUTE", covered, start + 300).shape[1]
+
+    store.evict(lambda exchange, token: False)
+    assert store.candles("NSE", "7001", "ONE_MINUTE", covered, start + 300) is None
+
+    # Re-created from later ticks, so it no longer reaches back to where coverage was promised
+    fill(store, "7001", start + 600, 300)
+    assert store.candles("NSE", "7001", "ONE_MINUTE", covered, start + 900) is None
+
+
+def test_history_falls_back_to_the_broker_when_ticks_are_evicted(broker, monkeypatch):
+    now = time.time()
+
+    class EvictedTicks:
+        def covered_from(self, exchange, token, interval):
+            return now - 600
+
+        def candles(self, exchange, token, interval, start, end):
+            return None
+
+    monkeypatch.setattr(angel_one, 'tick_store', EvictedTicks())
+    broker.market_api.calls.clear()
+
+    candles = broker.get_candles("7002", format_broker_date(now - 3600), format_broker_date(now), "ONE_MINUTE")
+
+    assert candles is not None
+    assert broker.market_api.calls['getCandleData'] >= 2
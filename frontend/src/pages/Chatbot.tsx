@@ -36,29 +36,50 @@ export function ChatBot() {
       const newMessages: Message[] = [...messages, { role: 'user', content: userMessage }];
       setMessages(newMessages);
 
-      // Send message to backend API
-      const response = await fetch('http://localhost:5000/api/chat', {
+      // Stream the answer from the backend as server-sent events
+      const response = await fetch('http://localhost:5000/api/chat/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Accept': 'application/json'
+          'Accept': 'text/event-stream',
+          // Lets the backend answer P&L and allocation questions from the live portfolio
+          'Authorization': `Bearer ${localStorage.getItem('token') || ''}`
         },
         body: JSON.stringify({
           message: userMessage
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`API responded with status ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      if (data.error) {
-        throw new Error(data.error);
-      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let answer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
 
-      setMessages([...newMessages, { role: 'assistant', content: data.response }]);
+        // Events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop() || '';
+        for (const event of events) {
+          const name = event.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(event.match(/^data: (.*)$/m)?.[1] || '{}');
+          if (name === 'error') {
+            throw new Error(data.error);
+          }
+          if (name === 'chunk') {
+            answer += data.text;
+            setLoading(false);
+            setMessages([...newMessages, { role: 'assistant', content: answer }]);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error:', error);
       setMessages(prev => [...prev, {
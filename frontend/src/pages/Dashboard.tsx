@@ -1,7 +1,8 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { motion } from 'framer-motion';
 import { Line, Doughnut } from 'react-chartjs-2';
 import { stocksApi } from '../services/api';
+import { subscribeTicks, type Tick } from '../services/marketStream';
 import {
   Chart as ChartJS,
   CategoryScale,
@@ -30,6 +31,8 @@ interface PortfolioData {
   total_value: number;
   holdings: Array<{
     tradingsymbol: string;
+    symboltoken: string;
+    exchange: string;
     quantity: number;
     ltp: number;
     averageprice: number;
@@ -60,12 +63,64 @@ export function Dashboard() {
   const [error, setError] = useState<string | null>(null);
   const [portfolioData, setPortfolioData] = useState<PortfolioData | null>(null);
 
+  // Latest streamed price per "exchange:token", applied once a second instead of on every tick
+  const pendingTicks = useRef<Record<string, number>>({});
+
   useEffect(() => {
     fetchPortfolioData();
     const interval = setInterval(fetchPortfolioData, 60000);
     return () => clearInterval(interval);
   }, []);
 
+  const holdingKeys = (portfolioData?.holdings || [])
+    .map(h => `${h.exchange || 'NSE'}:${h.symboltoken}`)
+    .sort()
+    .join(',');
+
+  // Stream live prices for the holdings between portfolio polls
+  useEffect(() => {
+    if (!holdingKeys) {
+      return;
+    }
+    const tokensByExchange: Record<string, string[]> = {};
+    holdingKeys.split(',').forEach(key => {
+      const [exchange, token] = key.split(':');
+      tokensByExchange[exchange] = [...(tokensByExchange[exchange] || []), token];
+    });
+    const onTick = (tick: Tick) => {
+      pendingTicks.current[`${tick.exchange}:${tick.token}`] = tick.ltp;
+    };
+    const unsubscribes = Object.entries(tokensByExchange).map(
+      ([exchange, tokens]) => subscribeTicks(tokens, onTick, exchange)
+    );
+    return () => unsubscribes.forEach(unsubscribe => unsubscribe());
+  }, [holdingKeys]);
+
+  useEffect(() => {
+    const flush = setInterval(() => {
+      const ticks = pendingTicks.current;
+      if (Object.keys(ticks).length === 0) {
+        return;
+      }
+      pendingTicks.current = {};
+      setPortfolioData(current => {
+        if (!current) {
+          return current;
+        }
+        const holdings = current.holdings.map(h => {
+          const ltp = ticks[`${h.exchange || 'NSE'}:${h.symboltoken}`];
+          return ltp === undefined ? h : { ...h, ltp };
+        });
+        return {
+          ...current,
+          holdings,
+          total_value: holdings.reduce((total, h) => total + h.ltp * h.quantity, 0),
+        };
+      });
+    }, 1000);
+    return () => clearInterval(flush);
+  }, []);
+
   const fetchPortfolioData = async () => {
     try {
       const response = await stocksApi.getPortfolio();
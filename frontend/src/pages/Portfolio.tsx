@@ -34,13 +34,15 @@ export function Portfolio() {
 
   useEffect(() => {
     fetchPortfolioData();
-    const interval = setInterval(fetchPortfolioData, 60000);
+    const interval = setInterval(() => fetchPortfolioData(), 60000);
     return () => clearInterval(interval);
   }, []);
 
-  const fetchPortfolioData = async () => {
+  const fetchPortfolioData = async (forceRefresh = false) => {
     try {
-      const response = await stocksApi.getPortfolio();
+      const response = forceRefresh
+        ? await stocksApi.refreshPortfolio()
+        : await stocksApi.getPortfolio();
       if (response.data) {
         setPortfolioData(response.data);
         setError(null);
@@ -139,7 +141,7 @@ export function Portfolio() {
         <div className="glass-card lg:col-span-2">
           <div className="flex items-center justify-between mb-4">
             <h2 className="subtitle mb-0">Holdings</h2>
-            <button className="flex items-center text-adaptive-secondary hover:text-accent transition-colors" onClick={fetchPortfolioData}>
+            <button className="flex items-center text-adaptive-secondary hover:text-accent transition-colors" onClick={() => fetchPortfolioData(true)}>
               <RefreshCw className="w-4 h-4 mr-2" />
               Refresh
             </button>
@@ -52,11 +52,13 @@ export interface PortfolioData {
   }>;
   historical_data: Array<{
     timestamp: string;
-    open: number;
-    high: number;
-    low: number;
+    open?: number;
+    high?: number;
+    low?: number;
     close: number;
   }>;
+  partial?: boolean;
+  errors?: Record<string, string | null>;
   metrics: {
     daily_change: number;
     total_investments: number;
@@ -94,6 +96,15 @@ export const stocksApi = {
     }
   },
 
+  refreshPortfolio: async (): Promise<ApiResult<PortfolioData>> => {
+    try {
+      await api.post('/stocks/refresh');
+    } catch (error) {
+      console.error('Portfolio cache refresh error:', error);
+    }
+    return stocksApi.getPortfolio();
+  },
+
   getHoldings: async () => {
     try {
       const response = await api.get<ApiResponse<any>>('/stocks/holdings');
@@ -0,0 +1,50 @@
+import { io, Socket } from 'socket.io-client';
+
+const SOCKET_URL = (import.meta.env.VITE_API_URL || 'http://localhost:5000/api').replace(/\/api\/?$/, '');
+
+export interface Tick {
+  exchange: string;
+  token: string;
+  ltp: number;
+  volume: number | null;
+  timestamp: number;
+}
+
+let socket: Socket | null = null;
+
+const getSocket = (): Socket => {
+  if (!socket) {
+    socket = io(SOCKET_URL, {
+      auth: (cb) => cb({ token: localStorage.getItem('token') }),
+    });
+  }
+  return socket;
+};
+
+// Subscribe to live ticks for tokens; returns a function that unsubscribes
+export const subscribeTicks = (
+  tokens: string[],
+  onTick: (tick: Tick) => void,
+  exchange = 'NSE'
+): (() => void) => {
+  const client = getSocket();
+  const wanted = new Set(tokens);
+  const handler = (tick: Tick) => {
+    if (tick.exchange === exchange && wanted.has(tick.token)) {
+      onTick(tick);
+    }
+  };
+  const subscribe = () => client.emit('subscribe', { tokens, exchange });
+
+  client.on('tick', handler);
+  client.on('connect', subscribe);
+  if (client.connected) {
+    subscribe();
+  }
+
+  return () => {
+    client.off('tick', handler);
+    client.off('connect', subscribe);
+    client.emit('unsubscribe', { tokens, exchange });
+  };
+};